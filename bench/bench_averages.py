@@ -0,0 +1,322 @@
+"""
+bench_averages.py
+
+Benchmark for the MonthAverages search list extension.
+
+Copyright (c) 2015-2020 Gary Roderick               gjroderick<at>gmail.com
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program.  If not, see http://www.gnu.org/licenses/.
+
+Version: 1.1.0                                   Date: 17 October 2026
+
+Revision History
+    17 October 2026     v1.1.0
+        - initial implementation
+
+Generates synthetic SQLite WeeWX databases of 1, 10 and 50 years of data and
+times MonthAverages.get_extension_list() against each using a stub report
+generator. The number of database calls, wall time and peak memory of each run
+are reported together with the wall time of a baseline run that obtains each
+month aggregate with its own query, as versions before 1.1.0 did. No network
+access or WeeWX installation (other than the WeeWX
+python modules) is required.
+
+The MonthAverages SLE only uses the archive table to find the first and last
+records and the archive interval, all month aggregates come from the daily
+summaries. So that multi-decade databases can be generated in seconds the
+daily summaries are populated directly with synthetic daily values and the
+archive table holds only the first and last records. The benchmark therefore
+measures the cost of the daily summaries only, which depends on the number of
+days of data and not on the archive interval or the size of the archive
+table.
+
+Usage:
+
+    $ PYTHONPATH=/path/to/weewx/bin python bench/bench_averages.py
+
+Use the --help option to display the available options. Generated databases
+are kept in the --dir directory and reused by later runs.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from datetime import date, timedelta
+
+# benchmark the extension in this source tree rather than any installed copy
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bin'))
+
+import configobj
+import weedb
+import weewx
+import weewx.manager
+import weewx.units
+from weeutil.weeutil import TimeSpan
+
+import user.averagessearchlist
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2, peak memory is reported as maximum resident set size only
+    tracemalloc = None
+
+# the last day of data in each database, fixed so results are reproducible
+END_DATE = date(2025, 12, 31)
+
+# archive interval in minutes of the synthetic data
+ARCHIVE_INTERVAL = 5
+
+# minimal schema, the extension only needs outTemp and rain
+SCHEMA = [('dateTime', 'INTEGER NOT NULL UNIQUE PRIMARY KEY'),
+          ('usUnits', 'INTEGER NOT NULL'),
+          ('interval', 'INTEGER NOT NULL'),
+          ('outTemp', 'REAL'),
+          ('rain', 'REAL')]
+
+# skin settings used by the default HighchartsAverages report
+SKIN_DICT = {'Units': {'Groups': {'group_degree_day': 'degree_C_day',
+                                  'group_rain': 'mm',
+                                  'group_temperature': 'degree_C'},
+                       'StringFormats': {'degree_C': '%.1f',
+                                         'degree_F': '%.1f',
+                                         'cm': '%.2f',
+                                         'inch': '%.2f',
+                                         'mm': '%.1f'}},
+             'skin': 'HighchartsAverages'}
+
+
+class StubGenerator(object):
+    """ Stand in for the Cheetah generator with what MonthAverages uses. """
+
+    def __init__(self, skin_dict, config_dict):
+        self.skin_dict = skin_dict
+        self.config_dict = config_dict
+        self.converter = weewx.units.Converter(skin_dict['Units']['Groups'])
+
+
+def db_path(directory, years):
+    """ Return the path of the database for a period. """
+
+    return os.path.join(directory, 'bench_%dy.sdb' % years)
+
+
+def generate_db(path, first_date, end_date=END_DATE, missing_dates=(), archive_ts=(), seed=0):
+    """ Generate a synthetic WeeWX database.
+
+        Daily outTemp and rain summaries are generated for each day from
+        first_date to end_date inclusive. Daily temperatures follow an
+        annual cycle with random day to day variation, rain falls on about
+        one day in three. The archive holds the first and last records and a
+        record at each of archive_ts. The database is also used by the unit
+        tests.
+
+        Parameters:
+            path:          Path of the database to be created.
+            first_date:    The first day of data.
+            end_date:      The last day of data.
+            missing_dates: Days without data.
+            archive_ts:    Timestamps of additional archive records.
+            seed:          Seed for the random number generator.
+    """
+
+    interval = ARCHIVE_INTERVAL
+    _rng = random.Random(seed)
+    _per_day = 1440 // interval
+    _missing = set(missing_dates)
+    _temp_rows = []
+    _rain_rows = []
+    for _n in range((end_date - first_date).days + 1):
+        _day = first_date + timedelta(days=_n)
+        if _day in _missing:
+            continue
+        _ts = int(time.mktime(_day.timetuple()))
+        _cycle = math.cos(2 * math.pi * (_day.timetuple().tm_yday - 15) / 365.25)
+        _mean = 15.0 + 8.0 * _cycle + _rng.gauss(0, 3)
+        _range = max(2.0, _rng.gauss(10, 3))
+        _min = round(_mean - _range / 2, 1)
+        _max = round(_mean + _range / 2, 1)
+        _sum = _mean * _per_day
+        _temp_rows.append((_ts, _min, _ts + 6 * 3600, _max, _ts + 15 * 3600,
+                           _sum, _per_day, _sum * interval * 60, _per_day * interval * 60))
+        _rain = round(_rng.expovariate(2.0), 2) if _rng.random() < 0.33 else 0.0
+        _rain_rows.append((_ts, 0.0, _ts, _rain / 2, _ts + 12 * 3600,
+                           _rain, _per_day, _rain * interval * 60, _per_day * interval * 60))
+    _first_ts = int(time.mktime(first_date.timetuple())) + interval * 60
+    _last_ts = int(time.mktime((end_date + timedelta(days=1)).timetuple()))
+    _archive_ts = sorted(set([_first_ts, _last_ts] + [_ts for _ts in archive_ts
+                                                      if _first_ts < _ts < _last_ts]))
+    _db_dict = {'database_name': path, 'driver': 'weedb.sqlite', 'SQLITE_ROOT': '/'}
+    with weewx.manager.DaySummaryManager.open_with_create(_db_dict, schema=SCHEMA) as dbm:
+        with weedb.Transaction(dbm.connection) as cursor:
+            for _ts in _archive_ts:
+                cursor.execute("INSERT INTO archive (dateTime, usUnits, interval, outTemp, rain) "
+                               "VALUES (?, ?, ?, ?, ?)", (_ts, weewx.METRIC, interval, 15.0, 0.0))
+            for _obs, _rows in (('outTemp', _temp_rows), ('rain', _rain_rows)):
+                cursor.executemany("INSERT INTO archive_day_%s (dateTime, min, mintime, max, "
+                                   "maxtime, sum, count, wsum, sumtime) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)" % _obs, _rows)
+            cursor.execute("INSERT OR REPLACE INTO archive_day__metadata (name, value) "
+                           "VALUES ('lastUpdate', ?)", (str(_last_ts),))
+
+
+def run_sle(path, work_dir, options, trace=False):
+    """ Run MonthAverages.get_extension_list() against a database.
+
+        Parameters:
+            path:     Path of the database.
+            work_dir: Directory used as the skin directory, holds any cache
+                      file.
+            options:  Dict of [MonthAverages] config options.
+            trace:    Whether to trace Python memory allocations.
+
+        All tags are derived. Returns a tuple (elapsed seconds, averages stats dict, peak traced
+        memory in bytes or None).
+    """
+
+    skin_dict = configobj.ConfigObj(SKIN_DICT)
+    skin_dict['SKIN_ROOT'] = work_dir
+    skin_dict['MonthAverages'] = options
+    config_dict = configobj.ConfigObj({'WEEWX_ROOT': '/'})
+    _db_dict = {'database_name': path, 'driver': 'weedb.sqlite', 'SQLITE_ROOT': '/'}
+    with weewx.manager.DaySummaryManager.open(_db_dict) as dbm:
+        timespan = TimeSpan(dbm.firstGoodStamp(), dbm.lastGoodStamp())
+        sle = user.averagessearchlist.MonthAverages(StubGenerator(skin_dict, config_dict))
+        peak = None
+        if trace:
+            tracemalloc.start()
+        t1 = time.time()
+        tags = sle.get_extension_list(timespan, lambda data_binding=None: dbm)[0]
+        # tags are derived when first accessed, derive them all as a template
+        # using every tag would
+        dict(tags)
+        elapsed = time.time() - t1
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return elapsed, tags['averagesStats'], peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the MonthAverages search list extension.')
+    parser.add_argument('--years', default='1,10,50',
+                        help='Comma separated list of database periods in years. '
+                             "Default is '1,10,50'.")
+    parser.add_argument('--dir', default=os.path.join(tempfile.gettempdir(), 'averages_bench'),
+                        help='Directory for the generated databases. Default is '
+                             'averages_bench in the system temporary directory.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs against each database, the best is '
+                             'reported. Default is 3.')
+    parser.add_argument('--warm', action='store_true',
+                        help='Keep the month stats cache between runs rather than '
+                             'starting each run with no cache.')
+    parser.add_argument('--set', action='append', default=[], metavar='OPTION=VALUE',
+                        help='Set a [MonthAverages] config option, eg bulk_query=False. '
+                             'May be used more than once.')
+    parser.add_argument('--no-baseline', action='store_true',
+                        help='Do not time the baseline, the per month aggregate queries '
+                             'of bulk_query = False with no cache, against each database.')
+    parser.add_argument('--regenerate', action='store_true',
+                        help='Regenerate databases even if they exist.')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON.')
+    args = parser.parse_args()
+
+    options = {}
+    for _opt in args.set:
+        _name, _sep, _value = _opt.partition('=')
+        if not _sep:
+            parser.error("Invalid --set value '%s'" % _opt)
+        options[_name.strip()] = _value.strip()
+    if not os.path.isdir(args.dir):
+        os.makedirs(args.dir)
+    work_dir = tempfile.mkdtemp(dir=args.dir)
+    cache_file = os.path.join(work_dir, SKIN_DICT['skin'],
+                              options.get('cache_file', 'averages_cache.json'))
+    os.makedirs(os.path.dirname(cache_file))
+
+    results = []
+    for _years in [int(_y) for _y in args.years.split(',')]:
+        path = db_path(args.dir, _years)
+        for _path in (path, path + '.tmp'):
+            if (args.regenerate or _path != path) and os.path.exists(_path):
+                os.remove(_path)
+        if not os.path.exists(path):
+            t1 = time.time()
+            # generate to a temporary file so an interrupted run does not
+            # leave an incomplete database
+            generate_db(path + '.tmp', date(END_DATE.year - _years + 1, 1, 1))
+            os.rename(path + '.tmp', path)
+            if not args.json:
+                print("Generated %s in %.1f seconds" % (path, time.time() - t1))
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+        _times = []
+        for _n in range(args.repeat):
+            if not args.warm and os.path.exists(cache_file):
+                os.remove(cache_file)
+            _elapsed, _stats, _peak = run_sle(path, work_dir, options)
+            _times.append(_elapsed)
+        if tracemalloc is not None:
+            if not args.warm and os.path.exists(cache_file):
+                os.remove(cache_file)
+            _elapsed, _stats, _peak = run_sle(path, work_dir, options, trace=True)
+        _baseline = None
+        if not args.no_baseline:
+            # the baseline obtains each month aggregate with its own query
+            # as versions before 1.1.0 did
+            _baseline = min(run_sle(path, work_dir, dict(options, bulk_query='False',
+                                                         cache='False'))[0]
+                            for _n in range(args.repeat))
+        results.append({'years': _years,
+                        'best': min(_times),
+                        'mean': sum(_times) / len(_times),
+                        'baseline': _baseline,
+                        'db_calls': _stats['counters'].get('db_calls', 0),
+                        'months': _stats['counters'].get('months_processed', 0),
+                        'peak_memory': _peak,
+                        'timings': _stats['timings']})
+    shutil.rmtree(work_dir)
+    # maximum resident set size of the whole benchmark, kB on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if args.json:
+        print(json.dumps({'options': options, 'warm': args.warm,
+                          'max_rss_kb': max_rss, 'results': results},
+                         indent=2, sort_keys=True))
+        return
+    print()
+    print("%5s %7s %10s %10s %8s %12s %14s" % ('years', 'months', 'best (s)', 'mean (s)',
+                                               'db calls', 'peak (KiB)', 'baseline (s)'))
+    for _r in results:
+        print("%5d %7d %10.4f %10.4f %8d %12s %14s" % (_r['years'], _r['months'],
+                                                       _r['best'], _r['mean'], _r['db_calls'],
+                                                       '%.0f' % (_r['peak_memory'] / 1024.0)
+                                                       if _r['peak_memory'] is not None else '-',
+                                                       '%.4f' % _r['baseline']
+                                                       if _r['baseline'] is not None else '-'))
+    print("Maximum resident set size: %d KiB" % max_rss)
+
+
+if __name__ == '__main__':
+    main()
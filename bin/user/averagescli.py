@@ -0,0 +1,321 @@
+"""
+averagescli.py
+
+Command line interface to generate the MonthAverages JSON data file outside of
+the WeeWX report cycle.
+
+Copyright (c) 2015-2020 Gary Roderick               gjroderick<at>gmail.com
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program.  If not, see http://www.gnu.org/licenses/.
+
+Version: 1.1.0                                   Date: 17 October 2026
+
+Revision History
+    17 October 2026     v1.1.0
+        - initial implementation, moved from averagessearchlist.py
+
+Usage:
+
+    $ PYTHONPATH=$BIN_ROOT python -m user.averagescli --help
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import weewx
+import weewx.manager
+
+from weeutil.weeutil import to_int, TimeSpan
+
+from user.averagessearchlist import Averages, build_skin_dict, write_atomic
+from user.averagesgenerator import get_converter_formatter, publish, render_averages
+
+
+def read_config(config_path):
+    """ Read the WeeWX config file.
+
+        Returns a tuple (config path, config dict).
+    """
+
+    try:
+        import weecfg
+        return weecfg.read_config(config_path)
+    except ImportError:
+        import configobj
+        config_path = config_path or '/home/weewx/weewx.conf'
+        return config_path, configobj.ConfigObj(config_path, file_error=True)
+
+
+def get_skin_dict(config_dict, report, obs, binding):
+    """ Build the skin dict for a report with command line settings applied.
+
+        Parameters:
+            config_dict: The WeeWX config dict.
+            report:      The name of the report whose settings are used.
+            obs:         Dict of additional aggregates keyed by observation.
+            binding:     The data binding to use.
+    """
+
+    skin_dict = build_skin_dict(config_dict, report)
+    sle_dict = skin_dict.setdefault('MonthAverages', {})
+    # add any additional observations and aggregates
+    obs_dict = sle_dict.setdefault('observations', {})
+    for _obs, _aggs in obs.items():
+        obs_dict[_obs] = _aggs
+    # only set the data binding if it is not the report data binding so
+    # that the report month stats cache is used
+    if binding != skin_dict.get('data_binding', 'wx_binding'):
+        sle_dict['data_binding'] = binding
+    return skin_dict
+
+
+def generate(config_dict, skin_dict, binding, output, since_ts=None, force=False):
+    """ Generate the averages JSON data file for a data binding.
+
+        Opens the database, performs the same calculations as the
+        MonthAverages SLE and renders the averages.json template to file
+        along with a versioned copy and manifest, refer publish(). Nothing is
+        written if the results are unchanged.
+
+        Parameters:
+            config_dict: The WeeWX config dict.
+            skin_dict:   The skin dict of the report whose settings and
+                         template are used.
+            binding:     The data binding to use.
+            output:      Path of the file to be written.
+            since_ts:    Timestamp before which data is ignored, None to use
+                         all data.
+            force:       Write the files even if the results are unchanged.
+
+        Returns a dict containing the data binding ('binding'), the file
+        written ('file'), whether it was written ('changed'), the timestamp
+        of the last record ('dateTime'), a list of (phase, seconds) tuples
+        ('timings') and the averages stats ('stats'). If there is no data no
+        file is written and the file is None.
+    """
+
+    timings = []
+    t1 = time.time()
+
+    def lap(phase):
+        _now = time.time()
+        timings.append((phase, _now - lap.last))
+        lap.last = _now
+    lap.last = t1
+
+    result = {'binding': binding, 'file': None, 'changed': False, 'dateTime': None,
+              'timings': timings, 'stats': None}
+    converter, formatter = get_converter_formatter(skin_dict)
+    averages = Averages(skin_dict, config_dict, converter)
+    lap('config')
+
+    dbm = weewx.manager.open_manager_with_config(config_dict, binding)
+    try:
+        stop_ts = dbm.lastGoodStamp()
+        if stop_ts is None:
+            return result
+        timespan = TimeSpan(dbm.firstGoodStamp(), stop_ts)
+        lap('open database')
+        tags = averages.calculate(timespan, lambda data_binding=None: dbm, since_ts)
+        lap('calculate')
+
+        def render():
+            text = render_averages(config_dict, skin_dict, tags, stop_ts, converter, formatter)
+            lap('render')
+            return text
+        # the database is still needed as tags are derived when first
+        # accessed, accessing the hash derives all tags
+        content_hash = tags['averagesHash']
+        lap('derive tags')
+        result['changed'] = publish(output, content_hash, render, force)
+        lap('write')
+    finally:
+        dbm.close()
+    result['dateTime'] = stop_ts
+    result['stats'] = tags['averagesStats']
+    result['file'] = output
+    return result
+
+
+def generate_worker(args):
+    """ Process pool worker that generates the averages JSON data file for
+        one data binding.
+
+        Each worker reads the config and opens its own database connection.
+        Any error is returned in the result rather than raised.
+
+        Parameters:
+            args: Tuple (config path, report, obs, binding, output, since_ts,
+                  force) of the parameters used by get_skin_dict() and
+                  generate().
+    """
+
+    config_path, report, obs, binding, output, since_ts, force = args
+    try:
+        config_dict = read_config(config_path)[1]
+        skin_dict = get_skin_dict(config_dict, report, obs, binding)
+        return generate(config_dict, skin_dict, binding, output, since_ts, force)
+    except Exception as e:
+        return {'binding': binding, 'file': None, 'error': '%s: %s' % (type(e).__name__, e)}
+
+
+def main():
+    """ Generate the averages JSON data file outside of a report cycle.
+
+        Opens the WeeWX database using the settings in weewx.conf, performs
+        the same calculations as the MonthAverages SLE and renders the
+        averages.json template to file. The file is written atomically so
+        that this may be safely run from cron.
+
+        If more than one data binding is given a JSON data file is generated
+        for each data binding in parallel worker processes, each with its
+        own database connection, and an index of the files generated is
+        written.
+    """
+
+    usage = """python -m user.averagescli --help
+       python -m user.averagescli [--config=CONFIG_FILE]
+                                  [--report=REPORT]
+                                  [--binding=BINDING[,BINDING...]]
+                                  [--processes=N]
+                                  [--since=YYYY-MM-DD]
+                                  [--obs=OBS:AGG[,AGG...]]
+                                  [--output=FILE|DIR] [--force]
+                                  [--profile]"""
+    parser = argparse.ArgumentParser(usage=usage,
+                                     description='Generate the Averages extension JSON data file.')
+    parser.add_argument('--config', dest='config_path', metavar='CONFIG_FILE',
+                        help='Use configuration file CONFIG_FILE.')
+    parser.add_argument('--report', default='HighchartsAverages',
+                        help="Use the skin and settings of report REPORT. Default is "
+                             "'HighchartsAverages'.")
+    parser.add_argument('--binding', action='append', default=[], metavar='BINDING[,BINDING...]',
+                        help="Use data binding BINDING. If more than one data binding is "
+                             "given a JSON data file is generated for each. May be used "
+                             "more than once. Default is 'wx_binding'.")
+    parser.add_argument('--processes', type=int, metavar='N',
+                        help='Use up to N worker processes when more than one data binding '
+                             'is given. Default is the number of CPUs.')
+    parser.add_argument('--since', metavar='YYYY-MM-DD',
+                        help='Ignore data before date YYYY-MM-DD.')
+    parser.add_argument('--obs', action='append', default=[], metavar='OBS:AGG[,AGG...]',
+                        help='Also calculate aggregates AGG for observation OBS, eg '
+                             "'windSpeed:avg,max'. May be used more than once.")
+    parser.add_argument('--output', metavar='FILE|DIR',
+                        help='Write the JSON data to FILE. Default is json/averages.json '
+                             'in the report HTML_ROOT. If more than one data binding is '
+                             'given the JSON data file for each data binding and the '
+                             'index are written to directory DIR, default is json in the '
+                             'report HTML_ROOT.')
+    parser.add_argument('--force', action='store_true',
+                        help='Write the JSON data file even if the averages are unchanged.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print the time taken by each phase.')
+    args = parser.parse_args()
+
+    t1 = time.time()
+    bindings = []
+    for _arg in args.binding or ['wx_binding']:
+        for _binding in _arg.split(','):
+            if _binding.strip() and _binding.strip() not in bindings:
+                bindings.append(_binding.strip())
+    if not bindings:
+        parser.error("No data binding given")
+    obs = {}
+    for _spec in args.obs:
+        _obs, _sep, _aggs = _spec.partition(':')
+        if not _sep or not _aggs:
+            parser.error("Invalid --obs value '%s'" % _spec)
+        obs[_obs] = [_a.strip() for _a in _aggs.split(',')]
+    since_ts = None
+    if args.since:
+        try:
+            since_ts = time.mktime(time.strptime(args.since, '%Y-%m-%d'))
+        except ValueError:
+            parser.error("Invalid --since value '%s'" % args.since)
+
+    # get the config dict and the skin dict for our report
+    config_path, config_dict = read_config(args.config_path)
+    weewx.debug = to_int(config_dict.get('debug', 0))
+    skin_dict = get_skin_dict(config_dict, args.report, obs, bindings[0])
+    json_dir = os.path.join(config_dict['WEEWX_ROOT'], skin_dict['HTML_ROOT'], 'json')
+
+    if len(bindings) == 1:
+        output = args.output or os.path.join(json_dir, 'averages.json')
+        result = generate(config_dict, skin_dict, bindings[0], output, since_ts, args.force)
+        if result['file'] is None:
+            print("No data in database, nothing to do")
+            return
+        print("%s %s in %.3f seconds" % ('Generated' if result['changed'] else 'Unchanged',
+                                         output, time.time() - t1))
+        if args.profile:
+            for _phase, _elapsed in result['timings']:
+                print("%16s: %8.3f seconds" % (_phase, _elapsed))
+                if _phase == 'calculate':
+                    for _name, _elapsed in sorted(result['stats']['timings'].items()):
+                        print("%20s: %8.3f seconds" % (_name, _elapsed))
+            for _name, _count in sorted(result['stats']['counters'].items()):
+                print("%24s: %8d" % (_name, _count))
+        return
+
+    # more than one data binding, generate a file for each data binding in
+    # parallel then write an index of the files generated
+    output_dir = args.output or json_dir
+    jobs = [(config_path, args.report, obs, _binding,
+             os.path.join(output_dir, 'averages_%s.json' % _binding), since_ts, args.force)
+            for _binding in bindings]
+    processes = min(args.processes or multiprocessing.cpu_count(), len(jobs))
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(generate_worker, jobs)
+    finally:
+        pool.close()
+        pool.join()
+    index = {'generated': int(time.time()), 'stations': []}
+    errors = 0
+    for _result in results:
+        _entry = {'binding': _result['binding'],
+                  'file': os.path.basename(_result['file']) if _result['file'] else None,
+                  'dateTime': _result.get('dateTime')}
+        if _entry['file'] is not None:
+            _entry['manifest'] = '%s.manifest.json' % os.path.splitext(_entry['file'])[0]
+        if 'error' in _result:
+            _entry['error'] = _result['error']
+            errors += 1
+            print("Error generating data binding '%s': %s" % (_result['binding'],
+                                                              _result['error']))
+        elif _result['file'] is None:
+            print("No data for data binding '%s', nothing to do" % _result['binding'])
+        else:
+            print("%s %s" % ('Generated' if _result['changed'] else 'Unchanged', _result['file']))
+            if args.profile:
+                print("%16s: %8.3f seconds %8d database calls" % (_result['binding'],
+                                                                  sum(_t for _p, _t in _result['timings']),
+                                                                  _result['stats']['counters'].get('db_calls', 0)))
+        index['stations'].append(_entry)
+    index_path = os.path.join(output_dir, 'averages_index.json')
+    write_atomic(index_path, json.dumps(index, indent=2, sort_keys=True))
+    print("Generated %s for %d data bindings using %d processes in %.3f seconds" % (index_path,
+                                                                                  len(bindings),
+                                                                                  processes,
+                                                                                  time.time() - t1))
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
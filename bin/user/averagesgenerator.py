@@ -0,0 +1,224 @@
+"""
+averagesgenerator.py
+
+A WeeWX report generator that writes the MonthAverages JSON data file only when
+the averages change.
+
+Copyright (c) 2015-2020 Gary Roderick               gjroderick<at>gmail.com
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program.  If not, see http://www.gnu.org/licenses/.
+
+Version: 1.1.0                                   Date: 17 October 2026
+
+Revision History
+    17 October 2026     v1.1.0
+        - initial implementation, moved from averagessearchlist.py
+
+The AveragesGenerator is used in place of the CheetahGenerator in the
+generator_list of the HighchartsAverages report, refer to the readme.
+"""
+import json
+import os
+import re
+import time
+import weewx.units
+
+from weewx.reportengine import ReportGenerator
+from weewx.units import ValueTuple
+from weeutil.weeutil import to_bool, TimeSpan
+
+from user.averagessearchlist import Averages, write_atomic
+
+# import/setup logging, WeeWX v3 is syslog based but WeeWX v4 is logging based,
+# try v4 logging and if it fails use v3 logging
+try:
+    # WeeWX4 logging
+    import logging
+    log = logging.getLogger(__name__)
+
+    def logdbg(msg):
+        log.debug(msg)
+
+    def loginf(msg):
+        log.info(msg)
+
+    def logerr(msg):
+        log.error(msg)
+
+except ImportError:
+    # WeeWX legacy (v3) logging via syslog
+    import syslog
+
+    def logmsg(level, msg):
+        syslog.syslog(level, 'averagesgenerator: %s' % msg)
+
+    def logdbg(msg):
+        logmsg(syslog.LOG_DEBUG, msg)
+
+    def loginf(msg):
+        logmsg(syslog.LOG_INFO, msg)
+
+    def logerr(msg):
+        logmsg(syslog.LOG_ERR, msg)
+
+
+# number of versioned JSON data files kept, older versions are removed
+VERSIONS_KEPT = 2
+
+# Cache-Control headers recommended for the versioned JSON data files and the
+# manifest, these are included in the manifest for use by the web server
+VERSIONED_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MANIFEST_CACHE_CONTROL = 'no-cache'
+
+
+def get_converter_formatter(skin_dict):
+    """ Return a tuple (converter, formatter) for a skin. """
+
+    if hasattr(weewx.units.Converter, 'fromSkinDict'):
+        return (weewx.units.Converter.fromSkinDict(skin_dict),
+                weewx.units.Formatter.fromSkinDict(skin_dict))
+    return (weewx.units.Converter(skin_dict['Units']['Groups']),
+            weewx.units.Formatter(skin_dict['Units']['StringFormats'],
+                                  skin_dict['Units']['Labels'],
+                                  skin_dict['Units']['TimeFormats']))
+
+
+def render_averages(config_dict, skin_dict, tags, stop_ts, converter, formatter):
+    """ Render the averages.json template.
+
+        The template is rendered with the results of a calculation and the
+        tags it uses from the standard search list.
+
+        Parameters:
+            config_dict: The WeeWX config dict.
+            skin_dict:   The skin dict of the report whose template is used.
+            tags:        Dict of search list tags returned by
+                         Averages.calculate().
+            stop_ts:     Timestamp of the last record.
+            converter:   The converter for the skin.
+            formatter:   The formatter for the skin.
+
+        Returns the rendered text.
+    """
+
+    from Cheetah.Template import Template
+
+    template_path = os.path.join(config_dict['WEEWX_ROOT'],
+                                 skin_dict['SKIN_ROOT'],
+                                 skin_dict['skin'],
+                                 'json', 'averages.json.tmpl')
+    current = {'dateTime': weewx.units.ValueHelper(ValueTuple(stop_ts, 'unix_epoch', 'group_time'),
+                                                   'current', formatter, converter)}
+    search_list = [tags,
+                   {'unit': weewx.units.UnitInfoHelper(formatter, converter),
+                    'current': current}]
+    return str(Template(file=template_path, searchList=search_list))
+
+
+def publish(output, content_hash, render, force=False):
+    """ Write a JSON data file if its content has changed.
+
+        Along with the JSON data file (eg averages.json) a versioned copy
+        named with the content hash (eg averages.0123456789abcdef.json) and
+        a manifest naming the current versioned copy (eg
+        averages.manifest.json) are written. The versioned copy never
+        changes so it may be cached indefinitely, only the small manifest
+        need be fetched each time. If the content hash matches the manifest
+        nothing is written, so unchanged files are not uploaded again. The
+        most recent older versioned copies are kept for clients holding an
+        older manifest.
+
+        Parameters:
+            output:       Path of the JSON data file.
+            content_hash: Content hash of the data, eg as returned by
+                          payload_hash().
+            render:       Callable that returns the text to be written, only
+                          called if the files are to be written.
+            force:        Write the files even if the content is unchanged.
+
+        Returns True if the files were written, False if unchanged.
+    """
+
+    _dir, _name = os.path.split(os.path.abspath(output))
+    _root = os.path.splitext(_name)[0]
+    _versioned = '%s.%s.json' % (_root, content_hash)
+    _manifest_name = '%s.manifest.json' % _root
+    _manifest_path = os.path.join(_dir, _manifest_name)
+    if not force and os.path.exists(output) and os.path.exists(os.path.join(_dir, _versioned)):
+        try:
+            with open(_manifest_path, 'r') as f:
+                if json.load(f).get('hash') == content_hash:
+                    return False
+        except (IOError, OSError, ValueError, AttributeError):
+            # no or an unreadable manifest, write everything
+            pass
+    if not os.path.isdir(_dir):
+        os.makedirs(_dir)
+    text = render()
+    # write the versioned copy before the manifest that names it
+    write_atomic(os.path.join(_dir, _versioned), text)
+    write_atomic(output, text)
+    manifest = {'file': _versioned,
+                'hash': content_hash,
+                'generated': int(time.time()),
+                'cacheControl': {_versioned: VERSIONED_CACHE_CONTROL,
+                                 _manifest_name: MANIFEST_CACHE_CONTROL}}
+    write_atomic(_manifest_path, json.dumps(manifest, indent=2, sort_keys=True))
+    # remove all but the most recent older versioned copies
+    _pattern = re.compile(r'^%s\.[0-9a-f]{16}\.json$' % re.escape(_root))
+    _old = sorted((os.path.getmtime(os.path.join(_dir, _n)), _n) for _n in os.listdir(_dir)
+                  if _pattern.match(_n) and _n != _versioned)
+    for _mtime, _n in _old[:max(len(_old) - (VERSIONS_KEPT - 1), 0)]:
+        try:
+            os.remove(os.path.join(_dir, _n))
+        except OSError:
+            pass
+    return True
+
+
+class AveragesGenerator(ReportGenerator):
+    """ Report generator that generates the averages JSON data file only if
+        the averages have changed.
+
+        Performs the same calculations as the MonthAverages SLE and renders
+        the averages.json template, but the JSON data file, a versioned copy
+        and manifest are only written if the content hash of the results has
+        changed, refer publish(). May be used in place of the
+        CheetahGenerator in the HighchartsAverages skin so that an unchanged
+        JSON data file is neither rewritten nor uploaded.
+    """
+
+    def run(self):
+        t1 = time.time()
+        converter, formatter = get_converter_formatter(self.skin_dict)
+        averages = Averages(self.skin_dict, self.config_dict, converter)
+        binding = averages.data_binding or self.skin_dict.get('data_binding', 'wx_binding')
+        dbm = self.db_binder.get_manager(binding)
+        start_ts = dbm.firstGoodStamp()
+        if start_ts is None:
+            return
+        # the averages are up to the time of the report, as used by the
+        # CheetahGenerator
+        stop_ts = self.gen_ts or dbm.lastGoodStamp()
+        tags = averages.calculate(TimeSpan(start_ts, stop_ts),
+                                  lambda data_binding=None: self.db_binder.get_manager(data_binding
+                                                                                       or binding))
+        output = os.path.join(self.config_dict['WEEWX_ROOT'],
+                              self.skin_dict['HTML_ROOT'],
+                              'json', 'averages.json')
+        written = publish(output, tags['averagesHash'],
+                          lambda: render_averages(self.config_dict, self.skin_dict, tags,
+                                                  stop_ts, converter, formatter))
+        if to_bool(self.skin_dict.get('log_success', True)):
+            loginf("AveragesGenerator %s %s in %.2f seconds" % ('generated' if written else 'left unchanged',
+                                                                output, time.time() - t1))
@@ -18,9 +18,65 @@ PARTICULAR PURPOSE.  See the GNU General Public License for more details.
 You should have received a copy of the GNU General Public License along with
 this program.  If not, see http://www.gnu.org/licenses/.
 
-Version: 1.0.0                                   Date: 25 May 2020
+Version: 1.1.0                                   Date: 17 October 2026
 
 Revision History
+    17 October 2026     v1.1.0
+        - month aggregates are now obtained with a single pass over the rain
+          and outTemp daily summaries rather than five getAggregate() calls
+          per month, legacy per month queries can be selected with the
+          bulk_query config option
+        - month aggregates for complete months are now cached on disk and
+          validated against a fingerprint of the daily summaries so that only
+          new or changed months are queried, one cache is shared by the SLE
+          and AveragesService of a WeeWX process and cached months are only
+          validated once a day
+        - observations and aggregates to be calculated are now set in the
+          [MonthAverages] [[observations]] config sub-section, a tag is
+          provided for each observation/aggregate pair
+        - month running totals are now held in an array based accumulator,
+          fixed bug where a running total of zero caused the year count to be
+          reset
+        - month aggregates are now assembled in a year x month matrix from
+          which per year, per decade and anomaly breakdowns are provided
+        - added support for a fixed or rolling normals period
+        - added percentiles of each month aggregate, including median and
+          decile rainfall, calculated using a bounded memory quantile sketch
+        - calculations moved to the Averages class so they may be used
+          independently of the report generator
+        - added a command line interface to generate the averages JSON data
+          file outside of the report cycle
+        - added per phase timings and database call and month counters
+        - added the AveragesService to maintain the month stats cache as
+          archive records arrive
+        - added the data_binding config option, the command line interface
+          can generate a JSON data file for each of a number of data bindings
+          in parallel
+        - added optional smoothed day of year normals
+        - added a content hash of the results, the AveragesGenerator and the
+          command line interface only write the JSON data file, a versioned
+          copy and a manifest if the results have changed
+        - search list tags are now derived from the month aggregates only
+          when first accessed so a template pays only for the tags it uses
+        - added the time of each record month maximum and minimum and the
+          wettest and driest year of each month
+        - added the completeness of each month and the max_missing_days and
+          max_consecutive_missing_days config options to exclude months with
+          too many days without data
+        - series are converted and rounded in a single stage, each unit is
+          converted once, the 12 month normals and extremes of a unit are
+          converted together on first access and the averagesjson tag holds
+          all series
+        - fixed bug where rounding always used 1 decimal place rather than
+          the string format of the unit concerned
+        - added the background_refresh and max_staleness config options to
+          refresh the averages in a background thread
+        - added optional monthly heating, cooling and growing degree day
+          totals and normals with base temperatures set in the [[degree_days]]
+          config sub-section
+        - the AveragesService, AveragesGenerator and command line interface
+          are now in the averagesservice, averagesgenerator and averagescli
+          modules
     25 May 2020         v1.0.0
         - now WeeWX 3 and WeeWX 4 (python 2 or 3) compatible
         - renamed search list file and search list class
@@ -51,15 +107,36 @@ Revision History
     22 February 2015    v0.1.0
        - initial implementation
 """
-import datetime
+import hashlib
 import json
+import math
+import os
+import re
+import tempfile
+import threading
 import time
+import weedb
 import weewx
 
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
 from datetime import date
 from weewx.cheetahgenerator import SearchList
-from weewx.units import getStandardUnitType, ValueTuple
-from weeutil.weeutil import genMonthSpans
+from weewx.units import convert, getStandardUnitType, ValueTuple
+from weeutil.weeutil import genMonthSpans, option_as_list, to_bool, to_int
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    # python 2
+    from collections import Mapping
+
+# NumPy is used to finalise accumulators if available, but it is not required
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # import/setup logging, WeeWX v3 is syslog based but WeeWX v4 is logging based,
 # try v4 logging and if it fails use v3 logging
@@ -71,6 +148,12 @@ try:
     def logdbg(msg):
         log.debug(msg)
 
+    def loginf(msg):
+        log.info(msg)
+
+    def logerr(msg):
+        log.error(msg)
+
 except ImportError:
     # WeeWX legacy (v3) logging via syslog
     import syslog
@@ -81,6 +164,80 @@ except ImportError:
     def logdbg(msg):
         logmsg(syslog.LOG_DEBUG, msg)
 
+    def loginf(msg):
+        logmsg(syslog.LOG_INFO, msg)
+
+    def logerr(msg):
+        logmsg(syslog.LOG_ERR, msg)
+
+
+# aggregates that may be calculated for each month, 'mean' is the mean of the
+# daily maximum and daily minimum as used by the BoM
+MONTH_AGGREGATES = ('sum', 'avg', 'max', 'min', 'meanmax', 'meanmin', 'mean')
+
+# observations and aggregates that are always calculated, these are used by
+# the default averages.json template
+DEFAULT_OBSERVATIONS = (('rain', ('sum',)),
+                        ('outTemp', ('max', 'meanmax', 'min', 'meanmin', 'mean')))
+
+# degree day types that may be calculated
+DEGREE_DAY_TYPES = ('heatdeg', 'cooldeg', 'growdeg')
+
+# observation whose day averages are used to calculate degree days
+DEGREE_DAY_OBS = 'outTemp'
+
+# percentiles that are always calculated, these are used by the default
+# averages.json template
+DEFAULT_PERCENTILES = (10, 50, 90)
+
+# number of day of year bins, days are binned by their position in a leap year
+# so that 29 February is always bin 59 and 1 March always bin 60
+DAYS_OF_YEAR = 366
+
+# number of days in a leap year before the 1st of each month
+LEAP_YEAR_OFFSETS = (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335)
+
+# smoothing methods that may be applied to day of year normals
+SMOOTHING_METHODS = ('none', 'moving', 'harmonic')
+
+# tags used by the default averages.json template and the observation and
+# aggregate each represents
+LEGACY_TAGS = (('monthRainAvgjson', 'rain', 'sum'),
+               ('monthTempMeanjson', 'outTemp', 'mean'),
+               ('monthTempMaxjson', 'outTemp', 'max'),
+               ('monthTempMinjson', 'outTemp', 'min'))
+
+# tags that may not be used for an observation and aggregate as they are used
+# by the default averages.json template
+RESERVED_TAGS = tuple(_t for _t, _o, _a in LEGACY_TAGS) + ('monthTempMeanMinMaxjson',
+                                                         'monthRainMedianjson',
+                                                         'monthRainDecilesjson',
+                                                         'monthTempMeanDecilesjson',
+                                                         'monthRainWettestjson',
+                                                         'monthRainDriestjson')
+
+# aggregates whose time of occurrence is provided
+EXTREME_AGGREGATES = ('max', 'min')
+
+# breakdowns of the month aggregates provided for each observation and
+# aggregate
+BREAKDOWNS = ('Years', 'Decades', 'Anomalies', 'Percentiles')
+
+# the fingerprint of no daily summary rows and the elements of a fingerprint
+# that are counts or times, refer get_fingerprint()
+EMPTY_FINGERPRINT = (0, None, None, None, None, None, None, None, None, None, None)
+FINGERPRINT_INTEGERS = (0, 1, 9, 10)
+
+# seconds after which every cached month is validated against the daily
+# summaries again, months are otherwise only validated once by a process
+FULL_VALIDATION_INTERVAL = 86400
+
+# separators used for compact json
+COMPACT = (',', ':')
+
+# tags of the day of year normals
+DAY_OF_YEAR_TAGS = ('dayTempMeanMaxjson', 'dayTempMeanMinjson', 'dayRainProbabilityjson')
+
 
 def get_first_day(dt, d_years=0, d_months=0):
     """ Return date object that is the 1st of month containing a given datetime
@@ -120,12 +277,1638 @@ def round_none(value, places):
     return value
 
 
-class MonthAverages(SearchList):
+def write_atomic(path, text):
+    """ Write text to a file atomically.
 
-    def __init__(self, generator):
-        SearchList.__init__(self, generator)
+        The text is written to a temporary file in the same directory that is
+        then renamed, so a reader never sees a partially written file.
+    """
 
-    def get_extension_list(self, timespan, db_lookup):
+    _fd, _tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                      prefix='.%s.' % os.path.basename(path))
+    try:
+        with os.fdopen(_fd, 'w') as f:
+            f.write(text)
+        # mkstemp creates the file readable by the owner only
+        os.chmod(_tmp_path, 0o644)
+        os.rename(_tmp_path, path)
+    except (IOError, OSError):
+        try:
+            os.remove(_tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def add_none(x, y):
+    """ Add two values either of which may be None. """
+
+    if x is None:
+        return y
+    if y is None:
+        return x
+    return x + y
+
+
+def sum_none(values):
+    """ Return the total of the values that are not None or None if all are. """
+
+    _values = [_v for _v in values if _v is not None]
+    return sum(_values) if _values else None
+
+
+def min_none(x, y):
+    """ Return the lesser of two values either of which may be None. """
+
+    if x is None:
+        return y
+    if y is None:
+        return x
+    return min(x, y)
+
+
+def max_none(x, y):
+    """ Return the greater of two values either of which may be None. """
+
+    if x is None:
+        return y
+    if y is None:
+        return x
+    return max(x, y)
+
+
+class MonthAccumulator(object):
+    """ Accumulate values for each month over all years of record.
+
+        Holds a running total, count, minimum and maximum for each of a fixed
+        number of bins (by default 12, ie jan .. dec) in typed arrays. Bins
+        are only considered to have data once a value has been added, so a
+        running total of zero is treated the same as any other total. None
+        values are ignored.
+
+        Finalisation is vectorised using NumPy if it is available, otherwise
+        a pure python implementation is used. Finalised results are lists
+        with None for any bin without data.
+    """
+
+    __slots__ = ('size', 'sum', 'count', 'min', 'max')
+
+    def __init__(self, size=12):
+        self.size = size
+        self.sum = array('d', [0.0]) * size
+        self.count = array('l', [0]) * size
+        self.min = array('d', [float('inf')]) * size
+        self.max = array('d', [float('-inf')]) * size
+
+    def add(self, index, value):
+        """ Add a value to bin index. """
+
+        if value is not None:
+            self.sum[index] += value
+            self.count[index] += 1
+            if value < self.min[index]:
+                self.min[index] = value
+            if value > self.max[index]:
+                self.max[index] = value
+
+    def means(self):
+        """ Return the mean of the values added to each bin. """
+
+        if numpy is not None:
+            _count = numpy.asarray(self.count)
+            _means = numpy.asarray(self.sum) / numpy.maximum(_count, 1)
+            return self._mask(_means.tolist())
+        return [_s / _c if _c > 0 else None for _s, _c in zip(self.sum, self.count)]
+
+    def mins(self):
+        """ Return the minimum value added to each bin. """
+
+        return self._mask(self.min.tolist())
+
+    def maxes(self):
+        """ Return the maximum value added to each bin. """
+
+        return self._mask(self.max.tolist())
+
+    @classmethod
+    def from_rows(cls, rows, size=12):
+        """ Create an accumulator from a sequence of rows of bin values.
+
+            Each row is a list of values, one per bin, eg a year of month
+            values from a year x month matrix.
+        """
+
+        accum = cls(size)
+        for _row in rows:
+            for _index, _value in enumerate(_row):
+                accum.add(_index, _value)
+        return accum
+
+    def get(self, agg):
+        """ Return the finalised results for a month aggregate. """
+
+        if agg == 'max':
+            return self.maxes()
+        elif agg == 'min':
+            return self.mins()
+        return self.means()
+
+    def _mask(self, values):
+        """ Replace the values of any bins without data with None. """
+
+        return [_v if _c > 0 else None for _v, _c in zip(values, self.count)]
+
+
+class QuantileSketch(object):
+    """ Bounded memory streaming quantile estimator.
+
+        Values are held in a hierarchy of compactors, a simplified form of the
+        KLL sketch. Each value at level i represents 2**i original values.
+        When a level holds more than 'capacity' values it is sorted and every
+        second value is promoted to the next level, so memory use is
+        O(capacity * log(n/capacity)). Until the first compaction the sketch
+        holds every value and quantiles are exact.
+    """
+
+    __slots__ = ('capacity', 'levels', 'offsets', 'n')
+
+    def __init__(self, capacity=128):
+        self.capacity = capacity
+        self.levels = [[]]
+        # the offset used for the next compaction of each level, alternating
+        # offsets avoids biasing the sketch
+        self.offsets = [0]
+        self.n = 0
+
+    def add(self, value):
+        """ Add a value to the sketch, None values are ignored. """
+
+        if value is not None:
+            self.levels[0].append(value)
+            self.n += 1
+            if len(self.levels[0]) > self.capacity:
+                self._compact()
+
+    def quantile(self, q):
+        """ Return the estimated q quantile (0 <= q <= 1) or None if empty.
+
+            If the sketch is exact the quantile is linearly interpolated
+            between the nearest values, otherwise the weighted value at the
+            nearest rank is returned.
+        """
+
+        if self.n == 0:
+            return None
+        if len(self.levels) == 1:
+            _values = sorted(self.levels[0])
+            _pos = q * (len(_values) - 1)
+            _lo = int(_pos)
+            _hi = min(_lo + 1, len(_values) - 1)
+            return _values[_lo] + (_values[_hi] - _values[_lo]) * (_pos - _lo)
+        _weighted = sorted((_v, 2 ** _i) for _i, _level in enumerate(self.levels) for _v in _level)
+        _total = sum(_w for _v, _w in _weighted)
+        _rank = q * _total
+        _cum = 0
+        for _v, _w in _weighted:
+            _cum += _w
+            if _cum >= _rank:
+                return _v
+        return _weighted[-1][0]
+
+    def _compact(self):
+        """ Compact any level holding more than capacity values. """
+
+        _i = 0
+        while _i < len(self.levels) and len(self.levels[_i]) > self.capacity:
+            if _i + 1 == len(self.levels):
+                self.levels.append([])
+                self.offsets.append(0)
+            _level = sorted(self.levels[_i])
+            self.levels[_i + 1].extend(_level[self.offsets[_i]::2])
+            self.offsets[_i] = 1 - self.offsets[_i]
+            self.levels[_i] = []
+            _i += 1
+
+
+def month_percentiles(rows, percentiles, size=12):
+    """ Calculate percentiles of the values in each bin of a set of rows.
+
+        Parameters:
+            rows:        A sequence of rows of bin values, eg each year of a
+                         year x month matrix.
+            percentiles: A sequence of percentiles (0 to 100) to calculate.
+            size:        The number of bins in each row.
+
+        Returns a dict keyed by percentile, each value is a list of the
+        percentile of each bin.
+    """
+
+    _sketches = [QuantileSketch() for x in range(size)]
+    for _row in rows:
+        for _index, _value in enumerate(_row):
+            _sketches[_index].add(_value)
+    return dict((_p, [_s.quantile(_p / 100.0) for _s in _sketches]) for _p in percentiles)
+
+
+def day_of_year_index(ts):
+    """ Return the day of year bin (0 to 365) of a daily summary timestamp. """
+
+    _t = time.localtime(ts)
+    return LEAP_YEAR_OFFSETS[_t[1] - 1] + _t[2] - 1
+
+
+def get_day_of_year_stats(dbm, start_ts, stop_ts, wet_threshold):
+    """ Accumulate day of year temperature and rain statistics in a single
+        pass over each of the outTemp and rain daily summaries.
+
+        Parameters:
+            dbm:           A database manager object for the database
+                           concerned.
+            start_ts:      Timestamp of the start of the period of interest.
+            stop_ts:       Timestamp of the end of the period of interest.
+            wet_threshold: The minimum daily rainfall of a wet day in
+                           database units.
+
+        Returns a dict of MonthAccumulator objects, each with DAYS_OF_YEAR
+        bins, keyed by 'meanmax' (daily maximum temperatures), 'meanmin'
+        (daily minimum temperatures) and 'wet' (1.0 for each wet day and 0.0
+        for each dry day).
+    """
+
+    accums = dict((_k, MonthAccumulator(DAYS_OF_YEAR)) for _k in ('meanmax', 'meanmin', 'wet'))
+    _sql = "SELECT dateTime, min, max FROM %s_day_outTemp " \
+           "WHERE dateTime >= ? AND dateTime < ?" % dbm.table_name
+    for _row in dbm.genSql(_sql, (start_ts, stop_ts)):
+        _index = day_of_year_index(_row[0])
+        accums['meanmin'].add(_index, _row[1])
+        accums['meanmax'].add(_index, _row[2])
+    _sql = "SELECT dateTime, sum, count FROM %s_day_rain " \
+           "WHERE dateTime >= ? AND dateTime < ?" % dbm.table_name
+    for _row in dbm.genSql(_sql, (start_ts, stop_ts)):
+        # only days with rain data count towards the rain probability, allow
+        # for floating point rounding of the daily total
+        if _row[1] is not None and _row[2]:
+            _wet = _row[1] >= wet_threshold - 1e-9
+            accums['wet'].add(day_of_year_index(_row[0]), 1.0 if _wet else 0.0)
+    return accums
+
+
+def smooth_day_of_year(accum, method='none', window=15, harmonics=3):
+    """ Return smoothed day of year means from a day of year accumulator.
+
+        The running totals and counts of each bin are smoothed rather than
+        the bin means so that bins with more data (eg 28 February compared
+        to 29 February) carry more weight and bins without data are filled.
+        Smoothing is vectorised using NumPy if it is available.
+
+        Parameters:
+            accum:     MonthAccumulator with DAYS_OF_YEAR bins.
+            method:    'none' for the bin means, 'moving' for a centred
+                       moving average over 'window' days or 'harmonic' for a
+                       least squares fit of the annual cycle and its first
+                       'harmonics' harmonics. The year is treated as
+                       circular, so 31 December is adjacent to 1 January.
+            window:    Moving average window in days.
+            harmonics: Number of harmonics fitted.
+
+        Returns a list of DAYS_OF_YEAR values, None for any day without data.
+    """
+
+    _n = len(accum.sum)
+    if method == 'moving':
+        _half = max(window, 1) // 2
+        if numpy is not None:
+            _kernel = numpy.ones(2 * _half + 1)
+            _sums = numpy.asarray(accum.sum)
+            _counts = numpy.asarray(accum.count, dtype=float)
+            # wrap each end of the year around so the convolution is circular
+            _s = numpy.convolve(numpy.concatenate((_sums[-_half:], _sums, _sums[:_half])),
+                                _kernel, 'valid') if _half else _sums
+            _c = numpy.convolve(numpy.concatenate((_counts[-_half:], _counts, _counts[:_half])),
+                                _kernel, 'valid') if _half else _counts
+            return [_v if _w > 0 else None for _v, _w in zip((_s / numpy.maximum(_c, 1)).tolist(),
+                                                             _c.tolist())]
+        result = []
+        for _i in range(_n):
+            _s = sum(accum.sum[(_i + _j) % _n] for _j in range(-_half, _half + 1))
+            _c = sum(accum.count[(_i + _j) % _n] for _j in range(-_half, _half + 1))
+            result.append(_s / _c if _c > 0 else None)
+        return result
+    elif method == 'harmonic':
+        # weighted least squares fit of a constant plus the harmonics, the
+        # normal equations use the bin totals and counts directly
+        _p = 2 * harmonics + 1
+        if sum(1 for _c in accum.count if _c > 0) >= _p:
+            if numpy is not None:
+                _t = 2 * numpy.pi * numpy.arange(_n) / _n
+                _x = numpy.column_stack([numpy.ones(_n)] +
+                                        [_f(_k * _t) for _k in range(1, harmonics + 1)
+                                         for _f in (numpy.cos, numpy.sin)])
+                _a = _x.T.dot(_x * numpy.asarray(accum.count, dtype=float)[:, None])
+                _b = _x.T.dot(numpy.asarray(accum.sum))
+                return _x.dot(numpy.linalg.lstsq(_a, _b, rcond=None)[0]).tolist()
+            _x = []
+            for _i in range(_n):
+                _t = 2 * math.pi * _i / _n
+                _x.append([1.0] + [_f(_k * _t) for _k in range(1, harmonics + 1)
+                                   for _f in (math.cos, math.sin)])
+            _a = [[sum(_x[_i][_r] * _x[_i][_q] * accum.count[_i] for _i in range(_n))
+                   for _q in range(_p)] for _r in range(_p)]
+            _b = [sum(_x[_i][_r] * accum.sum[_i] for _i in range(_n)) for _r in range(_p)]
+            _coef = solve_linear(_a, _b)
+            if _coef is not None:
+                return [sum(_c * _v for _c, _v in zip(_coef, _row)) for _row in _x]
+    return accum.means()
+
+
+def solve_linear(a, b):
+    """ Solve the linear equations a.x = b by Gaussian elimination.
+
+        Returns the solution x as a list or None if a is singular.
+    """
+
+    _n = len(b)
+    _m = [list(_row) + [_b] for _row, _b in zip(a, b)]
+    for _col in range(_n):
+        _pivot = max(range(_col, _n), key=lambda _r: abs(_m[_r][_col]))
+        if abs(_m[_pivot][_col]) < 1e-12:
+            return None
+        _m[_col], _m[_pivot] = _m[_pivot], _m[_col]
+        for _r in range(_col + 1, _n):
+            _f = _m[_r][_col] / _m[_col][_col]
+            for _k in range(_col, _n + 1):
+                _m[_r][_k] -= _f * _m[_col][_k]
+    x = [0.0] * _n
+    for _r in range(_n - 1, -1, -1):
+        x[_r] = (_m[_r][_n] - sum(_m[_r][_k] * x[_k] for _k in range(_r + 1, _n))) / _m[_r][_r]
+    return x
+
+
+def get_month_stats(dbm, obs_type, start_ts, stop_ts, day_avgs=False):
+    """ Calculate month aggregates for an observation type in a single pass.
+
+        Reads the daily summary rows for obs_type once and groups them by
+        calendar month. Aggregates are calculated the same way
+        getAggregate() calculates them from the daily summaries, ie null
+        values are ignored and an aggregate over no non-null values is None.
+        Plain SQL is used so that both SQLite and MySQL databases are
+        supported.
+
+        Parameters:
+            dbm:      A database manager object for the database concerned.
+            obs_type: The observation type of interest, eg 'outTemp'.
+            start_ts: Timestamp of the start of the period of interest.
+            stop_ts:  Timestamp of the end of the period of interest.
+            day_avgs: Whether to include a list of the average of each day
+                      with data, used to calculate degree days.
+
+        Returns a dict keyed by (year, month) tuple. Each value is a dict of
+        aggregate values keyed by aggregate type ('sum', 'avg', 'max', 'min',
+        'meanmax', 'meanmin' and 'count'), the times of the month maximum and
+        minimum ('maxtime' and 'mintime'), the number of daily summary rows
+        used ('rows'), the number of days with data ('days'), the longest run
+        of consecutive days without data ('max_gap') and the fingerprint of
+        the daily summary rows used ('fp', refer get_fingerprint()) and, if
+        day_avgs is True, a list of the average of each day with data
+        ('day_avgs'). Months with no daily summary rows are not included.
+    """
+
+    _sql = "SELECT dateTime, min, mintime, max, maxtime, sum, count, wsum, sumtime " \
+           "FROM %s_day_%s " \
+           "WHERE dateTime >= ? AND dateTime < ? ORDER BY dateTime" % (dbm.table_name,
+                                                                       obs_type)
+    return month_stats_from_rows(dbm.genSql(_sql, (start_ts, stop_ts)), day_avgs)
+
+
+def month_stats_from_rows(rows, day_avgs=False):
+    """ Calculate month aggregates from a sequence of daily summary rows.
+
+        The rows of each month are found by comparing the row timestamps with
+        the timestamps of the start of each month and the aggregates of each
+        month are then calculated column by column.
+
+        Parameters:
+            rows:     Iterable of daily summary rows in date order, each row
+                      is a sequence (dateTime, min, mintime, max, maxtime,
+                      sum, count, wsum, sumtime).
+            day_avgs: Whether to include a list of the average of each day
+                      with data.
+
+        Returns a dict of month aggregates keyed by (year, month) tuple as
+        per get_month_stats().
+    """
+
+    _rows = list(rows)
+    month_stats = {}
+    if not _rows:
+        return month_stats
+    _times = [_row[0] for _row in _rows]
+    # daily summary dateTime is midnight local time so localtime gives us
+    # the year and month the first day belongs to
+    _month = date(*time.localtime(_times[0])[0:2] + (1,))
+    _month_ts = int(time.mktime(_month.timetuple()))
+    _lo = 0
+    while _lo < len(_rows):
+        _next = get_first_day(_month, d_months=1)
+        _next_ts = int(time.mktime(_next.timetuple()))
+        _hi = bisect_left(_times, _next_ts, _lo)
+        if _hi > _lo:
+            month_stats[(_month.year, _month.month)] = month_stats_from_columns(
+                zip(*_rows[_lo:_hi]), _month_ts, (_next - _month).days, day_avgs)
+        _lo = _hi
+        _month, _month_ts = _next, _next_ts
+    return month_stats
+
+
+def month_stats_from_columns(columns, month_ts, days_in_month, day_avgs=False):
+    """ Calculate the aggregates of a month from its daily summary columns.
+
+        Parameters:
+            columns:       Sequence of the daily summary columns of the month
+                           in the order of the rows of
+                           month_stats_from_rows().
+            month_ts:      Timestamp of the start of the month.
+            days_in_month: The number of days in the month.
+            day_avgs:      Whether to include a list of the average of each
+                           day with data.
+
+        Returns a dict of month aggregates as per get_month_stats().
+    """
+
+    date_times, mins, mintimes, maxes, maxtimes, sums, counts, wsums, sumtimes = columns
+    _mins = [_v for _v in mins if _v is not None]
+    _maxes = [_v for _v in maxes if _v is not None]
+    # the time of the first occurrence of each extreme is kept
+    _min = min(_mins) if _mins else None
+    _max = max(_maxes) if _maxes else None
+    _wsum = sum_none(wsums)
+    _sumtime = sum_none(sumtimes)
+    _count = sum_none(counts)
+    _sum = sum_none(sums)
+    # the day of the month of each day with data, the half day allows for a
+    # daylight saving change during the month
+    _days = [(_ts - month_ts + 43200) // 86400 + 1
+             for _ts, _n in zip(date_times, counts) if _n]
+    # the longest run of days without data, including any days after the last
+    # day with data
+    _max_gap = max([_d - _prev - 1 for _prev, _d in zip([0] + _days, _days)] +
+                   [days_in_month - (_days[-1] if _days else 0)])
+    stats = {'min': _min,
+             'mintime': mintimes[mins.index(_min)] if _mins else None,
+             'max': _max,
+             'maxtime': maxtimes[maxes.index(_max)] if _maxes else None,
+             'sum': _sum,
+             'avg': _wsum / _sumtime if _wsum is not None and _sumtime else None,
+             'count': _count,
+             'meanmin': sum(_mins) / len(_mins) if _mins else None,
+             'meanmax': sum(_maxes) / len(_maxes) if _maxes else None,
+             'rows': len(date_times),
+             'days': len(_days),
+             'max_gap': _max_gap,
+             # the same totals as get_fingerprint() obtains from the daily
+             # summaries
+             'fp': [len(date_times), _count, _sum, _min, _max,
+                    sum(_mins) if _mins else None, sum(_maxes) if _maxes else None,
+                    _wsum, _sumtime, sum_none(mintimes), sum_none(maxtimes)]}
+    if day_avgs:
+        stats['day_avgs'] = [_w / _t for _w, _t in zip(wsums, sumtimes)
+                             if _w is not None and _t]
+    return stats
+
+
+def month_degree_days(stats, obs_type, base):
+    """ Return the degree day total of a month.
+
+        The degree days of each day are calculated from the average
+        temperature of the day the same way WeeWX calculates heatdeg, cooldeg
+        and growdeg.
+
+        Parameters:
+            stats:    Dict of outTemp month aggregates as per
+                      get_month_stats().
+            obs_type: The degree day type, 'heatdeg', 'cooldeg' or 'growdeg'.
+            base:     The base temperature in the units of the month
+                      aggregates.
+
+        Returns the degree day total or None if the month has no days with
+        data.
+    """
+
+    _avgs = stats.get('day_avgs')
+    if not _avgs:
+        return None
+    if obs_type == 'heatdeg':
+        return sum(max(base - _t, 0.0) for _t in _avgs)
+    return sum(max(_t - base, 0.0) for _t in _avgs)
+
+
+def month_value(stats, agg):
+    """ Return a month aggregate value from a dict of month aggregates.
+
+        The 'mean' aggregate is the mean of the 'meanmax' and 'meanmin'
+        aggregates, if either is None the mean is None.
+    """
+
+    if agg == 'mean':
+        if stats.get('meanmax') is not None and stats.get('meanmin') is not None:
+            return (stats['meanmax'] + stats['meanmin']) / 2
+        return None
+    return stats.get(agg)
+
+
+def obs_tag(obs_type, agg, suffix=''):
+    """ Return the tag name used for a given observation and aggregate.
+
+        eg: obs_tag('windSpeed', 'max') returns 'monthWindSpeedMaxjson'
+            obs_tag('rain', 'sum', 'Years') returns 'monthRainSumYearsjson'
+    """
+
+    return 'month%s%s%s%sjson' % (obs_type[0].upper(), obs_type[1:], agg.capitalize(), suffix)
+
+
+def format_places(fmt, default=1):
+    """ Return the number of decimal places of a string format.
+
+        eg: format_places('%.1f') returns 1
+            format_places('%.10f') returns 10
+            format_places('%d') returns 0
+
+        If fmt is None or is not a recognised format default is returned.
+    """
+
+    _match = re.search(r'%[-+ #0]*\d*(?:\.(\d+))?([diouxXeEfFgG])', fmt or '')
+    if _match is None:
+        return default
+    if _match.group(2) in 'diouxX':
+        return 0
+    if _match.group(1) is not None:
+        return int(_match.group(1))
+    # python formats without a precision use 6 decimal places
+    return 6 if _match.group(2) in 'fF' else default
+
+
+def payload_hash(payload):
+    """ Return a content hash of a JSON payload.
+
+        The hash is the first 16 hex digits of the SHA-1 of the payload, it
+        is used to name versioned JSON data files.
+    """
+
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def get_db_id(dbm):
+    """ Return a string identifying the database and table used by dbm.
+
+        A SQLite database is identified by the path of the database file and
+        a MySQL database by the host name and port of the server and the
+        database name, so databases of the same name on different servers
+        have different identities.
+    """
+
+    _conn = dbm.connection
+    if getattr(_conn, 'dbtype', None) == 'mysql':
+        try:
+            _server = '%s:%s' % tuple(dbm.getSql("SELECT @@hostname, @@port"))
+        except weedb.DatabaseError:
+            _server = ''
+        _database = '%s/%s' % (_server, _conn.database_name)
+    else:
+        _database = getattr(_conn, 'file_path', getattr(_conn, 'database_name', ''))
+    return '%s:%s' % (_database, dbm.table_name)
+
+
+def get_fingerprint(dbm, obs_type, start_ts, stop_ts):
+    """ Obtain a fingerprint of the daily summary rows in a given period.
+
+        The fingerprint is an 11 element list: [number of rows, total count,
+        total sum, min, max, total of mins, total of maxes, total wsum, total
+        sumtime, total of mintimes, total of maxtimes]. Any change to the
+        daily summaries for the period that alters a month aggregate or the
+        time of a month maximum or minimum, eg a backfill or a rebuild of the
+        daily summaries with altered archive data, will almost certainly
+        change the fingerprint.
+    """
+
+    _sql = "SELECT COUNT(*), SUM(count), SUM(sum), MIN(min), MAX(max), SUM(min), SUM(max), " \
+           "SUM(wsum), SUM(sumtime), SUM(mintime), SUM(maxtime) " \
+           "FROM %s_day_%s WHERE dateTime >= ? AND dateTime < ?" % (dbm.table_name,
+                                                                    obs_type)
+    _row = dbm.getSql(_sql, (start_ts, stop_ts))
+    if _row is None:
+        return list(EMPTY_FINGERPRINT)
+    # some databases return totals of integer columns as decimals, use int
+    # for counts and times so they are compared exactly
+    return [(int(_x) if _i in FINGERPRINT_INTEGERS else float(_x)) if _x is not None else None
+            for _i, _x in enumerate(_row)]
+
+
+def month_fingerprint(stats):
+    """ Return the fingerprint of a month from the month aggregates. """
+
+    if not stats:
+        return list(EMPTY_FINGERPRINT)
+    return list(stats['fp'])
+
+
+def combine_fingerprints(fingerprints):
+    """ Combine a sequence of fingerprints into a single fingerprint.
+
+        The min and max elements are the overall min and max, all other
+        elements are totals.
+    """
+
+    _fp = list(EMPTY_FINGERPRINT)
+    for _f in fingerprints:
+        _fp = [min_none(_x, _y) if _i == 3 else max_none(_x, _y) if _i == 4 else add_none(_x, _y)
+               for _i, (_x, _y) in enumerate(zip(_fp, _f))]
+    return _fp
+
+
+def fingerprints_match(fp1, fp2):
+    """ Compare two fingerprints allowing for floating point rounding.
+
+        Counts and times are compared exactly.
+    """
+
+    for _i, (_x, _y) in enumerate(zip(fp1, fp2)):
+        if _x is None or _y is None:
+            if _x is not _y:
+                return False
+        elif _i in FINGERPRINT_INTEGERS:
+            if int(_x) != int(_y):
+                return False
+        elif abs(_x - _y) > 1e-9 * max(1.0, abs(_x), abs(_y)):
+            return False
+    return True
+
+
+class MonthStatsCache(object):
+    """ Persistent store of month aggregates for one or more observations.
+
+        Month aggregates for complete months are saved in a JSON format file
+        so that subsequent runs need only query the daily summaries for new
+        months. The cache is keyed by database identity, a cache belonging to
+        a different database is discarded. Cached months are validated
+        against a fingerprint of the daily summaries, first over the whole
+        cached period then by year and finally by month so that only those
+        months that have changed (eg due to a backfill or rebuild of the
+        daily summaries) are queried again.
+
+        If validate is False cached months are used without being validated,
+        this is intended for use when the cache is maintained by the
+        AveragesService.
+
+        One MonthStatsCache is shared by the SLE, the AveragesService and any
+        background refresh of a WeeWX process, refer get_month_stats_cache(),
+        so the cache file is only read when it has been changed by another
+        process, eg the command line interface. Each cached month is only
+        validated once by a process, and again once FULL_VALIDATION_INTERVAL
+        has passed, so each report cycle need only validate new months.
+    """
+
+    # increment if the format of the cache file changes
+    VERSION = 7
+
+    def __init__(self, path, db_id, validate=True):
+        self.path = path
+        self.db_id = db_id
+        self.validate = validate
+        # the cache may be used by more than one thread
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.obs = {}
+        # the cached months validated by this process for each observation
+        # and when the validated months were last cleared
+        self.validated = {}
+        self.validated_ts = time.time()
+        # the modification time and size of the cache file when last read or
+        # written
+        self.file_id = None
+        # whether the last attempt to save the cache failed, so that an
+        # unwritable cache file is logged once rather than every run
+        self.save_failed = False
+        self.load()
+
+    def load(self, merge=False):
+        """ Read the cache file.
+
+            Parameters:
+                merge: If True months in the cache file that are not held are
+                       added, otherwise the cache file replaces any data held.
+        """
+
+        with self.lock:
+            self.file_id = self._file_id()
+            try:
+                with open(self.path, 'r') as f:
+                    _cache = json.load(f)
+            except (IOError, OSError, ValueError):
+                # the cache does not exist or is unreadable, start afresh
+                _cache = {}
+            _obs = {}
+            if _cache.get('version') == self.VERSION and _cache.get('db_id') == self.db_id:
+                for _o, _months in _cache.get('obs', {}).items():
+                    _obs[_o] = dict(((int(_k[0:4]), int(_k[5:7])), _v) for _k, _v in _months.items())
+            elif _cache:
+                logdbg("Discarding month stats cache '%s'" % self.path)
+            if merge:
+                for _o, _months in _obs.items():
+                    for _key, _month in _months.items():
+                        self.obs.setdefault(_o, {}).setdefault(_key, _month)
+            else:
+                self.obs = _obs
+                self.validated = {}
+
+    def refresh(self):
+        """ Prepare the cache for use by a new run.
+
+            The cache file is read again if it has been changed by another
+            process and the validated months are cleared once
+            FULL_VALIDATION_INTERVAL has passed so that changes to the daily
+            summaries of long cached months are found.
+        """
+
+        with self.lock:
+            if self._file_id() != self.file_id:
+                logdbg("Month stats cache '%s' changed, reloading" % self.path)
+                self.load(merge=self.dirty)
+            if time.time() - self.validated_ts > FULL_VALIDATION_INTERVAL:
+                self.validated = {}
+                self.validated_ts = time.time()
+
+    def get_month_stats(self, dbm, obs_type, start_ts, stop_ts, updated=None, day_avgs=False):
+        """ Return month aggregates using cached data where possible.
+
+            Takes the same parameters and returns the same result as
+            get_month_stats(). The (year, month) keys of any cacheable months
+            that were queried are added to the set updated if given. If
+            day_avgs is True any cached month without the day averages is
+            queried again.
+        """
+
+        with self.lock:
+            return self._get_month_stats(dbm, obs_type, start_ts, stop_ts,
+                                         updated if updated is not None else set(), day_avgs)
+
+    def _get_month_stats(self, dbm, obs_type, start_ts, stop_ts, updated, day_avgs):
+        _cached = self.obs.setdefault(obs_type, {})
+        _validated = self.validated.setdefault(obs_type, set())
+        _spans = list(genMonthSpans(start_ts, stop_ts))
+        # only complete months may be cached, the remainder are always queried
+        _complete = [_s for _s in _spans if _s.start >= start_ts and _s.stop <= stop_ts]
+        _keys = dict((self._key(_s), _s) for _s in _complete)
+        _invalid = set()
+        if self.validate:
+            # only validate those cached months we have not yet validated
+            _to_validate = [_k for _k in sorted(_cached) if _k in _keys and _k not in _validated]
+            for _run in self._key_runs(_to_validate):
+                _invalid.update(self._validate(dbm, obs_type, _run, _keys))
+            _validated.update(_k for _k in _to_validate if _k not in _invalid)
+        month_stats = {}
+        _to_query = []
+        for _span in _spans:
+            _key = self._key(_span)
+            _stats = _cached.get(_key, {}).get('stats')
+            if _key in _cached and _key in _keys and _key not in _invalid and \
+                    not (day_avgs and _stats and 'day_avgs' not in _stats):
+                if _stats:
+                    month_stats[_key] = _stats
+            else:
+                _to_query.append(_span)
+        # query each contiguous run of months we need with a single pass
+        for _start, _stop in self._runs(_to_query):
+            _stats = get_month_stats(dbm, obs_type, max(_start, start_ts), min(_stop, stop_ts),
+                                     day_avgs)
+            month_stats.update(_stats)
+            for _span in _to_query:
+                _key = self._key(_span)
+                if _start <= _span.start < _stop and _key in _keys:
+                    _cached[_key] = {'stats': _stats.get(_key, {}),
+                                     'fp': month_fingerprint(_stats.get(_key))}
+                    _validated.add(_key)
+                    updated.add(_key)
+                    self.dirty = True
+        return month_stats
+
+    def add_month(self, obs_type, key, stats):
+        """ Add the month aggregates for a complete month to the cache.
+
+            Parameters:
+                obs_type: The observation type concerned.
+                key:      The (year, month) of the month concerned.
+                stats:    Dict of month aggregates as per get_month_stats(),
+                          an empty dict if there was no data.
+        """
+
+        with self.lock:
+            self.obs.setdefault(obs_type, {})[tuple(key)] = {'stats': stats,
+                                                             'fp': month_fingerprint(stats)}
+            # the month was not obtained from the daily summaries
+            self.validated.get(obs_type, set()).discard(tuple(key))
+            self.dirty = True
+
+    def month_stats(self, obs_type, key):
+        """ Return the cached month aggregates for a (year, month) key. """
+
+        with self.lock:
+            return self.obs.get(obs_type, {}).get(key, {}).get('stats', {})
+
+    def save(self):
+        """ Save the cache if it has changed.
+
+            If the cache file has been changed by another process since it
+            was read any months it holds that we do not are kept.
+        """
+
+        with self.lock:
+            if not self.dirty:
+                return
+            if self._file_id() != self.file_id:
+                self.load(merge=True)
+            _obs = {}
+            for _obs_type, _months in self.obs.items():
+                _obs[_obs_type] = dict(('%04d-%02d' % _k, _v) for _k, _v in _months.items())
+            _cache = {'version': self.VERSION,
+                      'db_id': self.db_id,
+                      'obs': _obs}
+            try:
+                write_atomic(self.path, json.dumps(_cache, separators=(',', ':')))
+            except (IOError, OSError) as e:
+                # the months are still held by this process so only the first
+                # failure is logged as an error
+                if self.save_failed:
+                    logdbg("Unable to save month stats cache '%s': %s" % (self.path, e))
+                else:
+                    logerr("Unable to save month stats cache '%s': %s. Months will be "
+                           "cached in memory only, set cache_file to a writable "
+                           "location" % (self.path, e))
+                    self.save_failed = True
+                return
+            if self.save_failed:
+                loginf("Saved month stats cache '%s'" % self.path)
+                self.save_failed = False
+            self.dirty = False
+            self.file_id = self._file_id()
+
+    def _file_id(self):
+        """ Return the modification time and size of the cache file, None if
+            it does not exist.
+        """
+
+        try:
+            _stat = os.stat(self.path)
+        except (IOError, OSError):
+            return None
+        return _stat.st_mtime, _stat.st_size
+
+    def _validate(self, dbm, obs_type, keys, spans):
+        """ Return a list of the cached months whose daily summaries changed.
+
+            The fingerprint of all cached months is checked first, if that
+            does not match each year is checked and then each month of any
+            year that does not match.
+        """
+
+        if not keys:
+            return []
+        _cached = self.obs[obs_type]
+        if self._match(dbm, obs_type, keys, spans):
+            return []
+        invalid = []
+        for _year in sorted(set(_k[0] for _k in keys)):
+            _year_keys = [_k for _k in keys if _k[0] == _year]
+            if not self._match(dbm, obs_type, _year_keys, spans):
+                for _key in _year_keys:
+                    if not self._match(dbm, obs_type, [_key], spans):
+                        invalid.append(_key)
+        logdbg("Month stats cache: %d invalid '%s' months" % (len(invalid), obs_type))
+        return invalid
+
+    def _match(self, dbm, obs_type, keys, spans):
+        """ Does the fingerprint of a contiguous list of cached months match
+            the daily summaries.
+        """
+
+        _fp = get_fingerprint(dbm, obs_type, spans[keys[0]].start, spans[keys[-1]].stop)
+        return fingerprints_match(_fp, combine_fingerprints(self.obs[obs_type][_k]['fp']
+                                                            for _k in keys))
+
+    @staticmethod
+    def _key(span):
+        _d = date.fromtimestamp(span.start)
+        return _d.year, _d.month
+
+    @staticmethod
+    def _key_runs(keys):
+        """ Split a sorted list of (year, month) keys into lists of
+            consecutive months.
+        """
+
+        runs = []
+        for _key in keys:
+            if runs and runs[-1][-1][0] * 12 + runs[-1][-1][1] + 1 == _key[0] * 12 + _key[1]:
+                runs[-1].append(_key)
+            else:
+                runs.append([_key])
+        return runs
+
+    @staticmethod
+    def _runs(spans):
+        """ Generate (start, stop) tuples for each contiguous run of spans. """
+
+        _start = _stop = None
+        for _span in spans:
+            if _stop is not None and _span.start == _stop:
+                _stop = _span.stop
+            else:
+                if _start is not None:
+                    yield _start, _stop
+                _start, _stop = _span.start, _span.stop
+        if _start is not None:
+            yield _start, _stop
+
+
+# the month stats caches of this process keyed by cache file path, shared so
+# that the SLE, AveragesService and background refreshes do not overwrite
+# each other's changes
+month_stats_caches = {}
+month_stats_caches_lock = threading.Lock()
+
+
+def get_month_stats_cache(path, db_id, validate=True):
+    """ Return the shared MonthStatsCache for a cache file.
+
+        The cache is prepared for use by a new run, refer
+        MonthStatsCache.refresh().
+
+        Parameters:
+            path:     Path of the cache file.
+            db_id:    The identity of the database, refer get_db_id().
+            validate: Whether cached months are validated against the daily
+                      summaries.
+
+        Returns a MonthStatsCache object.
+    """
+
+    with month_stats_caches_lock:
+        _cache = month_stats_caches.get(path)
+        if _cache is None or _cache.db_id != db_id:
+            _cache = month_stats_caches[path] = MonthStatsCache(path, db_id, validate)
+        else:
+            _cache.validate = validate
+            _cache.refresh()
+        return _cache
+
+
+class AveragesStats(object):
+    """ Timings and counters for a single calculation of the averages.
+
+        Time is accumulated against named phases. Phases may be nested, time
+        spent in a nested phase is charged to that phase only so the phase
+        timings sum to the total time spent in all phases.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+        self._stack = []
+        self._mark = None
+
+    @contextmanager
+    def phase(self, name):
+        """ Context manager that charges the time spent within it to a phase. """
+
+        self._charge()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._charge()
+            self._stack.pop()
+
+    def count(self, name, n=1):
+        """ Increment a counter. """
+
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self):
+        """ Return the timings and counters as a dict. """
+
+        return {'timings': dict((_k, round(_v, 6)) for _k, _v in self.timings.items()),
+                'counters': dict(self.counters),
+                'total': round(sum(self.timings.values()), 6)}
+
+    def _charge(self):
+        """ Charge the time since the last mark to the current phase. """
+
+        _now = time.time()
+        if self._stack:
+            _phase = self._stack[-1]
+            self.timings[_phase] = self.timings.get(_phase, 0.0) + _now - self._mark
+        self._mark = _now
+
+
+class CountingManager(object):
+    """ Database manager proxy that counts calls to the database.
+
+        Calls to the methods in CALLS are counted in an AveragesStats object,
+        all other attributes are passed through to the database manager.
+    """
+
+    CALLS = ('getSql', 'genSql', 'getRecord', 'getAggregate',
+             'firstGoodStamp', 'lastGoodStamp')
+
+    def __init__(self, dbm, stats):
+        self._dbm = dbm
+        self._stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self._dbm, name)
+        if name not in self.CALLS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self._stats.count('db_calls')
+            self._stats.count('db_calls_%s' % name)
+            return attr(*args, **kwargs)
+        return counted
+
+
+class AveragesTags(Mapping):
+    """ The search list tags of a calculation of the averages.
+
+        The year x month matrices of month aggregates are obtained with a
+        single data pass when the averages are calculated, the value of each
+        tag is only derived from the matrices when the tag is first accessed.
+        Normals, breakdowns, unit conversion, rounding and JSON encoding are
+        performed only for those tags a template uses and any work shared by
+        more than one tag is done once. Day of year normals are only queried
+        if a day of year tag is accessed.
+
+        Each tag other than averagesHash and averagesStats is the JSON
+        encoding of a series, eg $monthRainAvgjson is the monthRainAvg
+        series. Series are derived in database units and then converted,
+        rounded and assembled by a single format stage, refer format(). The
+        12 way series derived from the month normals or extremes alone are
+        cheap, the first access to one of them formats every such series of
+        the same database unit in one stage, so the converter is called once
+        per unit however many of them a template uses. The averagesjson tag
+        is a JSON object holding every series keyed by series name, all
+        series are formatted in one stage and encoded once.
+
+        Parameters:
+            averages:  The Averages object whose config is used.
+            stats:     The AveragesStats of the calculation, the time taken
+                       to derive each tag is charged to it.
+            matrix:    Dict of year x month matrices keyed by observation and
+                       aggregate, degree day totals are keyed by degree day
+                       type and 'sum'.
+            times:     Dict of year x month matrices of the time of each month
+                       maximum and minimum keyed by observation and aggregate.
+            complete:  Dict of year x month matrices of the completeness of
+                       each month keyed by observation.
+            keys:      List of the (year, month) keys of the months used.
+            units:     Dict of (unit, group) tuples of the database units
+                       keyed by observation.
+            db_lookup: Function that returns a database manager, used for the
+                       day of year normals only.
+            us_units:  The unit system of the database.
+    """
+
+    def __init__(self, averages, stats, matrix, times, complete, keys, units, db_lookup,
+                 us_units):
+        self.averages = averages
+        self.stats = stats
+        self.matrix = matrix
+        self.times = times
+        self.complete = complete
+        self.month_keys = keys
+        self.units = units
+        self.db_lookup = db_lookup
+        self.us_units = us_units
+        # intermediate results shared by more than one series
+        self._memo = {}
+        # formatted series and encoded tags already derived
+        self._series = {}
+        self._values = {}
+        # the function and arguments used to derive each series, first a
+        # series for each observation and aggregate and its breakdowns
+        self._getters = {}
+        for _obs, _aggs in self.averages.obs:
+            self._getters[obs_tag(_obs, '', 'Completeness')[:-4]] = (self._completeness, (_obs,))
+            for _agg in _aggs:
+                self._getters[obs_tag(_obs, _agg)[:-4]] = (self._vector, (_obs, _agg))
+                for _suffix in BREAKDOWNS:
+                    self._getters[obs_tag(_obs, _agg, _suffix)[:-4]] = (self._breakdown,
+                                                                        (_obs, _agg, _suffix))
+                if _agg in EXTREME_AGGREGATES:
+                    self._getters[obs_tag(_obs, _agg, 'Time')[:-4]] = (self._time, (_obs, _agg))
+        # and the degree day totals and their breakdowns
+        for _dd, _base in self.averages.degree_days:
+            if _dd in self.matrix:
+                self._getters[obs_tag(_dd, 'sum')[:-4]] = (self._vector, (_dd, 'sum'))
+                for _suffix in BREAKDOWNS:
+                    self._getters[obs_tag(_dd, 'sum', _suffix)[:-4]] = (self._breakdown,
+                                                                        (_dd, 'sum', _suffix))
+        if self.averages.day_of_year:
+            for _tag in DAY_OF_YEAR_TAGS:
+                self._getters[_tag[:-4]] = (self._day_of_year, (_tag,))
+        # then the series used by the default template, these are set last
+        # so that they cannot be replaced by a series of the same name
+        for _tag, _obs, _agg in LEGACY_TAGS:
+            self._getters[_tag[:-4]] = (self._vector, (_obs, _agg))
+        self._getters['monthTempMeanMinMax'] = (self._pairs, ('outTemp', 'meanmin', 'meanmax'))
+        self._getters['monthRainMedian'] = (self._percentiles, ('rain', 'sum', (50,), 'vector'))
+        self._getters['monthRainDeciles'] = (self._percentiles, ('rain', 'sum', (10, 90), 'pairs'))
+        self._getters['monthTempMeanDeciles'] = (self._percentiles, ('outTemp', 'mean', (10, 90),
+                                                                     'pairs'))
+        # the wettest and driest year of each month
+        self._getters['monthRainWettest'] = (self._extreme, ('rain', 'sum', 'highest'))
+        self._getters['monthRainDriest'] = (self._extreme, ('rain', 'sum', 'lowest'))
+        self._tags = ['%sjson' % _name for _name in self._getters] + \
+                     ['averagesjson', 'averagesHash', 'averagesStats']
+        # the cheap series of each database unit, keyed by series name
+        _cheap = {}
+        for _name, (_func, _args) in self._getters.items():
+            if _func in (self._vector, self._pairs, self._extreme):
+                _cheap.setdefault(self.units[_args[0]], []).append(_name)
+        self._batches = dict((_name, _names) for _names in _cheap.values() for _name in _names)
+
+    def __getitem__(self, tag):
+        if tag == 'averagesStats':
+            # the stats change as tags are derived so are never saved
+            return self.stats.to_dict()
+        if tag not in self._values:
+            if tag == 'averagesjson':
+                self._values[tag] = self._encode(self.format(list(self._getters)), COMPACT)
+            elif tag == 'averagesHash':
+                self._values[tag] = payload_hash(self['averagesjson'])
+            elif tag.endswith('json') and tag[:-4] in self._getters:
+                _name = tag[:-4]
+                # a cheap series is formatted along with the other cheap
+                # series of its unit
+                _series = self.format(self._batches.get(_name, [_name]))[_name]
+                # day of year series are long so are encoded compactly
+                self._values[tag] = self._encode(_series,
+                                                 COMPACT if tag in DAY_OF_YEAR_TAGS else None)
+            else:
+                raise KeyError(tag)
+        return self._values[tag]
+
+    def __iter__(self):
+        return iter(self._tags)
+
+    def __len__(self):
+        return len(self._tags)
+
+    def __contains__(self, tag):
+        return tag in self._tags
+
+    def format(self, names):
+        """ Convert, round and assemble a number of series in a single stage.
+
+            The vectors of all series with the same database unit are
+            concatenated and converted to the units required by the skin with
+            a single call to the converter. Anomalies are then calculated
+            from the converted values so that any conversion offset cancels
+            out and each vector is rounded to the number of decimal places
+            of the skin string format of the converted unit. Series without a
+            unit are neither converted nor rounded.
+
+            Parameters:
+                names: List of the names of the series concerned.
+
+            Returns a dict of formatted series keyed by series name.
+        """
+
+        _names = [_n for _n in names if _n not in self._series]
+        _raw = [self._raw(_n) for _n in _names]
+        # gather the vectors to be converted by unit
+        _by_unit = {}
+        for _i, (_kind, _unit, _group, _keys, _vecs) in enumerate(_raw):
+            if _unit is not None:
+                _by_unit.setdefault((_unit, _group), []).extend((_i, _j) for _j in range(len(_vecs)))
+        _converted = [list(_r[4]) for _r in _raw]
+        for (_unit, _group), _refs in _by_unit.items():
+            _flat = []
+            for _i, _j in _refs:
+                _flat.extend(_raw[_i][4][_j])
+            with self.stats.phase('unit_conversion'):
+                _flat = self.averages.converter.convert(ValueTuple(_flat, _unit, _group)).value
+            self.stats.count('conversions')
+            _pos = 0
+            for _i, _j in _refs:
+                _n = len(_raw[_i][4][_j])
+                _converted[_i][_j] = _flat[_pos:_pos + _n]
+                _pos += _n
+        for _name, (_kind, _unit, _group, _keys, _vecs), _conv in zip(_names, _raw, _converted):
+            if _kind == 'anomalies':
+                # anomalies are relative to the long term mean, the first
+                # vector
+                _means = _conv[0]
+                _conv = [[_v - _m if _v is not None and _m is not None else None
+                          for _v, _m in zip(_row, _means)] for _row in _conv[1:]]
+            if _unit is not None:
+                _places = self._places(_unit, _group)
+                with self.stats.phase('rounding'):
+                    _conv = [[round_none(_x, _places) for _x in _vec] for _vec in _conv]
+            if _kind == 'vector':
+                self._series[_name] = _conv[0]
+            elif _kind == 'pairs':
+                self._series[_name] = [list(_pair) for _pair in zip(*_conv)]
+            elif _kind == 'labelled':
+                self._series[_name] = [[_k, _v] for _k, _v in zip(_keys, _conv[0])]
+            else:
+                self._series[_name] = dict(('%g' % _k, _vec) for _k, _vec in zip(_keys, _conv))
+        return dict((_n, self._series[_n]) for _n in names)
+
+    def accumulator(self, obs_type, agg):
+        """ Return the MonthAccumulator of the normals of an observation and
+            aggregate.
+        """
+
+        _key = ('accumulator', obs_type, agg)
+        if _key not in self._memo:
+            with self.stats.phase('aggregate_%s' % agg):
+                self._memo[_key] = MonthAccumulator.from_rows(self.matrix[obs_type][agg].values())
+        return self._memo[_key]
+
+    def _raw(self, name):
+        """ Return a series before unit conversion and rounding.
+
+            Returns a tuple (kind, unit, group, keys, vectors) where kind is
+            how the formatted series is assembled from the vectors:
+                'vector':    a single 12 (or 366) way list
+                'pairs':     a 12 way list of 2 way lists, one value from each
+                             vector
+                'labelled':  a 12 way list of 2 way lists (key, value)
+                'breakdown': a dict of vectors keyed by keys
+                'anomalies': a dict keyed by keys of the difference between
+                             each vector after the first and the first
+            and unit and group are the database unit and unit group, None if
+            the series is not converted.
+        """
+
+        _func, _args = self._getters[name]
+        return _func(*_args)
+
+    def _vector(self, obs_type, agg):
+        """ The month normals of an observation and aggregate.
+
+            Averages are a simple average over the years with data, max and
+            min are the extremes over all years.
+        """
+
+        _accum = self.accumulator(obs_type, agg)
+        with self.stats.phase('aggregate_%s' % agg):
+            return ('vector',) + self.units[obs_type] + (None, [_accum.get(agg)])
+
+    def _pairs(self, obs_type, agg1, agg2):
+        """ The month normals of two aggregates of an observation as pairs. """
+
+        _vecs = [self._vector(obs_type, agg1)[4][0], self._vector(obs_type, agg2)[4][0]]
+        return ('pairs',) + self.units[obs_type] + (None, _vecs)
+
+    def _percentiles(self, obs_type, agg, percentiles, kind):
+        """ Percentiles of the month values of each month over the years. """
+
+        _key = ('percentiles', obs_type, agg)
+        if _key not in self._memo:
+            with self.stats.phase('aggregate_%s' % agg):
+                self._memo[_key] = month_percentiles(self.matrix[obs_type][agg].values(),
+                                                     self.averages.percentiles)
+        _percentiles = self._memo[_key]
+        return (kind,) + self.units[obs_type] + (list(percentiles),
+                                                 [_percentiles[_p] for _p in percentiles])
+
+    def _breakdown(self, obs_type, agg, suffix):
+        """ A breakdown of the month aggregates of an observation and
+            aggregate.
+
+            Parameters:
+                obs_type: The observation type concerned.
+                agg:      The aggregate concerned.
+                suffix:   The breakdown, one of BREAKDOWNS:
+                          'Years':       the month values of each year
+                          'Decades':     the normals of each decade
+                          'Anomalies':   the difference between the month
+                                         values of each year and the long term
+                                         mean
+                          'Percentiles': percentiles of the month values over
+                                         the years
+        """
+
+        _matrix = self.matrix[obs_type][agg]
+        _years = sorted(_matrix)
+        if suffix == 'Years':
+            return ('breakdown',) + self.units[obs_type] + (_years, [_matrix[_y] for _y in _years])
+        elif suffix == 'Anomalies':
+            _means = self.accumulator(obs_type, agg).means()
+            return ('anomalies',) + self.units[obs_type] + (_years,
+                                                            [_means] + [_matrix[_y] for _y in _years])
+        elif suffix == 'Decades':
+            _decades = sorted(set(_y - _y % 10 for _y in _matrix))
+            _vecs = []
+            with self.stats.phase('aggregate_%s' % agg):
+                for _decade in _decades:
+                    _d_accum = MonthAccumulator.from_rows(_row for _y, _row in _matrix.items()
+                                                          if _y - _y % 10 == _decade)
+                    _vecs.append(_d_accum.get(agg))
+            return ('breakdown',) + self.units[obs_type] + (_decades, _vecs)
+        _raw = self._percentiles(obs_type, agg, self.averages.percentiles, 'breakdown')
+        return _raw
+
+    def _extremes(self, obs_type, agg):
+        """ Return the years with the highest and lowest month aggregate of
+            an observation and aggregate for each month.
+
+            Where years tie the earliest year is used. The times of any month
+            maximum or minimum are included, these are None if not known.
+
+            Returns a dict keyed by 'highest' and 'lowest', each value is a
+            dict of 12 way lists keyed by 'years', 'values' and 'times'.
+        """
+
+        _key = ('extremes', obs_type, agg)
+        if _key not in self._memo:
+            _matrix = self.matrix[obs_type][agg]
+            _times = self.times.get(obs_type, {}).get(agg, {})
+            extremes = {}
+            with self.stats.phase('aggregate_%s' % agg):
+                for _extreme, _better in (('highest', lambda x, y: x > y),
+                                          ('lowest', lambda x, y: x < y)):
+                    _years = [None] * 12
+                    _values = [None] * 12
+                    for _year in sorted(_matrix):
+                        for _bin, _value in enumerate(_matrix[_year]):
+                            if _value is not None and (_values[_bin] is None or
+                                                       _better(_value, _values[_bin])):
+                                _years[_bin] = _year
+                                _values[_bin] = _value
+                    extremes[_extreme] = {'years': _years,
+                                          'values': _values,
+                                          'times': [_times[_y][_b] if _y in _times else None
+                                                    for _b, _y in enumerate(_years)]}
+            self._memo[_key] = extremes
+        return self._memo[_key]
+
+    def _extreme(self, obs_type, agg, extreme):
+        """ The year and value of the highest or lowest month aggregate of
+            each month.
+        """
+
+        _extreme = self._extremes(obs_type, agg)[extreme]
+        return ('labelled',) + self.units[obs_type] + (_extreme['years'], [_extreme['values']])
+
+    def _time(self, obs_type, agg):
+        """ The time of the record month maximum or minimum of each month. """
+
+        _extreme = self._extremes(obs_type, agg)['highest' if agg == 'max' else 'lowest']
+        return 'vector', None, None, None, [_extreme['times']]
+
+    def _completeness(self, obs_type):
+        """ The completeness of each month of each year. """
+
+        _years = sorted(self.complete[obs_type])
+        return 'breakdown', None, None, _years, [self.complete[obs_type][_y] for _y in _years]
+
+    def _day_of_year(self, tag):
+        """ A day of year normal.
+
+            The normals are calculated over the same complete months as the
+            month normals.
+        """
+
+        if 'day_of_year' not in self._memo:
+            with self.stats.phase('day_of_year'):
+                self._memo['day_of_year'] = self._calc_day_of_year()
+        _vec = self._memo['day_of_year'][tag]
+        if tag == 'dayRainProbabilityjson':
+            # a percentage, already rounded
+            return 'vector', None, None, None, [_vec]
+        return ('vector',) + self.units['outTemp'] + (None, [_vec])
+
+    def _calc_day_of_year(self):
+        """ Query and smooth the day of year normals.
+
+            Returns a dict of 366 way lists keyed by tag name, refer
+            DAY_OF_YEAR_TAGS. Temperatures are in database units.
+        """
+
+        averages = self.averages
+        if self.month_keys:
+            _start = get_first_day(date(self.month_keys[0][0], self.month_keys[0][1], 1))
+            _stop = get_first_day(date(self.month_keys[-1][0], self.month_keys[-1][1], 1), d_months=1)
+            _start_ts = time.mktime(_start.timetuple())
+            _stop_ts = time.mktime(_stop.timetuple())
+        else:
+            _start_ts = _stop_ts = 0
+        _rain_unit = getStandardUnitType(self.us_units, 'rain')[0]
+        _threshold = convert(averages.wet_day_threshold, _rain_unit)[0]
+        accums = get_day_of_year_stats(self.db_lookup(), _start_ts, _stop_ts, _threshold)
+        self.stats.count('days_processed', sum(accums['meanmax'].count))
+        _result = {}
+        for _tag, _key in (('dayTempMeanMaxjson', 'meanmax'), ('dayTempMeanMinjson', 'meanmin')):
+            _result[_tag] = smooth_day_of_year(accums[_key], averages.smoothing,
+                                               averages.smoothing_window, averages.smoothing_harmonics)
+        # rain probability is a percentage, a smoothing fit may stray outside
+        # 0 to 100 so limit it
+        _vec = smooth_day_of_year(accums['wet'], averages.smoothing,
+                                  averages.smoothing_window, averages.smoothing_harmonics)
+        _result['dayRainProbabilityjson'] = [round_none(min(max(_v * 100.0, 0.0), 100.0), 1)
+                                             if _v is not None else None for _v in _vec]
+        return _result
+
+    def _places(self, unit, group):
+        """ Return the number of decimal places used for a database unit.
+
+            The number of decimal places is taken from the skin string format
+            of the unit the database unit is converted to.
+        """
+
+        _key = ('places', unit, group)
+        if _key not in self._memo:
+            _target = self.averages.converter.convert(ValueTuple(None, unit, group))[1]
+            _formats = self.averages.skin_dict.get('Units', {}).get('StringFormats', {})
+            self._memo[_key] = format_places(_formats.get(_target))
+        return self._memo[_key]
+
+    def _encode(self, value, separators=None):
+        """ Encode a formatted series or dict of series as json. """
+
+        with self.stats.phase('json_encoding'):
+            return json.dumps(value, sort_keys=True, separators=separators)
+
+
+class Averages(object):
+    """ Calculate monthly averages independently of any report generator.
+
+        Used by the MonthAverages SLE and the command line interface.
+
+        Parameters:
+            skin_dict:   The skin config dict, config options are taken from
+                         the [MonthAverages] section.
+            config_dict: The WeeWX config dict.
+            converter:   A weewx.units.Converter object used to convert
+                         results to the units required by the skin.
+    """
+
+    def __init__(self, skin_dict, config_dict, converter):
+        self.skin_dict = skin_dict
+        self.config_dict = config_dict
+        self.converter = converter
+
+        # get our config dict if it exists
+        sle_dict = self.skin_dict.get('MonthAverages', {})
+        # The data binding to use. Default is the default binding of the
+        # report.
+        self.data_binding = sle_dict.get('data_binding')
+        # Do we obtain our month aggregates with a single pass over the daily
+        # summaries or with individual getAggregate() calls for each month.
+        # Default to a single pass.
+        self.bulk_query = to_bool(sle_dict.get('bulk_query', True))
+        # Month aggregates for complete months may be cached on disk so that
+        # only new or changed months need be queried. The cache is only used
+        # when obtaining month aggregates with a single pass. A relative cache
+        # file path is relative to the skin directory.
+        if to_bool(sle_dict.get('cache', True)):
+            _skin_dir = os.path.join(self.config_dict.get('WEEWX_ROOT', ''),
+                                     self.skin_dict.get('SKIN_ROOT', ''),
+                                     self.skin_dict.get('skin', ''))
+            self.cache_file = os.path.join(_skin_dir,
+                                           sle_dict.get('cache_file', 'averages_cache.json'))
+            if self.data_binding is not None:
+                # each data binding has its own cache so that reports using
+                # the same skin with different bindings do not share a cache
+                _root, _ext = os.path.splitext(self.cache_file)
+                self.cache_file = '%s_%s%s' % (_root, self.data_binding, _ext)
+        else:
+            self.cache_file = None
+        # Whether cached months are validated against the daily summaries
+        # each run. Validation may be turned off if the cache is maintained
+        # by the AveragesService. Default is True.
+        self.validate_cache = to_bool(sle_dict.get('validate_cache', True))
+        # Timings and counters for each calculation may be appended, one JSON
+        # object per line, to a stats file so that the cost of the SLE can be
+        # tracked over time. A relative stats file path is relative to the
+        # skin directory. Default is no stats file.
+        _stats_file = sle_dict.get('stats_file')
+        if _stats_file:
+            self.stats_file = os.path.join(self.config_dict.get('WEEWX_ROOT', ''),
+                                           self.skin_dict.get('SKIN_ROOT', ''),
+                                           self.skin_dict.get('skin', ''),
+                                           _stats_file)
+        else:
+            self.stats_file = None
+        # the timings and counters of the most recent calculation
+        self.stats = None
+        # The period over which normals are calculated. Either a fixed period
+        # of whole years (normals_start and normals_end, eg 1991 and 2020) or
+        # a rolling period of the most recent normals_years years of complete
+        # months. If neither is set all complete months of data are used.
+        self.normals_start = to_int(sle_dict.get('normals_start'))
+        self.normals_end = to_int(sle_dict.get('normals_end'))
+        self.normals_years = to_int(sle_dict.get('normals_years'))
+        if self.normals_start is not None and self.normals_years is not None:
+            logerr("Both normals_start and normals_years set, ignoring normals_years")
+            self.normals_years = None
+        # The percentiles (0 to 100) to be calculated for each observation and
+        # aggregate, the percentiles used by the default template are always
+        # calculated.
+        self.percentiles = list(DEFAULT_PERCENTILES)
+        for _p in option_as_list(sle_dict.get('percentiles', [])):
+            try:
+                _p = float(_p)
+            except ValueError:
+                logerr("Ignoring invalid percentile '%s'" % _p)
+                continue
+            if not 0 <= _p <= 100:
+                logerr("Ignoring invalid percentile '%s'" % _p)
+            elif _p not in self.percentiles:
+                self.percentiles.append(_p)
+        # Months with too many days without data may be excluded from the
+        # calculations, eg the WMO '3/5 rule' excludes a month with more than
+        # 5 days without data or more than 3 consecutive days without data.
+        # Default is to include all months.
+        self.max_missing_days = to_int(sle_dict.get('max_missing_days'))
+        self.max_consecutive_missing_days = to_int(sle_dict.get('max_consecutive_missing_days'))
+        # The SLE may return the most recent result immediately and refresh
+        # the averages in a background thread so that report generation is
+        # not delayed by the calculation. A result whose data is more than
+        # max_staleness seconds older than the report is not returned, the
+        # SLE waits for a fresh result instead. Default is no background
+        # refresh.
+        self.background_refresh = to_bool(sle_dict.get('background_refresh', False))
+        self.max_staleness = to_int(sle_dict.get('max_staleness', 86400))
+        # Day of year normals of mean maximum temperature, mean minimum
+        # temperature and rain probability may also be calculated, optionally
+        # smoothed with a moving average ('moving') over smoothing_window days
+        # or a fit of smoothing_harmonics harmonics ('harmonic'). A wet day is
+        # a day with at least wet_day_threshold rain. Default is no day of
+        # year normals.
+        self.day_of_year = to_bool(sle_dict.get('day_of_year', False))
+        self.smoothing = sle_dict.get('smoothing', 'moving')
+        if self.smoothing not in SMOOTHING_METHODS:
+            logerr("Ignoring invalid smoothing '%s'" % self.smoothing)
+            self.smoothing = 'none'
+        self.smoothing_window = to_int(sle_dict.get('smoothing_window', 15))
+        self.smoothing_harmonics = to_int(sle_dict.get('smoothing_harmonics', 3))
+        _threshold = option_as_list(sle_dict.get('wet_day_threshold', ['0.2', 'mm']))
+        try:
+            self.wet_day_threshold = ValueTuple(float(_threshold[0]),
+                                                _threshold[1] if len(_threshold) > 1 else 'mm',
+                                                'group_rain')
+        except (ValueError, IndexError):
+            logerr("Ignoring invalid wet_day_threshold '%s'" % ', '.join(_threshold))
+            self.wet_day_threshold = ValueTuple(0.2, 'mm', 'group_rain')
+        # Monthly heating, cooling and growing degree day totals may be
+        # calculated from the average temperature of each day using the base
+        # temperatures in the [[degree_days]] sub-section. A degree day type
+        # is not calculated if it has no base or its base is None. Degree
+        # days are only calculated when bulk_query is True. Default is no
+        # degree days.
+        self.degree_days = []
+        _dd_dict = sle_dict.get('degree_days', {})
+        for _dd in _dd_dict:
+            if _dd not in DEGREE_DAY_TYPES:
+                logerr("Ignoring invalid degree day type '%s'" % _dd)
+        for _dd in DEGREE_DAY_TYPES:
+            _base = option_as_list(_dd_dict.get(_dd, 'None'))
+            if _base[0].lower() == 'none':
+                continue
+            try:
+                self.degree_days.append((_dd, ValueTuple(float(_base[0]),
+                                                         _base[1] if len(_base) > 1 else 'degree_F',
+                                                         'group_temperature')))
+            except (ValueError, IndexError):
+                logerr("Ignoring invalid %s base '%s'" % (_dd, ', '.join(_base)))
+        # Get the observations and aggregates to be calculated. Each entry in
+        # the [[observations]] sub-section is an observation type and a list
+        # of the aggregates to be calculated for that observation. The
+        # observations and aggregates used by the default template are always
+        # calculated.
+        self.obs = [(_obs, list(_aggs)) for _obs, _aggs in DEFAULT_OBSERVATIONS]
+        _obs_dict = sle_dict.get('observations', {})
+        for _obs in _obs_dict.sections if hasattr(_obs_dict, 'sections') else []:
+            logerr("Ignoring invalid observations entry '%s'" % _obs)
+        for _obs in _obs_dict.scalars if hasattr(_obs_dict, 'scalars') else _obs_dict:
+            _aggs = dict(self.obs).get(_obs)
+            if _aggs is None:
+                _aggs = []
+                self.obs.append((_obs, _aggs))
+            for _agg in option_as_list(_obs_dict[_obs]):
+                if _agg not in MONTH_AGGREGATES:
+                    logerr("Ignoring invalid aggregate '%s' for '%s'" % (_agg, _obs))
+                elif obs_tag(_obs, _agg) in RESERVED_TAGS:
+                    # eg rain avg would be $monthRainAvgjson, the default
+                    # template rain sum
+                    logerr("Ignoring aggregate '%s' for '%s', tag '%s' is used by the "
+                           "default template" % (_agg, _obs, obs_tag(_obs, _agg)))
+                elif _agg not in _aggs:
+                    _aggs.append(_agg)
+
+    def calculate(self, timespan, db_lookup, since_ts=None):
         """ Returns json format month avg/max/min stats for use by HighCharts.
 
             The following stats are calculated for each month (jan ... dec):
@@ -185,9 +1968,22 @@ class MonthAverages(SearchList):
                   month total by the number of years of those months in our
                   data.
 
+            By default all years of record are used. If a normals period is
+            set (eg the WMO 1991-2020 standard period or a rolling 30 year
+            period) only those months within the normals period are used and
+            'all years of record' above should be read as 'all years of the
+            normals period'.
+
             Partial months of data at the start and end of the archive are
             ignored. Incomplete or partial months between the first and last
-            months of data are included in the calculations.
+            months of data are included in the calculations unless
+            max_missing_days or max_consecutive_missing_days is set, in which
+            case a month with too many days without data is excluded from the
+            calculations for that observation, eg the WMO '3/5 rule'. The
+            number of days with data and the longest run of days without data
+            in each month are read from the daily summaries in the same pass
+            as the month aggregates. Months are not excluded if bulk_query is
+            False.
 
             Returned values are JSON strings representing results for Jan, Feb
             thru Dec. Months that have no data are returned as Null. Unit
@@ -202,215 +1998,623 @@ class MonthAverages(SearchList):
                 monthTempMeanMinMaxjson: 12 way array containing 2 way array 
                                          month (mean min, mean max) temp 
                 monthTempMinjson:        12 way array containing month min temp
+                month<Obs><Agg>json:     12 way array containing the month
+                                         <Agg> aggregate for observation
+                                         <Obs> for each observation and
+                                         aggregate in the [[observations]]
+                                         config sub-section as well as those
+                                         used above, eg monthWindSpeedAvgjson
+                month<Obs><Agg>Yearsjson:
+                                         json object keyed by year, each
+                                         value is a 12 way array containing
+                                         the month <Agg> aggregate for
+                                         <Obs> in that year
+                month<Obs><Agg>Decadesjson:
+                                         json object keyed by decade (eg
+                                         2010), each value is a 12 way array
+                                         containing the month <Agg> normals
+                                         for <Obs> calculated over the years
+                                         of record in that decade
+                month<Obs><Agg>Anomaliesjson:
+                                         json object keyed by year, each
+                                         value is a 12 way array containing
+                                         the difference between the month
+                                         <Agg> aggregate for <Obs> in that
+                                         year and the long term mean of the
+                                         month <Agg> aggregate
+                month<Obs><Agg>Percentilesjson:
+                                         json object keyed by percentile (eg
+                                         10, 50 and 90), each value is a 12
+                                         way array containing that
+                                         percentile of the month <Agg>
+                                         aggregate for <Obs> over all years
+                monthRainMedianjson:     12 way array containing month median
+                                         rainfall
+                monthRainDecilesjson:    12 way array containing 2 way array
+                                         month (decile 1, decile 9) rainfall
+                monthTempMeanDecilesjson:
+                                         12 way array containing 2 way array
+                                         month (decile 1, decile 9) mean temp
+                month<Obs><Agg>Timejson: 12 way array containing the time
+                                         (unix epoch) at which the record
+                                         month <Agg> for <Obs> occurred for
+                                         each 'max' and 'min' aggregate,
+                                         null if not known
+                month<Obs>Completenessjson:
+                                         json object keyed by year, each
+                                         value is a 12 way array containing
+                                         the percentage of the expected
+                                         archive records of <Obs> present in
+                                         each month, empty if bulk_query is
+                                         False
+                monthRainWettestjson:    12 way array containing 2 way array
+                                         month (year, rainfall) of the
+                                         wettest year of each month
+                monthRainDriestjson:     12 way array containing 2 way array
+                                         month (year, rainfall) of the
+                                         driest year of each month
+                dayTempMeanMaxjson:      366 way array containing day of year
+                                         mean max temp, only if day_of_year
+                                         is set
+                dayTempMeanMinjson:      366 way array containing day of year
+                                         mean min temp, only if day_of_year
+                                         is set
+                dayRainProbabilityjson:  366 way array containing day of year
+                                         percentage of days with rain, only
+                                         if day_of_year is set
+                averagesStats:           dict containing the time taken by
+                                         each phase of the calculation and
+                                         counts of database calls and months
+                                         processed, refer AveragesStats
+                averagesHash:            content hash of the results, this
+                                         changes only if the results change,
+                                         accessing it derives all tags
+
+            Additional observations and aggregates are calculated using the
+            same definitions. Average, mean maximum and mean minimum
+            aggregates ('avg', 'meanmax' and 'meanmin') are averaged over all
+            years of record, total aggregates ('sum') are averaged as per
+            average rainfall and maximum and minimum aggregates ('max' and
+            'min') are the extreme value over all years of record. All
+            observations are calculated from the same pass over each daily
+            summary.
+
+            Month aggregates are first assembled in a year x month matrix for
+            each observation and aggregate. Long term normals, decade normals
+            and anomalies are all derived from this matrix so no additional
+            database queries are required. The time of each month maximum and
+            minimum is read from the daily summaries in the same pass and held
+            in a matching matrix from which the time of each record is
+            obtained, the times are not available if bulk_query is False.
+
+            The month aggregates are obtained when calculate() is called, the
+            value of each tag is only derived when the tag is first accessed,
+            refer AveragesTags. A template pays only for the tags it uses.
+
+            The time taken by each phase of the calculation along with counts
+            of database calls and months processed are saved as a dict in
+            self.stats and, if a stats file is set, appended to the stats
+            file. These cover the month aggregates only, the averagesStats tag
+            also includes the tags derived before it is accessed.
 
             Parameters:
                 timespan: An instance of weeutil.weeutil.TimeSpan. This will
                           hold the start and stop times of the domain of
                           valid times.
                 db_lookup: An instance of weewx.archive.Archive
-        """
+                since_ts: Optional timestamp, if set data before since_ts is
+                          ignored.
 
-        t1 = time.time()
+            Returns an AveragesTags mapping of json format results keyed by
+            tag name.
+        """
 
         # initialise those things we need to get going
+        stats = AveragesStats()
+        _lookup = db_lookup
+
+        # count all calls to the database, use our data binding unless
+        # another is requested
+        def db_lookup(data_binding=None):
+            return CountingManager(_lookup(data_binding or self.data_binding), stats)
         # get archive interval
-        current_rec = db_lookup().getRecord(timespan.stop)
+        with stats.phase('record_lookup'):
+            current_rec = db_lookup().getRecord(timespan.stop)
         _interval = current_rec['interval']
-        # get our UoMs and Groups
-        (rain_unit, rain_group) = getStandardUnitType(current_rec['usUnits'],
-                                                      'rain')
-        (temp_unit, temp_group) = getStandardUnitType(current_rec['usUnits'],
-                                                      'outTemp')
-        # since we can't use ValueHelpers for rounding of a 'vector' vt get
-        # the number of decimal places to use for rounding temp and rain
-        temp_round = int(self.generator.skin_dict['Units']['StringFormats'].get(temp_group, "1f")[-2])
-        rain_round = int(self.generator.skin_dict['Units']['StringFormats'].get(rain_group, "1f")[-2])
-        # Set up ValueTuples to hold our results, but in this case the 'value'
-        # part of the vt will be a 12 element list ie (jan ... dec). We already
-        # know the units but not the values so initialise each months value to
-        # None.
-        m_rain_avg_vt = ValueTuple([None for x in range(12)], rain_unit, rain_group)
-        m_temp_mean_vt = ValueTuple([None for x in range(12)], temp_unit, temp_group)
-        m_temp_max_vt = ValueTuple([None for x in range(12)], temp_unit, temp_group)
-        m_temp_mean_max_vt = ValueTuple([None for x in range(12)], temp_unit, temp_group)
-        m_temp_min_vt = ValueTuple([None for x in range(12)], temp_unit, temp_group)
-        m_temp_mean_min_vt = ValueTuple([None for x in range(12)], temp_unit, temp_group)
-        # set up some 2D lists to hold our month running totals and number of
-        # years so we can calculate an average
-        # m_xxxx_bin[0..11][0..1] - [0..11] - holds data for jan .. dec
-        #                         - [0..1]  - [0] holds running total for Xxxx
-        #                                   - [1] holds number of years of data
-        #                                         added to running total
-        m_rain_bin = [[0 for x in range(2)] for x in range(12)]
-        m_temp_mean_max_bin = [[None for x in range(2)] for x in range(12)]
-        m_temp_mean_min_bin = [[None for x in range(2)] for x in range(12)]
-        m_temp_mean_bin = [[None for x in range(2)] for x in range(12)]
+        # we can only use observations that have daily summaries
+        self.check_obs(db_lookup())
+        # get our UoMs and Groups, the decimal places used for rounding are
+        # determined when the tags are formatted
+        _units = {}
+        for _obs, _aggs in self.obs:
+            _units[_obs] = getStandardUnitType(current_rec['usUnits'], _obs)
+        # Set up a year x month matrix for each observation and aggregate to
+        # hold our month aggregates. Long term normals, decade normals and
+        # anomalies are all derived from these matrices.
+        # m_matrix[obs][agg][year][0..11] - holds data for jan .. dec of year
+        m_matrix = {}
+        for _obs, _aggs in self.obs:
+            m_matrix[_obs] = dict((_agg, {}) for _agg in _aggs)
+        # and a year x month matrix of the time each month maximum and
+        # minimum occurred
+        # m_times[obs][agg][year][0..11] - holds times for jan .. dec of year
+        m_times = {}
+        for _obs, _aggs in self.obs:
+            m_times[_obs] = dict((_agg, {}) for _agg in _aggs if _agg in EXTREME_AGGREGATES)
+        # and a year x month matrix of the completeness of each month, the
+        # percentage of the expected archive records present
+        # m_complete[obs][year][0..11] - holds completeness for jan .. dec of year
+        m_complete = dict((_obs, {}) for _obs, _aggs in self.obs)
+        # and a year x month matrix of each degree day total, these are
+        # calculated from the outTemp month stats so need a single pass
+        # m_matrix[degree day type]['sum'][year][0..11] - holds data for jan .. dec of year
+        _degree_days = []
+        if self.bulk_query:
+            _temp_unit = getStandardUnitType(current_rec['usUnits'], DEGREE_DAY_OBS)[0]
+            for _dd, _base in self.degree_days:
+                m_matrix[_dd] = {'sum': {}}
+                _units[_dd] = getStandardUnitType(current_rec['usUnits'], _dd)
+                # the base temperature in database units
+                _degree_days.append((_dd, convert(_base, _temp_unit)[0]))
         # end of initialisation
 
-        # get timestamp, month and year for our first (earliest) record
-        _start_ts = db_lookup().firstGoodStamp()
-        _start_month = date.fromtimestamp(_start_ts).month
-        _start_year = date.fromtimestamp(_start_ts).year
-        # get timestamp, month and year for our last (most recent) record
-        _end_ts = timespan.stop
-        _end_month = date.fromtimestamp(_end_ts).month
-        _end_year = date.fromtimestamp(_end_ts).year
-        # loop through each month timespan between our start and end timestamps
-        for m_tspan in genMonthSpans(_start_ts, _end_ts):
+        # get timestamp for our first (earliest) record
+        with stats.phase('record_lookup'):
+            _start_ts = db_lookup().firstGoodStamp()
+        if since_ts is not None:
+            _start_ts = max(_start_ts, since_ts)
+        # get the start and end timestamps of the period we will use, this
+        # will be our first and last records unless a normals period is set
+        (_period_start_ts, _end_ts) = self.get_normals_period(_start_ts, timespan.stop)
+        _cache = None
+        # the cached months queried this run for each observation
+        _updated = {}
+        if self.bulk_query:
+            # obtain the month aggregates we need for all months with a single
+            # pass over each of the daily summaries concerned
+            _first_ts = time.mktime(get_first_day(date.fromtimestamp(_period_start_ts)).timetuple())
+            _dbm = db_lookup()
+            _month_stats = {}
+            if self.cache_file is not None:
+                # use our cache so we only query new or changed months
+                with stats.phase('cache_load'):
+                    _cache = get_month_stats_cache(self.cache_file, get_db_id(_dbm),
+                                                   self.validate_cache)
+                for _obs, _aggs in self.obs:
+                    with stats.phase('query_%s' % _obs):
+                        _month_stats[_obs] = _cache.get_month_stats(_dbm, _obs, _first_ts, _end_ts,
+                                                                    _updated.setdefault(_obs, set()),
+                                                                    self.day_avgs(_obs))
+                    stats.count('months_queried', len(_updated[_obs]))
+            else:
+                for _obs, _aggs in self.obs:
+                    with stats.phase('query_%s' % _obs):
+                        _month_stats[_obs] = get_month_stats(_dbm, _obs, _first_ts, _end_ts,
+                                                             self.day_avgs(_obs))
+                    stats.count('months_queried', len(_month_stats[_obs]))
+        # keep a list of the (year, month) of each month used
+        _keys = []
+        # loop through each month timespan in our period
+        with stats.phase('month_iteration'):
+            self._iterate(stats, db_lookup, m_matrix, m_times, m_complete, _keys,
+                          _month_stats if self.bulk_query else None,
+                          _period_start_ts, _start_ts, _end_ts, _interval, _degree_days)
+        stats.count('months_processed', len(_keys))
+        # the tags are derived from the matrices only when accessed
+        _result = AveragesTags(self, stats, m_matrix, m_times, m_complete, _keys, _units,
+                               db_lookup, current_rec['usUnits'])
+        if _cache is not None:
+            with stats.phase('cache_save'):
+                _cache.save()
+        self.stats = stats.to_dict()
+        if self.stats_file is not None:
+            self.save_stats()
+        return _result
+
+    def _iterate(self, stats, db_lookup, m_matrix, m_times, m_complete, keys, month_stats,
+                 period_start_ts, start_ts, end_ts, interval, degree_days=()):
+        """ Populate the year x month matrices from the month aggregates.
+
+            If month_stats is None each month aggregate is obtained with a
+            getAggregate() call otherwise the month aggregates, the times of
+            the month maximum and minimum and the completeness of each month
+            are taken from month_stats. The times and completeness are not
+            available from getAggregate() calls and are left as None, nor are
+            any months excluded. The (year, month) key of each month used is
+            appended to keys. The degree day totals for each (degree day type,
+            base) in degree_days are calculated from the outTemp month stats.
+        """
+
+        for m_tspan in genMonthSpans(period_start_ts, end_ts):
             # skip any partial months at the start or end of our data
-            if m_tspan.start + _interval * 60 < _start_ts or m_tspan.stop > _end_ts:
+            if m_tspan.start + interval * 60 < start_ts or m_tspan.stop > end_ts:
                 # our span includes only part of a month
                 continue
+            _m_date = date.fromtimestamp(m_tspan.start)
+            keys.append((_m_date.year, _m_date.month))
             # work out the month bin number
-            _bin = datetime.datetime.fromtimestamp(m_tspan.start).month - 1
-            # get the total rain for the month concerned
-            _rain_sum_vt = db_lookup().getAggregate(m_tspan,
-                                                    'rain',
-                                                    'sum')
-            # get the max temp for the month concerned
-            _temp_max_vt = db_lookup().getAggregate(m_tspan,
-                                                    'outTemp',
-                                                    'max')
-            # get the avg max temp for the month concerned
-            _temp_mean_max_vt = db_lookup().getAggregate(m_tspan,
-                                                         'outTemp',
-                                                         'meanmax')
-            # get the min temp for the month concerned
-            _temp_min_vt = db_lookup().getAggregate(m_tspan,
-                                                    'outTemp',
-                                                    'min')
-            # get the avg min temp for the month concerned
-            _temp_mean_min_vt = db_lookup().getAggregate(m_tspan,
-                                                         'outTemp',
-                                                         'meanmin')
-            # we have the raw data now update our bins for avgs and results for
-            # max/min
-
-            # avg rainfall
-            # Add the month rainfall to the bin and increment the year counter.
-            # Be careful of None values
-            if _rain_sum_vt.value is not None:
-                m_rain_bin[_bin][0] += _rain_sum_vt.value
-                m_rain_bin[_bin][1] += 1
-
-            # mean temp
-            # If our bin already has data for this month then add the daily mean
-            # and increment the year counter. Otherwise set the value for this
-            # bin to the daily mean and set the year counter to 1
-            if _temp_mean_max_vt.value is not None and _temp_mean_min_vt.value is not None:
-                if m_temp_mean_bin[_bin][0]:
-                    m_temp_mean_bin[_bin][0] += (_temp_mean_max_vt.value + _temp_mean_min_vt.value)/2
-                    m_temp_mean_bin[_bin][1] += 1
+            _bin = _m_date.month - 1
+            _month = {}
+            for _obs, _aggs in self.obs:
+                if month_stats is not None:
+                    # get the month aggregates from our month stats, months
+                    # with no data will be missing so use an empty dict
+                    _stats = month_stats[_obs].get((_m_date.year, _m_date.month), {})
+                    # the completeness of the month, count holds the number
+                    # of archive records with data
+                    _expected = (m_tspan.stop - m_tspan.start) / (interval * 60.0)
+                    _row = m_complete[_obs].setdefault(_m_date.year, [None] * 12)
+                    _row[_bin] = round(min(100.0, 100.0 * (_stats.get('count') or 0) / _expected), 1)
+                    if self.excluded(_stats, (get_first_day(_m_date, d_months=1) - _m_date).days):
+                        # too many days without data, the month is not used
+                        stats.count('months_excluded')
+                        _stats = {}
                 else:
-                    m_temp_mean_bin[_bin][0] = (_temp_mean_max_vt.value + _temp_mean_min_vt.value)/2
-                    m_temp_mean_bin[_bin][1] = 1
-
-            # max temp
-            # if the current value is greater than our max to date for this
-            # month then we have a new max
-            if m_temp_max_vt[0][_bin] is None or (_temp_max_vt.value is not None and _temp_max_vt.value > m_temp_max_vt[0][_bin]):
-                m_temp_max_vt[0][_bin] = _temp_max_vt.value
-
-            # mean max temp
-            # If our bin already has data for this month then add the daily
-            # mean max and increment the year counter. Otherwise set the value
-            # for this bin to the daily mean max and set the year counter to 1
-            if _temp_mean_max_vt.value is not None:
-                if m_temp_mean_max_bin[_bin][0]:
-                    m_temp_mean_max_bin[_bin][0] += _temp_mean_max_vt.value
-                    m_temp_mean_max_bin[_bin][1] += 1
-                else:
-                    m_temp_mean_max_bin[_bin][0] = _temp_mean_max_vt.value
-                    m_temp_mean_max_bin[_bin][1] = 1
-
-            # min temp
-            # If the current value is less than our min to date for this month
-            # then we have a new min. Watch out for None though.
-            if m_temp_min_vt[0][_bin] is None or (_temp_min_vt.value is not None and _temp_min_vt.value < m_temp_min_vt[0][_bin]):
-                m_temp_min_vt[0][_bin] = _temp_min_vt.value
-
-            # mean min temp
-            # If our bin already has data for this month then add the daily
-            # mean min and increment the year counter. Otherwise set the value
-            # for this bin to the daily mean min and set the year counter to 1
-            if _temp_mean_min_vt.value is not None:
-                if m_temp_mean_min_bin[_bin][0]:
-                    m_temp_mean_min_bin[_bin][0] += _temp_mean_min_vt.value
-                    m_temp_mean_min_bin[_bin][1] += 1
-                else:
-                    m_temp_mean_min_bin[_bin][0] = _temp_mean_min_vt.value
-                    m_temp_mean_min_bin[_bin][1] = 1
-
-        # we have pre-processed all the raw data now calculate the required
-        # averages for each month and put them in their 'vector' vt.
-        for _m_num in range(12):
-            # avg rainfall
-            # if we have 1 or more years of data then calc a simple average
-            if m_rain_bin[_m_num][1] is not None and m_rain_bin[_m_num][1] > 0:
-                m_rain_avg_vt[0][_m_num] = m_rain_bin[_m_num][0] / m_rain_bin[_m_num][1]
-            # otherwise we have no years of data so set our average to None
-            else:
-                m_rain_avg_vt[0][_m_num] = None
+                    # get the month aggregates with a getAggregate() call for
+                    # each aggregate, the mean needs the mean max and mean min
+                    _stats = {}
+                    for _agg in _aggs:
+                        for _a in ('meanmax', 'meanmin') if _agg == 'mean' else (_agg,):
+                            if _a not in _stats:
+                                with stats.phase('query_%s' % _obs):
+                                    _stats[_a] = db_lookup().getAggregate(m_tspan,
+                                                                          _obs,
+                                                                          _a).value
+                # we have the raw data now update our matrices
+                for _agg in _aggs:
+                    _row = m_matrix[_obs][_agg].setdefault(_m_date.year, [None] * 12)
+                    _row[_bin] = month_value(_stats, _agg)
+                    if _agg in m_times[_obs]:
+                        _row = m_times[_obs][_agg].setdefault(_m_date.year, [None] * 12)
+                        _row[_bin] = _stats.get('%stime' % _agg)
+                _month[_obs] = _stats
+            for _dd, _base in degree_days:
+                # an excluded month has no degree day total
+                _row = m_matrix[_dd]['sum'].setdefault(_m_date.year, [None] * 12)
+                _row[_bin] = month_degree_days(_month[DEGREE_DAY_OBS], _dd, _base)
 
-            # mean temp
-            # if we have a total > 0 then calc a simple average
-            if m_temp_mean_bin[_m_num][1] is not None and m_temp_mean_bin[_m_num][1] > 0:
-                m_temp_mean_vt[0][_m_num] = m_temp_mean_bin[_m_num][0] / m_temp_mean_bin[_m_num][1]
-            # otherwise we have no years of data so set our average to None
-            else:
-                m_temp_mean_vt[0][_m_num] = None
+    def check_obs(self, dbm):
+        """ Remove any configured observation that has no daily summaries.
 
-            # mean max temp
-            # if we have a total > 0 then calc a simple average
-            if m_temp_mean_max_bin[_m_num][1] is not None and m_temp_mean_max_bin[_m_num][1] > 0:
-                m_temp_mean_max_vt[0][_m_num] = m_temp_mean_max_bin[_m_num][0] / m_temp_mean_max_bin[_m_num][1]
-            # otherwise we have no years of data so set our average to None
-            else:
-                m_temp_mean_max_vt[0][_m_num] = None
+            Querying an observation without daily summaries raises
+            weedb.NoTableError so such observations are logged and ignored.
+            The observations used by the default template are not checked.
 
-            # mean min temp
-            # if we have a total > 0 then calc a simple average
-            if m_temp_mean_min_bin[_m_num][1] is not None and m_temp_mean_min_bin[_m_num][1] > 0:
-                m_temp_mean_min_vt[0][_m_num] = m_temp_mean_min_bin[_m_num][0] / m_temp_mean_min_bin[_m_num][1]
-            # otherwise we have no years of data so set our average to None
-            else:
-                m_temp_mean_min_vt[0][_m_num] = None
-
-        # convert to the required units and extract the converted values into
-        # a vector
-        m_rain_avg_vec = self.generator.converter.convert(m_rain_avg_vt).value
-        m_temp_mean_vec = self.generator.converter.convert(m_temp_mean_vt).value
-        m_temp_max_vec = self.generator.converter.convert(m_temp_max_vt).value
-        m_temp_mean_max_vec = self.generator.converter.convert(m_temp_mean_max_vt).value
-        m_temp_min_vec = self.generator.converter.convert(m_temp_min_vt).value
-        m_temp_mean_min_vec = self.generator.converter.convert(m_temp_mean_min_vt).value
-
-        # round the values in our vectors
-        m_rain_avg_vec = [round_none(x, rain_round) for x in m_rain_avg_vec]
-        m_temp_mean_vec = [round_none(x, temp_round) for x in m_temp_mean_vec]
-        m_temp_max_vec = [round_none(x, temp_round) for x in m_temp_max_vec]
-        m_temp_mean_max_vec = [round_none(x, temp_round) for x in m_temp_mean_max_vec]
-        m_temp_min_vec = [round_none(x, temp_round) for x in m_temp_min_vec]
-        m_temp_mean_min_vec = [round_none(x, temp_round) for x in m_temp_mean_min_vec]
-
-        # format our vectors in json format
-        m_rain_avg_json = json.dumps(m_rain_avg_vec)
-        m_temp_mean_json = json.dumps(m_temp_mean_vec)
-        m_temp_max_json = json.dumps(m_temp_max_vec)
-        # month_temp_mean_min_max is vector of 2 way tuples, each tuple is (min, max)
-        m_temp_mean_min_max_json = json.dumps(list(zip(m_temp_mean_min_vec,
-                                              m_temp_mean_max_vec)))
-        m_temp_min_json = json.dumps(m_temp_min_vec)
-
-        # create a dictionary with the tag names (keys) we want to use
-        _result = {'monthRainAvgjson': m_rain_avg_json,
-                   'monthTempMeanjson': m_temp_mean_json,
-                   'monthTempMaxjson': m_temp_max_json,
-                   'monthTempMeanMinMaxjson': m_temp_mean_min_max_json,
-                   'monthTempMinjson': m_temp_min_json}
+            Parameters:
+                dbm: A database manager object for the database concerned.
+        """
+
+        _daykeys = getattr(dbm, 'daykeys', None)
+        if _daykeys is None:
+            return
+        for _obs, _aggs in list(self.obs):
+            if _obs not in _daykeys and _obs not in dict(DEFAULT_OBSERVATIONS):
+                logerr("Ignoring observation '%s', it has no daily summaries" % _obs)
+                self.obs.remove((_obs, _aggs))
+
+    def day_avgs(self, obs_type):
+        """ Whether the month aggregates of an observation need the average
+            of each day, ie the observation is used for degree days and
+            degree days are calculated.
+        """
+
+        return obs_type == DEGREE_DAY_OBS and bool(self.degree_days)
+
+    def excluded(self, stats, days_in_month):
+        """ Is a month excluded due to too many days without data.
+
+            Parameters:
+                stats:         Dict of month aggregates as per
+                               get_month_stats(), an empty dict if the month
+                               has no data.
+                days_in_month: The number of days in the month.
+
+            Returns True if the month has more days without data than
+            max_missing_days or a longer run of consecutive days without data
+            than max_consecutive_missing_days.
+        """
+
+        _days = stats.get('days', 0)
+        _gap = stats.get('max_gap', days_in_month)
+        if self.max_missing_days is not None and days_in_month - _days > self.max_missing_days:
+            return True
+        return self.max_consecutive_missing_days is not None and \
+            _gap > self.max_consecutive_missing_days
+
+    def save_stats(self):
+        """ Append the stats of the most recent calculation to the stats file.
+
+            Each line of the stats file is a JSON object holding the time of
+            the calculation and the timings and counters.
+        """
+
+        _stats = dict(self.stats, dateTime=int(time.time()))
+        try:
+            with open(self.stats_file, 'a') as f:
+                f.write(json.dumps(_stats, sort_keys=True) + '\n')
+        except (IOError, OSError) as e:
+            logerr("Unable to save stats to '%s': %s" % (self.stats_file, e))
+
+    def get_normals_period(self, start_ts, stop_ts):
+        """ Return the start and stop timestamps of the normals period.
+
+            If no normals period is set the period is the same as the data,
+            otherwise the period is limited to the fixed or rolling normals
+            period. A rolling period ends with the most recent complete month.
+
+            Parameters:
+                start_ts: Timestamp of the first record.
+                stop_ts:  Timestamp of the last record.
+
+            Returns a tuple (start, stop) of timestamps.
+        """
+
+        # the start of the month containing stop_ts is the end of the most
+        # recent complete month
+        _stop = get_first_day(date.fromtimestamp(stop_ts))
+        if self.normals_start is not None:
+            _start = date(self.normals_start, 1, 1)
+            if self.normals_end is not None:
+                _stop = min(_stop, date(self.normals_end + 1, 1, 1))
+        elif self.normals_years is not None:
+            _start = get_first_day(_stop, d_years=-self.normals_years)
+        else:
+            return start_ts, stop_ts
+        _start_ts = max(start_ts, time.mktime(_start.timetuple()))
+        _stop_ts = min(stop_ts, time.mktime(_stop.timetuple()))
+        # a period that is entirely outside our data is empty
+        return _start_ts, max(_start_ts, _stop_ts)
+
+
+class BackgroundRefresh(object):
+    """ Refresh the averages in a background thread.
+
+        The most recent result is returned immediately and, if newer data is
+        available, a new result is calculated in a background thread with its
+        own database manager. The next report cycle uses the new result. A
+        lock held for the duration of each calculation ensures that
+        overlapping report cycles never start more than one calculation.
+
+        Background results are plain dicts of all tags as the database
+        manager of the background thread is closed once the result is
+        complete.
+
+        The config used is set each report cycle, refer configure(), a result
+        calculated with a different skin config is not returned.
+
+        Parameters:
+            binding: The data binding used.
+    """
+
+    def __init__(self, binding):
+        self.binding = binding
+        # the (Averages object, skin dict, WeeWX config dict) used for the
+        # next calculation, set as a whole so that a calculation always
+        # uses a consistent config
+        self.config = None
+        # held while a calculation is in progress
+        self.lock = threading.Lock()
+        # the most recent result as a tuple (result, timestamp of its data,
+        # skin dict used), replaced as a whole so that a reader never sees
+        # parts of different results
+        self.latest = None
+
+    def configure(self, averages, skin_dict, config_dict):
+        """ Set the config used for subsequent calculations.
+
+            Parameters:
+                averages:    The Averages object used for the calculations,
+                             its max_staleness is the maximum age in seconds
+                             of the data of a result that is returned without
+                             waiting for a fresh result.
+                skin_dict:   The skin config dict.
+                config_dict: The WeeWX config dict, used to open the database
+                             manager of the background thread.
+        """
+
+        self.config = (averages, skin_dict, config_dict)
+
+    def get(self, timespan, db_lookup):
+        """ Return the most recent result, starting a refresh if required.
+
+            If there is no result, or the data of the most recent result is
+            more than max_staleness seconds older than timespan, any refresh
+            in progress is waited for or the averages are calculated now
+            using db_lookup.
+
+            Parameters:
+                timespan:  The TimeSpan of the report.
+                db_lookup: Function that returns a database manager, only
+                           used if the averages are calculated now.
 
+            Returns a dict of json format results keyed by tag name.
+        """
+
+        config = self.config
+        latest = self.latest
+        if latest is not None and (latest[1] < timespan.stop or
+                                   self.stale(timespan, latest, config)) and \
+                self.lock.acquire(False):
+            # newer data and no calculation in progress, the lock is released
+            # by the background thread
+            _thread = threading.Thread(target=self.refresh, args=(timespan,),
+                                       name='AveragesRefresh-%s' % self.binding)
+            _thread.daemon = True
+            _thread.start()
+        if self.stale(timespan, latest, config):
+            # wait for any calculation in progress, it may give a fresh
+            # enough result
+            with self.lock:
+                latest = self.latest
+                if self.stale(timespan, latest, config):
+                    latest = self.update(timespan, db_lookup, config)
+        return latest[0]
+
+    @staticmethod
+    def stale(timespan, latest, config):
+        """ Whether a result is too old to be returned or was calculated with
+            a different skin config.
+
+            Parameters:
+                timespan: The TimeSpan of the report.
+                latest:   The result tuple concerned, refer update(), or None.
+                config:   The (Averages object, skin dict, WeeWX config dict)
+                          tuple of the report.
+        """
+
+        _averages, _skin_dict, _config_dict = config
+        return latest is None or latest[2] != _skin_dict or \
+            timespan.stop - latest[1] > _averages.max_staleness
+
+    def refresh(self, timespan):
+        """ Calculate the averages with our own database manager.
+
+            Run in the background thread, the lock must be held by the caller
+            and is released once the calculation is complete. The config is
+            read once so that the database and the calculation use the same
+            config even if the config is changed during the calculation.
+        """
+
+        import weewx.manager
+
+        config = self.config
+        try:
+            dbm = weewx.manager.open_manager_with_config(config[2], self.binding)
+            try:
+                self.update(timespan, lambda data_binding=None: dbm, config)
+            finally:
+                dbm.close()
+        except Exception as e:
+            logerr("Background refresh of the averages failed: %s: %s" % (type(e).__name__, e))
+        finally:
+            self.lock.release()
+
+    def update(self, timespan, db_lookup, config):
+        """ Calculate the averages and save the result.
+
+            All tags are derived while the database manager is available.
+
+            Parameters:
+                timespan:  The TimeSpan of the report.
+                db_lookup: Function that returns a database manager.
+                config:    The (Averages object, skin dict, WeeWX config dict)
+                           tuple used for the calculation.
+
+            Returns the new result as a tuple (result, timestamp of its data,
+            skin dict used).
+        """
+
+        t1 = time.time()
+        _averages, _skin_dict, _config_dict = config
+        latest = (dict(_averages.calculate(timespan, db_lookup)), timespan.stop, _skin_dict)
+        self.latest = latest
+        if weewx.debug >= 2:
+            logdbg("MonthAverages refreshed in %0.3f seconds" % (time.time() - t1))
+        return latest
+
+
+# the background refreshes keyed by skin and data binding, they outlive the
+# SLE objects which are created each report cycle
+refreshes = {}
+refreshes_lock = threading.Lock()
+
+
+def get_refresh(averages, skin_dict, config_dict):
+    """ Return the BackgroundRefresh used by a skin and data binding.
+
+        The BackgroundRefresh is configured with the config of the current
+        report cycle so that any change to the skin config, eg the
+        observations, units or max_staleness, is used by the next
+        calculation.
+
+        Parameters:
+            averages:    The Averages object of the current report cycle.
+            skin_dict:   The skin config dict.
+            config_dict: The WeeWX config dict.
+
+        Returns a BackgroundRefresh object.
+    """
+
+    binding = averages.data_binding or skin_dict.get('data_binding', 'wx_binding')
+    _key = (skin_dict.get('REPORT_NAME', skin_dict.get('skin')), binding)
+    with refreshes_lock:
+        if _key not in refreshes:
+            refreshes[_key] = BackgroundRefresh(binding)
+        refreshes[_key].configure(averages, skin_dict, config_dict)
+        return refreshes[_key]
+
+
+class MonthAverages(SearchList):
+    """ Search list extension providing monthly averages for use by HighCharts.
+
+        Refer to Averages.calculate() for details of the results provided. If
+        the background_refresh config option is set the most recent result is
+        returned and the averages are refreshed in the background, refer
+        BackgroundRefresh.
+    """
+
+    def __init__(self, generator):
+        SearchList.__init__(self, generator)
+
+        self.averages = Averages(self.generator.skin_dict,
+                                 self.generator.config_dict,
+                                 self.generator.converter)
+
+    def get_extension_list(self, timespan, db_lookup):
+        """ Returns json format month avg/max/min stats for use by HighCharts.
+
+            Parameters:
+                timespan: An instance of weeutil.weeutil.TimeSpan. This will
+                          hold the start and stop times of the domain of
+                          valid times.
+                db_lookup: An instance of weewx.archive.Archive
+        """
+
+        if self.averages.background_refresh:
+            _refresh = get_refresh(self.averages,
+                                   self.generator.skin_dict,
+                                   self.generator.config_dict)
+            return [_refresh.get(timespan, db_lookup)]
+        t1 = time.time()
+        _result = self.averages.calculate(timespan, db_lookup)
         t2 = time.time()
         if weewx.debug >= 2:
-            logdbg("MonthAverages SLE executed in %0.3f seconds" % (t2 - t1))
+            logdbg("MonthAverages SLE executed in %0.3f seconds "
+                   "(%d database calls, %d months)" % (t2 - t1,
+                                                       self.averages.stats['counters'].get('db_calls', 0),
+                                                       self.averages.stats['counters'].get('months_processed', 0)))
 
         return [_result]
+
+
+def build_skin_dict(config_dict, report):
+    """ Build the skin dict for a report as the report engine would.
+
+        Uses weewx.reportengine.build_skin_dict() if available (WeeWX 4.6.0
+        or later) otherwise the skin dict is built from the skin.conf file
+        and the [StdReport] config settings.
+    """
+
+    import configobj
+    import weewx.reportengine
+
+    if hasattr(weewx.reportengine, 'build_skin_dict'):
+        return weewx.reportengine.build_skin_dict(config_dict, report)
+    skin_dict = configobj.ConfigObj()
+    try:
+        import weewx.defaults
+        skin_dict.merge(weewx.defaults.defaults)
+    except ImportError:
+        # WeeWX v3 has no defaults, everything is in the skin.conf file
+        pass
+    _std_report_dict = config_dict['StdReport']
+    _skin_path = os.path.join(config_dict['WEEWX_ROOT'],
+                              _std_report_dict['SKIN_ROOT'],
+                              _std_report_dict[report].get('skin', ''),
+                              'skin.conf')
+    skin_dict.merge(configobj.ConfigObj(_skin_path, file_error=True))
+    skin_dict['REPORT_NAME'] = report
+    for _scalar in _std_report_dict.scalars:
+        skin_dict[_scalar] = _std_report_dict[_scalar]
+    skin_dict.merge(_std_report_dict[report])
+    return skin_dict
@@ -0,0 +1,307 @@
+"""
+averagesservice.py
+
+A WeeWX service to maintain the month stats cache of the MonthAverages search
+list extension as archive records arrive.
+
+Copyright (c) 2015-2020 Gary Roderick               gjroderick<at>gmail.com
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program.  If not, see http://www.gnu.org/licenses/.
+
+Version: 1.1.0                                   Date: 17 October 2026
+
+Revision History
+    17 October 2026     v1.1.0
+        - initial implementation, moved from averagessearchlist.py
+        - the service uses the data binding of the report
+        - the current month state is saved on a change of day and on shutdown
+          rather than after every record
+        - the day averages used for degree days are only kept if degree days
+          are calculated
+
+To use the service add it to the archive_services of the [Engine] [[Services]]
+section of weewx.conf, eg:
+
+[Engine]
+    [[Services]]
+        archive_services = weewx.engine.StdArchive, user.averagesservice.AveragesService
+"""
+import json
+import os
+import time
+import weewx
+
+from datetime import date
+from weewx.engine import StdService
+from weewx.units import to_std_system
+from weeutil.weeutil import archiveDaySpan
+
+from user.averagessearchlist import (Averages, DEGREE_DAY_OBS, build_skin_dict, get_db_id,
+                                     get_month_stats_cache, month_stats_from_rows, write_atomic)
+
+# import/setup logging, WeeWX v3 is syslog based but WeeWX v4 is logging based,
+# try v4 logging and if it fails use v3 logging
+try:
+    # WeeWX4 logging
+    import logging
+    log = logging.getLogger(__name__)
+
+    def logdbg(msg):
+        log.debug(msg)
+
+    def loginf(msg):
+        log.info(msg)
+
+    def logerr(msg):
+        log.error(msg)
+
+except ImportError:
+    # WeeWX legacy (v3) logging via syslog
+    import syslog
+
+    def logmsg(level, msg):
+        syslog.syslog(level, 'averagesservice: %s' % msg)
+
+    def logdbg(msg):
+        logmsg(syslog.LOG_DEBUG, msg)
+
+    def loginf(msg):
+        logmsg(syslog.LOG_INFO, msg)
+
+    def logerr(msg):
+        logmsg(syslog.LOG_ERR, msg)
+
+
+class CurrentMonth(object):
+    """ Daily summaries of the current month built from archive records.
+
+        Each archive record is folded into a daily summary row for each
+        observation in the same way WeeWX updates its daily summaries so that
+        the month aggregates of a complete month may be obtained without
+        querying the database.
+
+        Parameters:
+            obs_types: List of the observation types to be summarised.
+            day_avgs:  Whether the month aggregates of DEGREE_DAY_OBS include
+                       the average of each day, used to calculate degree
+                       days.
+    """
+
+    def __init__(self, obs_types, day_avgs=False):
+        self.obs_types = obs_types
+        self.day_avgs = day_avgs
+        # (year, month) of the current month
+        self.key = None
+        # daily summary rows for each observation keyed by the timestamp of
+        # the start of the day, each row is [min, mintime, max, maxtime, sum,
+        # count, wsum, sumtime]
+        self.days = {}
+        # timestamp of the last record added
+        self.last_ts = None
+        # whether we have every record since the start of the month
+        self.complete = False
+
+    def add_record(self, record):
+        """ Add an archive record.
+
+            Returns a tuple (key, month stats, complete) for the previous
+            month if the record is the first record of a new month, otherwise
+            None. Month stats is a dict of month aggregates keyed by
+            observation type, complete is True if every record of the month
+            was added.
+        """
+
+        _ts = record['dateTime']
+        if self.last_ts is not None and _ts <= self.last_ts:
+            # we already have this record
+            return None
+        _interval = record['interval'] * 60
+        # a record belongs to the day (and month) in which its interval ends
+        _day_ts = int(archiveDaySpan(_ts).start)
+        _key = tuple(time.localtime(_day_ts)[0:2])
+        _contiguous = self.last_ts is not None and _ts - _interval <= self.last_ts
+        result = None
+        if _key != self.key:
+            if self.key is not None:
+                result = (self.key, self.month_stats(), self.complete and _contiguous)
+            _month_ts = time.mktime(date(_key[0], _key[1], 1).timetuple())
+            self.key = _key
+            self.days = {}
+            self.complete = _ts - _interval <= _month_ts
+        elif not _contiguous:
+            self.complete = False
+        self.last_ts = _ts
+        for _obs in self.obs_types:
+            _row = self.days.setdefault(_obs, {}).setdefault(_day_ts, [None, None, None, None,
+                                                                       0.0, 0, 0.0, 0])
+            _value = record.get(_obs)
+            if _value is not None:
+                if _row[0] is None or _value < _row[0]:
+                    _row[0] = _value
+                    _row[1] = _ts
+                if _row[2] is None or _value > _row[2]:
+                    _row[2] = _value
+                    _row[3] = _ts
+                _row[4] += _value
+                _row[5] += 1
+                _row[6] += _value * _interval
+                _row[7] += _interval
+        return result
+
+    def month_stats(self):
+        """ Return the month aggregates of the current month for each
+            observation.
+        """
+
+        stats = {}
+        for _obs in self.obs_types:
+            _days = self.days.get(_obs, {})
+            _rows = [[_ts] + _days[_ts] for _ts in sorted(_days)]
+            stats[_obs] = month_stats_from_rows(_rows, self.day_avgs and
+                                                _obs == DEGREE_DAY_OBS).get(self.key, {})
+        return stats
+
+    def to_dict(self):
+        """ Return the state as a dict that may be saved as JSON. """
+
+        return {'key': self.key,
+                'days': dict((_obs, dict((str(_ts), _row) for _ts, _row in _days.items()))
+                             for _obs, _days in self.days.items()),
+                'last_ts': self.last_ts,
+                'complete': self.complete}
+
+    @classmethod
+    def from_dict(cls, obs_types, state, day_avgs=False):
+        """ Create a CurrentMonth from a dict returned by to_dict(). """
+
+        current = cls(obs_types, day_avgs)
+        _days = state.get('days', {})
+        if any(len(_row) != 8 for _rows in _days.values() for _row in _rows.values()):
+            # the state was saved without the times of the extremes, start
+            # afresh
+            return current
+        if state.get('key') is not None:
+            current.key = tuple(state['key'])
+            current.days = dict((_obs, dict((int(_ts), _row) for _ts, _row in _rows.items()))
+                                for _obs, _rows in _days.items())
+            current.last_ts = state.get('last_ts')
+            # an observation that was not being summarised is incomplete
+            current.complete = state.get('complete', False) and \
+                all(_obs in current.days for _obs in obs_types)
+        return current
+
+
+class AveragesService(StdService):
+    """ WeeWX service that maintains the month stats cache as data arrives.
+
+        Binds to NEW_ARCHIVE_RECORD and folds each archive record into daily
+        summaries of the current month. The current month is saved to a
+        state file when the day or month rolls over and when WeeWX shuts down
+        so that it survives a restart, records of the current day received
+        before an unclean shutdown are lost and the month is not added. When
+        the month rolls over the month aggregates of the completed month are
+        added to the month stats cache used by the MonthAverages SLE, so the
+        SLE need not query the daily summaries for that month. A month is
+        only added if every record of the month was seen, otherwise it is
+        left for the SLE to query.
+
+        The service uses the settings, including the data binding, of the
+        report named in the [AveragesService] section of weewx.conf (default
+        HighchartsAverages) and requires the month stats cache to be enabled. To have the SLE use
+        the cached months without validating them against the daily
+        summaries set validate_cache = False in the [MonthAverages] section
+        of the skin config.
+    """
+
+    def __init__(self, engine, config_dict):
+        super(AveragesService, self).__init__(engine, config_dict)
+
+        self.current = None
+        svc_dict = config_dict.get('AveragesService', {})
+        report = svc_dict.get('report', 'HighchartsAverages')
+        skin_dict = build_skin_dict(config_dict, report)
+        averages = Averages(skin_dict, config_dict, None)
+        # the month stats cache is that of the data binding used by the report
+        self.data_binding = averages.data_binding or skin_dict.get('data_binding', 'wx_binding')
+        if averages.cache_file is None or not averages.bulk_query:
+            logerr("AveragesService requires the month stats cache, "
+                   "AveragesService not started")
+            return
+        self.cache_file = averages.cache_file
+        self.validate_cache = averages.validate_cache
+        # the current month state file, a relative path is relative to the
+        # month stats cache directory
+        self.state_file = os.path.join(os.path.dirname(self.cache_file),
+                                       svc_dict.get('state_file', 'averages_month.json'))
+        obs_types = [_obs for _obs, _aggs in averages.obs]
+        day_avgs = averages.day_avgs(DEGREE_DAY_OBS)
+        try:
+            with open(self.state_file, 'r') as f:
+                self.current = CurrentMonth.from_dict(obs_types, json.load(f), day_avgs)
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            # no saved state or it is unreadable, start afresh
+            self.current = CurrentMonth(obs_types, day_avgs)
+        # the day of the last record when the state was saved
+        self.saved_day_ts = self.day_ts(self.current.last_ts)
+        self.bind(weewx.NEW_ARCHIVE_RECORD, self.new_archive_record)
+        logdbg("AveragesService maintaining '%s'" % self.cache_file)
+
+    def new_archive_record(self, event):
+        """ Fold a new archive record into the current month. """
+
+        dbm = self.engine.db_binder.get_manager(self.data_binding)
+        record = event.record
+        # records are summarised in the units used by the database
+        _std_unit_system = getattr(dbm, 'std_unit_system', None)
+        if _std_unit_system is not None and record['usUnits'] != _std_unit_system:
+            record = to_std_system(record, _std_unit_system)
+        _done = self.current.add_record(record)
+        if _done is not None:
+            _key, _stats, _complete = _done
+            if _complete:
+                # the cache is shared with the SLE so that neither overwrites
+                # the other's changes
+                cache = get_month_stats_cache(self.cache_file, get_db_id(dbm), self.validate_cache)
+                with cache.lock:
+                    for _obs, _obs_stats in _stats.items():
+                        cache.add_month(_obs, _key, _obs_stats)
+                    cache.save()
+                logdbg("AveragesService added %04d-%02d to month stats cache" % _key)
+            else:
+                logdbg("AveragesService missed records for %04d-%02d, "
+                       "not added to month stats cache" % _key)
+        # save the state once a day rather than after every record
+        if self.day_ts(self.current.last_ts) != self.saved_day_ts:
+            self.save_state()
+
+    def shutDown(self):
+        """ Save the current month state. """
+
+        if self.current is not None:
+            self.save_state()
+
+    def save_state(self):
+        """ Save the current month to the state file. """
+
+        try:
+            write_atomic(self.state_file, json.dumps(self.current.to_dict(),
+                                                     separators=(',', ':')))
+            self.saved_day_ts = self.day_ts(self.current.last_ts)
+        except (IOError, OSError) as e:
+            logerr("Unable to save current month state '%s': %s" % (self.state_file, e))
+
+    @staticmethod
+    def day_ts(ts):
+        """ Return the start of the day of a record timestamp, None if None. """
+
+        return int(archiveDaySpan(ts).start) if ts is not None else None
@@ -14,9 +14,12 @@ FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
 details.
 
 
-Version: 1.0.0                                     Date: 25 May 2020
+Version: 1.1.0                                     Date: 17 October 2026
 
 Revision History
+    17 October 2026     v1.1.0
+        - install the AveragesService, AveragesGenerator and command line
+          interface modules
     25 May 2020         v1.0.0
         - bumped version only
     30 September 2016   v0.5.0
@@ -29,7 +32,7 @@ from distutils.version import StrictVersion
 from setup import ExtensionInstaller
 
 REQUIRED_VERSION = "3.0.0"
-AFW_VERSION = "1.0.0"
+AFW_VERSION = "1.1.0"
 
 
 def loader():
@@ -56,7 +59,7 @@ class AveragesInstaller(ExtensionInstaller):
             _timing_setting = '86400'
 
         super(AveragesInstaller, self).__init__(
-            version="1.0.0",
+            version=AFW_VERSION,
             name='Averages',
             description='Highcharts plots of WeeWX monthly averages.',
             author="Gary Roderick",
@@ -94,7 +97,10 @@ class AveragesInstaller(ExtensionInstaller):
                     }
                 }
             },
-            files=[('bin/user',                         ['bin/user/averagessearchlist.py']),
+            files=[('bin/user',                         ['bin/user/averagessearchlist.py',
+                                                         'bin/user/averagesservice.py',
+                                                         'bin/user/averagesgenerator.py',
+                                                         'bin/user/averagescli.py']),
                    ('skins/HighchartsAverages',         ['skins/HighchartsAverages/averages.html',
                                                          'skins/HighchartsAverages/skin.conf']),
                    ('skins/HighchartsAverages/json',    ['skins/HighchartsAverages/json/averages.json.tmpl']),
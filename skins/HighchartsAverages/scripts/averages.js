@@ -10,9 +10,14 @@
 * Highcharts.
 *
 *
-* Version: 1.0.0a1                                 Date: 30 December 2019
+* Version: 1.1.0                                   Date: 17 October 2026
 *
 * Revision History
+*   17 October 2026     v1.1.0
+*       - added median rainfall and decile 1 to 9 rainfall plots
+*       - added day of year temperature and rain probability normals plot
+*       - JSON data may be fetched via the manifest written by the
+*         AveragesGenerator, refer manifest_source
 *   30 December 2019    v1.0.0
 *       - version number change only
 *   30 September 2016   v0.5.0
@@ -44,6 +49,7 @@ var config = {
     **/
 
     json_source: 'json/averages.json',  // path to the JSON file holding the source data
+    manifest_source: '',                 // path to the manifest naming the current versioned JSON file, eg 'json/averages.manifest.json', only written by the AveragesGenerator. '' to always use json_source
     render_to: 'monthaveragesplot',      // id of the HTML element where the chart will be rendered
     title: 'Monthly Temperature and Rainfall Averages',  // plot title. String
     show_legend: true,                      // display plot legend. true|false
@@ -58,6 +64,20 @@ var config = {
     min_temp_color: '#0000FF',              // color for min temperature plot. String, color name or RGB
     avg_rainfall_label: 'Avg Rainfall',     // legend label for average rainfall plot. String
     avg_rainfall_color: '#72B2C4',          // color for avg rainfall plot. String, color name or RGB
+    show_median_rainfall: true,             // display median rainfall plot. true|false
+    median_rainfall_label: 'Median Rainfall', // legend label for median rainfall plot. String
+    median_rainfall_color: '#2F6F80',       // color for median rainfall plot. String, color name or RGB
+    show_rainfall_deciles: true,            // display decile 1 to 9 rainfall plot. true|false
+    rainfall_deciles_label: 'Rainfall Decile 1-9', // legend label for decile 1 to 9 rainfall plot. String
+    rainfall_deciles_color: '#2F6F80',      // color for decile 1 to 9 rainfall plot. String, color name or RGB
+    daily_render_to: 'dailyaveragesplot',  // id of the HTML element where the day of year chart will be rendered
+    daily_title: 'Daily Temperature and Rain Probability Normals', // day of year plot title. String
+    mean_max_temp_label: 'Mean Max Temp',   // legend label for day of year mean max temperature plot. String
+    mean_max_temp_color: '#FF0000',         // color for day of year mean max temperature plot. String, color name or RGB
+    mean_min_temp_label: 'Mean Min Temp',   // legend label for day of year mean min temperature plot. String
+    mean_min_temp_color: '#0000FF',         // color for day of year mean min temperature plot. String, color name or RGB
+    rain_probability_label: 'Rain Probability', // legend label for day of year rain probability plot. String
+    rain_probability_color: '#72B2C4',      // color for day of year rain probability plot. String, color name or RGB
     background_color_stop1: '#FCFFC5',      // 1st color to be used in background gradient. String, color name or RGB
     background_color_stop2: '#E0E0FF',      // 2nd color to be used in background gradient. String, color name or RGB
     marker_symbol: 'circle',                // marker symbol to be used for each point of each plot (except rainfall). String
@@ -126,6 +146,16 @@ $(document).ready(function() {
                     valueSuffix: ''
                 },
             },
+            errorbar: {
+                tooltip: {
+                    valueSuffix: ''
+                },
+            },
+            scatter: {
+                tooltip: {
+                    valueSuffix: ''
+                },
+            },
             spline: {
                 lineWidth: 1,
                 marker: {
@@ -166,6 +196,24 @@ $(document).ready(function() {
             color: config.avg_rainfall_color,
             zIndex: 0,
             yAxis: 1
+        }, {
+            name: config.median_rainfall_label,
+            type: 'scatter',
+            color: config.median_rainfall_color,
+            marker: {
+                symbol: 'diamond',
+                radius: 3
+            },
+            visible: config.show_median_rainfall,
+            zIndex: 5,
+            yAxis: 1
+        }, {
+            name: config.rainfall_deciles_label,
+            type: 'errorbar',
+            color: config.rainfall_deciles_color,
+            visible: config.show_rainfall_deciles,
+            zIndex: 5,
+            yAxis: 1
         }],
         subtitle: {
             align: config.updated_align,
@@ -225,18 +273,168 @@ $(document).ready(function() {
         }]
     };
 
-    $.getJSON(config.json_source, function(seriesData) {
+    var optionsDaily = {
+        chart: {
+            plotBackgroundColor: {
+                linearGradient: { x1: 0, y1: 0, x2: 1, y2: 1 },
+                stops: [
+                    [0, config.background_color_stop1],
+                    [1, config.background_color_stop1]
+                ]
+            },
+            renderTo: config.daily_render_to
+        },
+        legend: {
+            enabled: config.show_legend,
+            symbolHeight: 12,
+            symbolRadius: 0,
+            symbolWidth: 12,
+        },
+        plotOptions: {
+            series: {
+                // day of year values are for a leap year
+                pointInterval: 86400000,
+                pointStart: Date.UTC(2000, 0, 1)
+            },
+            areaspline: {
+                fillOpacity: 0.3,
+                lineWidth: 1,
+                marker: {
+                    enabled: false
+                },
+                tooltip: {
+                    valueSuffix: '%'
+                },
+            },
+            spline: {
+                lineWidth: 1,
+                marker: {
+                    enabled: false
+                },
+                tooltip: {
+                    valueSuffix: ''
+                },
+            },
+        },
+        series: [{
+            name: config.mean_max_temp_label,
+            type: 'spline',
+            color: config.mean_max_temp_color,
+            zIndex: 2,
+        }, {
+            name: config.mean_min_temp_label,
+            type: 'spline',
+            color: config.mean_min_temp_color,
+            zIndex: 1,
+        }, {
+            name: config.rain_probability_label,
+            type: 'areaspline',
+            color: config.rain_probability_color,
+            zIndex: 0,
+            yAxis: 1
+        }],
+        subtitle: {
+            align: config.updated_align,
+            style: {
+                fontSize: config.updated_font_size
+            },
+            text: '',
+            x: config.updated_x_offset
+        },
+        title: {
+            text: config.daily_title
+        },
+        tooltip: {
+            crosshairs: [true, false],
+            enabled: config.enable_tooltip,
+            shared: true,
+            style: {
+                fontSize: config.tooltip_font_size,
+            },
+            xDateFormat: '%e %B',
+        },
+        xAxis: {
+            type: 'datetime',
+            dateTimeLabelFormats: {
+                day: '%e %b',
+                month: '%b'
+            },
+            lineColor: config.x_axis_line_color,
+            lineWidth: config.x_axis_line_width,
+        },
+        yAxis: [{
+            lineColor: config.y_axis_line_color,
+            lineWidth: config.y_axis_line_width,
+            minorGridLineWidth: 0,
+            title: {
+                style: {
+                    color: config.x_axis_title_color,
+                    font: config.x_axis_title_font
+                },
+                // need to initialise text now so we can set it later
+                text: ''
+            },
+        },{
+            lineColor: config.y_axis_line_color,
+            lineWidth: config.y_axis_line_width,
+            max: 100,
+            min: 0,
+            title: {
+                text: 'Rain Probability (%)'
+            },
+            opposite: true
+        }]
+    };
+
+    function plotAverages(seriesData) {
         optionsAverages.series[0].data = seriesData[0].temperatureplot.series.outTempMeanMinMax.data;
         optionsAverages.series[1].data = seriesData[0].temperatureplot.series.outTempMean.data;
         optionsAverages.series[2].data = seriesData[0].temperatureplot.series.outTempMax.data;
         optionsAverages.series[3].data = seriesData[0].temperatureplot.series.outTempMin.data;
         optionsAverages.series[4].data = seriesData[0].rainplot.series.rainAvg.data;
+        // median and decile rainfall may not exist in JSON data generated by
+        // older versions of the Averages extension
+        if (seriesData[0].rainplot.series.rainMedian !== undefined) {
+            optionsAverages.series[5].data = seriesData[0].rainplot.series.rainMedian.data;
+            optionsAverages.series[6].data = seriesData[0].rainplot.series.rainDeciles.data;
+        }
         optionsAverages.yAxis[0].title.text = 'Temperature ' + seriesData[0].temperatureplot.yAxisLabel.text;
         optionsAverages.yAxis[1].title.text = 'Rainfall ' + seriesData[0].rainplot.yAxisLabel.text;
         optionsAverages.plotOptions.areasplinerange.tooltip.valueSuffix = seriesData[0].temperatureplot.yAxisUnits.text;
         optionsAverages.plotOptions.spline.tooltip.valueSuffix = seriesData[0].temperatureplot.yAxisUnits.text;
         optionsAverages.plotOptions.column.tooltip.valueSuffix = seriesData[0].rainplot.yAxisUnits.text;
+        optionsAverages.plotOptions.errorbar.tooltip.valueSuffix = seriesData[0].rainplot.yAxisUnits.text;
+        optionsAverages.plotOptions.scatter.tooltip.valueSuffix = seriesData[0].rainplot.yAxisUnits.text;
         optionsAverages.subtitle.text = 'Updated: ' + seriesData[0].generated;
         var chart = new Highcharts.Chart(optionsAverages);
-    });
+        // day of year normals are only included in the JSON data if enabled
+        if (seriesData[0].dailyplot !== undefined && $('#' + config.daily_render_to).length) {
+            optionsDaily.series[0].data = seriesData[0].dailyplot.series.outTempMeanMax.data;
+            optionsDaily.series[1].data = seriesData[0].dailyplot.series.outTempMeanMin.data;
+            optionsDaily.series[2].data = seriesData[0].dailyplot.series.rainProbability.data;
+            optionsDaily.yAxis[0].title.text = 'Temperature ' + seriesData[0].temperatureplot.yAxisLabel.text;
+            optionsDaily.plotOptions.spline.tooltip.valueSuffix = seriesData[0].temperatureplot.yAxisUnits.text;
+            optionsDaily.subtitle.text = 'Updated: ' + seriesData[0].generated;
+            var dailyChart = new Highcharts.Chart(optionsDaily);
+        } else {
+            $('#' + config.daily_render_to).parent().hide();
+        }
+    }
+
+    // The manifest names the current versioned JSON data file, which never
+    // changes and so may be cached by the browser. The manifest itself is
+    // always fetched. If there is no manifest use the unversioned JSON data
+    // file.
+    if (config.manifest_source) {
+        $.ajax({url: config.manifest_source, dataType: 'json', cache: false})
+            .done(function(manifest) {
+                var dir = config.manifest_source.substring(0, config.manifest_source.lastIndexOf('/') + 1);
+                $.getJSON(dir + manifest.file, plotAverages);
+            })
+            .fail(function() {
+                $.getJSON(config.json_source, plotAverages);
+            });
+    } else {
+        $.getJSON(config.json_source, plotAverages);
+    }
 });
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""
+support.py
+
+Shared fixtures for the MonthAverages unit tests.
+
+Copyright (c) 2015-2020 Gary Roderick               gjroderick<at>gmail.com
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program.  If not, see http://www.gnu.org/licenses/.
+
+Version: 1.1.0                                   Date: 17 October 2026
+
+Revision History
+    17 October 2026     v1.1.0
+        - initial implementation
+
+The synthetic database, schema and skin settings are those of the benchmark,
+bench/bench_averages.py, so that the tests and the benchmark exercise the same
+data.
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from datetime import date
+
+# test the extension in this source tree rather than any installed copy
+_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(_ROOT, 'bench'))
+sys.path.insert(0, os.path.join(_ROOT, 'bin'))
+
+import configobj
+import weedb
+import weewx.manager
+import weewx.units
+from weeutil.weeutil import TimeSpan
+
+import user.averagessearchlist as averages
+from bench_averages import generate_db, SKIN_DICT
+
+# the first and last days of data in the test database, the last month is
+# incomplete
+FIRST_DATE = date(2015, 1, 1)
+END_DATE = date(2019, 6, 15)
+
+# days without data, May 2016 has six missing days and June 2017 a run of four
+# consecutive missing days
+MISSING_DATES = [date(2016, 5, _d) for _d in (2, 6, 10, 14, 18, 22)] + \
+                [date(2017, 6, _d) for _d in (10, 11, 12, 13)]
+
+
+def stop_ts(year, month, day=15):
+    """ Return a timestamp at midday of a date. """
+
+    return int(time.mktime(date(year, month, day).timetuple())) + 12 * 3600
+
+
+def day_ts(day):
+    """ Return the timestamp of the start of a date. """
+
+    return int(time.mktime(day.timetuple()))
+
+
+def make_skin_dict(options, skin_root=None):
+    """ Return a skin config dict with a [MonthAverages] section.
+
+        Parameters:
+            options:   Dict of [MonthAverages] config options.
+            skin_root: The SKIN_ROOT of the skin, None for no SKIN_ROOT.
+    """
+
+    skin_dict = configobj.ConfigObj(SKIN_DICT)
+    if skin_root is not None:
+        skin_dict['SKIN_ROOT'] = skin_root
+    skin_dict['MonthAverages'] = options
+    return skin_dict
+
+
+def make_averages(options, skin_root=None):
+    """ Return an Averages object for a dict of [MonthAverages] options. """
+
+    return averages.Averages(make_skin_dict(options, skin_root),
+                             configobj.ConfigObj({'WEEWX_ROOT': '/'}),
+                             weewx.units.Converter(SKIN_DICT['Units']['Groups']))
+
+
+def make_config_dict(html_root, databases):
+    """ Return a WeeWX config dict with the HighchartsAverages report.
+
+        The report uses the skin in this source tree, its JSON data file is
+        written below html_root and its month stats caches alongside
+        html_root.
+
+        Parameters:
+            html_root: The HTML_ROOT of the report.
+            databases: Dict of SQLite database paths keyed by data binding.
+    """
+
+    config_dict = configobj.ConfigObj({
+        'WEEWX_ROOT': os.path.abspath(_ROOT),
+        'StdReport': {'SKIN_ROOT': 'skins',
+                      'HTML_ROOT': html_root,
+                      'HighchartsAverages': {
+                          'skin': SKIN_DICT['skin'],
+                          'MonthAverages': {
+                              'cache_file': os.path.join(os.path.dirname(html_root),
+                                                        'averages_cache.json')}}},
+        'DataBindings': {},
+        'Databases': {},
+        'DatabaseTypes': {'SQLite': {'driver': 'weedb.sqlite', 'SQLITE_ROOT': '/'}}})
+    for _binding, _path in databases.items():
+        config_dict['DataBindings'][_binding] = {'database': '%s_db' % _binding,
+                                                 'table_name': 'archive',
+                                                 'manager': 'weewx.manager.DaySummaryManager'}
+        config_dict['Databases']['%s_db' % _binding] = {'database_name': _path,
+                                                        'database_type': 'SQLite'}
+    return config_dict
+
+
+class DatabaseTest(unittest.TestCase):
+    """ Base class of tests against the synthetic database.
+
+        The database is generated once for each test class, each test has
+        its own copy of the database and skin directory and a new process
+        worth of cached state.
+    """
+
+    # the period of the database and the days without data, may be changed
+    # by a test class
+    first_date = FIRST_DATE
+    end_date = END_DATE
+    missing_dates = MISSING_DATES
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.master = os.path.join(cls.tmp_dir, 'master.sdb')
+        # an archive record at stop_ts() of each month so that a calculation
+        # may end in any month
+        _archive_ts = [stop_ts(_y, _m) for _y in range(cls.first_date.year, cls.end_date.year + 1)
+                       for _m in range(1, 13)]
+        generate_db(cls.master, cls.first_date, cls.end_date, cls.missing_dates, _archive_ts)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self.skin_dir = os.path.join(self.work_dir, SKIN_DICT['skin'])
+        self.db_path = os.path.join(self.work_dir, 'weewx.sdb')
+        self.db_dict = {'database_name': self.db_path,
+                        'driver': 'weedb.sqlite',
+                        'SQLITE_ROOT': '/'}
+        shutil.copy(self.master, self.db_path)
+        os.makedirs(self.skin_dir)
+        averages.month_stats_caches.clear()
+        self.dbm = weewx.manager.DaySummaryManager.open(self.db_dict)
+
+    def tearDown(self):
+        self.dbm.close()
+        averages.month_stats_caches.clear()
+
+    def tags(self, options, stop=None):
+        """ Return the tags of a calculation.
+
+            Parameters:
+                options: Dict of [MonthAverages] config options.
+                stop:    Timestamp the calculation ends, None for the last
+                         record in the database.
+        """
+
+        avg = make_averages(options, self.work_dir)
+        timespan = TimeSpan(self.dbm.firstGoodStamp(), stop or self.dbm.lastGoodStamp())
+        return avg.calculate(timespan, lambda data_binding=None: self.dbm)
+
+    def calculate(self, options, stop=None):
+        """ Return the tags of a calculation as a dict, less the stats. """
+
+        tags = self.tags(options, stop)
+        return dict((_tag, tags[_tag]) for _tag in tags if _tag != 'averagesStats')
+
+    def edit_day(self, day, obs_type='outTemp', **columns):
+        """ Change the daily summary of a day. """
+
+        with weedb.Transaction(self.dbm.connection) as cursor:
+            for _column, _value in columns.items():
+                cursor.execute("UPDATE archive_day_%s SET %s = ? WHERE dateTime = ?"
+                               % (obs_type, _column), (_value, day_ts(day)))
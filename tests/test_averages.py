@@ -0,0 +1,888 @@
+"""
+test_averages.py
+
+Unit tests for the MonthAverages search list extension.
+
+Copyright (c) 2015-2020 Gary Roderick               gjroderick<at>gmail.com
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program.  If not, see http://www.gnu.org/licenses/.
+
+Version: 1.1.0                                   Date: 17 October 2026
+
+Revision History
+    17 October 2026     v1.1.0
+        - initial implementation
+
+Tests are run against a small synthetic SQLite WeeWX database generated in a
+temporary directory, no WeeWX installation (other than the WeeWX python
+modules) is required.
+
+Usage:
+
+    $ PYTHONPATH=/path/to/weewx/bin python -m unittest discover tests
+"""
+from __future__ import print_function
+
+import json
+import math
+import os
+import random
+import time
+import unittest
+
+from datetime import date
+
+import configobj
+import weewx.units
+from weeutil.weeutil import TimeSpan
+
+from support import (averages, day_ts, make_averages, make_config_dict, make_skin_dict,
+                     stop_ts, DatabaseTest)
+
+
+class MonthAccumulatorTest(unittest.TestCase):
+
+    def test_zero_total(self):
+        # a running total of zero is a total like any other
+        accum = averages.MonthAccumulator(3)
+        accum.add(0, 0.0)
+        accum.add(0, 0.0)
+        accum.add(1, 2.0)
+        accum.add(1, None)
+        self.assertEqual(accum.means(), [0.0, 2.0, None])
+        self.assertEqual(list(accum.count), [2, 1, 0])
+
+    def test_extremes(self):
+        accum = averages.MonthAccumulator.from_rows([[1.0, 5.0], [3.0, None], [2.0, 4.0]], size=2)
+        self.assertEqual(accum.get('max'), [3.0, 5.0])
+        self.assertEqual(accum.get('min'), [1.0, 4.0])
+        self.assertEqual(accum.get('avg'), [2.0, 4.5])
+        self.assertEqual(list(accum.count), [3, 2])
+        empty = averages.MonthAccumulator(2)
+        for _agg in ('max', 'min', 'avg'):
+            self.assertEqual(empty.get(_agg), [None, None])
+
+    def test_means_without_numpy(self):
+        _rng = random.Random(1)
+        rows = [[_rng.uniform(-10, 30) if _rng.random() < 0.9 else None for x in range(12)]
+                for y in range(40)]
+        accum = averages.MonthAccumulator.from_rows(rows)
+        _numpy = averages.numpy
+        try:
+            averages.numpy = None
+            python_means = accum.means()
+        finally:
+            averages.numpy = _numpy
+        expected = []
+        for _i in range(12):
+            _values = [_r[_i] for _r in rows if _r[_i] is not None]
+            expected.append(sum(_values) / len(_values))
+        for _mean, _exp in zip(python_means, expected):
+            self.assertAlmostEqual(_mean, _exp, places=9)
+        if _numpy is not None:
+            for _mean, _exp in zip(accum.means(), expected):
+                self.assertAlmostEqual(_mean, _exp, places=9)
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertIsNone(averages.QuantileSketch().quantile(0.5))
+
+    def test_exact(self):
+        # until the first compaction quantiles are exact and interpolated
+        sketch = averages.QuantileSketch()
+        for _v in (5, 1, 4, 2, 3, None):
+            sketch.add(_v)
+        self.assertEqual(sketch.n, 5)
+        self.assertEqual(sketch.quantile(0.5), 3)
+        self.assertEqual(sketch.quantile(0.0), 1)
+        self.assertEqual(sketch.quantile(1.0), 5)
+        self.assertAlmostEqual(sketch.quantile(0.1), 1.4)
+
+    def test_bounded(self):
+        _rng = random.Random(2)
+        values = [_rng.gauss(0, 1) for x in range(20000)]
+        sketch = averages.QuantileSketch(capacity=128)
+        for _v in values:
+            sketch.add(_v)
+        # memory is bounded
+        self.assertLess(sum(len(_l) for _l in sketch.levels), 128 * len(sketch.levels) + 1)
+        # and the rank error is small
+        values.sort()
+        for _q in (0.1, 0.5, 0.9):
+            _quantile = sketch.quantile(_q)
+            _rank = sum(1 for _v in values if _v <= _quantile) / float(len(values))
+            self.assertAlmostEqual(_rank, _q, delta=0.03)
+
+    def test_month_percentiles(self):
+        rows = [[float(_y), None] for _y in range(1, 12)]
+        result = averages.month_percentiles(rows, (10, 50, 90), size=2)
+        self.assertEqual(result[50], [6.0, None])
+        self.assertAlmostEqual(result[10][0], 2.0)
+        self.assertAlmostEqual(result[90][0], 10.0)
+
+
+class MonthStatsTest(unittest.TestCase):
+
+    def row(self, day, low, high, count=288):
+        _ts = day_ts(day)
+        return (_ts, low, _ts + 3600, high, _ts + 7200, 10.0, count, 600.0, 300.0)
+
+    def test_month_stats(self):
+        rows = [self.row(date(2020, 3, 2), 5.0, 12.0),
+                self.row(date(2020, 3, 3), 2.0, 15.0),
+                self.row(date(2020, 3, 4), 2.0, 15.0),
+                self.row(date(2020, 3, 5), None, None, 0),
+                self.row(date(2020, 3, 9), 4.0, 9.0),
+                self.row(date(2020, 4, 1), None, None, 0)]
+        stats = averages.month_stats_from_rows(rows, day_avgs=True)
+        self.assertEqual(sorted(stats), [(2020, 3), (2020, 4)])
+        march = stats[(2020, 3)]
+        # the time of the first occurrence of each extreme is kept
+        self.assertEqual((march['min'], march['mintime']), (2.0, rows[1][2]))
+        self.assertEqual((march['max'], march['maxtime']), (15.0, rows[1][4]))
+        self.assertEqual(march['meanmin'], 13.0 / 4)
+        self.assertEqual(march['meanmax'], 51.0 / 4)
+        self.assertEqual(march['sum'], 50.0)
+        self.assertEqual(march['avg'], 2.0)
+        self.assertEqual(march['count'], 4 * 288)
+        self.assertEqual(march['rows'], 6 - 1)
+        self.assertEqual(march['days'], 4)
+        # 22 days without data follow the last day with data
+        self.assertEqual(march['max_gap'], 22)
+        self.assertEqual(march['day_avgs'], [2.0] * 5)
+        self.assertEqual(march['fp'], [5, 4 * 288, 50.0, 2.0, 15.0, 13.0, 51.0, 3000.0,
+                                       1500.0, sum(_r[2] for _r in rows[:5]),
+                                       sum(_r[4] for _r in rows[:5])])
+        # a month of rows without data
+        april = stats[(2020, 4)]
+        self.assertEqual((april['min'], april['mintime'], april['days']), (None, None, 0))
+        self.assertEqual(april['max_gap'], 30)
+        self.assertEqual(averages.month_stats_from_rows([]), {})
+
+
+class BulkQueryTest(DatabaseTest):
+
+    def test_bulk_matches_legacy(self):
+        bulk = self.calculate({'cache': 'False'})
+        legacy = self.calculate({'bulk_query': 'False'})
+        tags = [_t for _t, _o, _a in averages.LEGACY_TAGS] + ['monthTempMeanMinMaxjson']
+        self.assertEqual(len(tags), 5)
+        for _tag in tags:
+            self.assertEqual(bulk[_tag], legacy[_tag], _tag)
+
+    def test_month_stats_match_aggregates(self):
+        # the single pass agrees with getAggregate() for each month
+        _start = day_ts(date(2016, 1, 1))
+        _stop = day_ts(date(2017, 1, 1))
+        stats = averages.get_month_stats(self.dbm, 'outTemp', _start, _stop)
+        self.assertEqual(len(stats), 12)
+        for _m in range(1, 13):
+            _month = stats[(2016, _m)]
+            _span = TimeSpan(day_ts(date(2016, _m, 1)),
+                                      day_ts(averages.get_first_day(date(2016, _m, 1),
+                                                                    d_months=1)))
+            for _agg in ('min', 'max', 'avg', 'meanmin', 'meanmax'):
+                self.assertAlmostEqual(_month[_agg],
+                                       self.dbm.getAggregate(_span, 'outTemp', _agg)[0],
+                                       places=9)
+        # May 2016 has six missing days
+        self.assertEqual(stats[(2016, 5)]['days'], 25)
+        self.assertEqual(stats[(2016, 5)]['max_gap'], 1)
+
+
+class MonthStatsCacheTest(DatabaseTest):
+
+    def test_cache_matches_fresh(self):
+        self.assertEqual(self.calculate({}), self.calculate({'cache': 'False'}))
+        # a second run uses the cached months
+        self.assertEqual(self.calculate({}), self.calculate({'cache': 'False'}))
+
+    def test_fingerprint_invalidation(self):
+        _key = (2016, 3)
+        _start = day_ts(date(2016, 3, 1))
+        _stop = day_ts(date(2016, 4, 1))
+        fp = averages.get_fingerprint(self.dbm, 'outTemp', _start, _stop)
+        stats = averages.get_month_stats(self.dbm, 'outTemp', _start, _stop)[_key]
+        self.assertTrue(averages.fingerprints_match(fp, averages.month_fingerprint(stats)))
+        cached = self.calculate({})
+        # changing only the maximum of a day that is not the month maximum
+        # leaves the month count, sum, minimum and maximum unchanged
+        self.edit_day(date(2016, 3, 10), max=stats['min'] + 5.0)
+        fp2 = averages.get_fingerprint(self.dbm, 'outTemp', _start, _stop)
+        self.assertFalse(averages.fingerprints_match(fp, fp2))
+        fresh = self.calculate({'cache': 'False'})
+        self.assertNotEqual(cached['monthTempMeanMinMaxjson'], fresh['monthTempMeanMinMaxjson'])
+        # a new process validates every cached month
+        averages.month_stats_caches.clear()
+        self.assertEqual(self.calculate({}), fresh)
+        # as does a long running process once a day
+        self.edit_day(date(2016, 3, 11), maxtime=_start + 3600)
+        self.edit_day(date(2016, 3, 12), max=stats['min'] + 6.0)
+        fresh = self.calculate({'cache': 'False'})
+        _cache = list(averages.month_stats_caches.values())[0]
+        _cache.validated_ts -= averages.FULL_VALIDATION_INTERVAL + 1
+        self.assertEqual(self.calculate({}), fresh)
+
+    def test_unwritable_cache(self):
+        # an unwritable cache file is logged once and the months are kept in
+        # memory
+        _errors = []
+        _logerr = averages.logerr
+        averages.logerr = _errors.append
+        try:
+            options = {'cache_file': os.path.join(self.work_dir, 'missing', 'cache.json')}
+            fresh = self.calculate({'cache': 'False'})
+            for _n in range(3):
+                self.assertEqual(self.calculate(options), fresh)
+        finally:
+            averages.logerr = _logerr
+        self.assertEqual(len(_errors), 1)
+        self.assertIn('Unable to save month stats cache', _errors[0])
+        _cache = list(averages.month_stats_caches.values())[0]
+        self.assertTrue(_cache.dirty)
+        self.assertEqual(len(_cache.obs['outTemp']), 53)
+
+    def test_db_id(self):
+        self.assertEqual(averages.get_db_id(self.dbm), '%s:archive' % self.db_path)
+
+        class Connection(object):
+            dbtype = 'mysql'
+            database_name = 'weewx'
+
+        class Manager(object):
+            connection = Connection()
+            table_name = 'archive'
+
+            def __init__(self, host):
+                self.host = host
+
+            def getSql(self, sql):
+                return self.host, 3306
+
+        # MySQL databases of the same name on different servers differ
+        self.assertEqual(averages.get_db_id(Manager('db1')), 'db1:3306/weewx:archive')
+        self.assertNotEqual(averages.get_db_id(Manager('db1')),
+                            averages.get_db_id(Manager('db2')))
+
+
+class ObservationsTest(DatabaseTest):
+
+    def test_reserved_tags(self):
+        # rain avg would replace the default template rain sum
+        avg = make_averages({'observations': {'rain': ['sum', 'avg'],
+                                              'windSpeed': ['avg']}})
+        self.assertEqual(dict(avg.obs)['rain'], ['sum'])
+        self.assertEqual(dict(avg.obs)['windSpeed'], ['avg'])
+
+    def test_configured_observations(self):
+        options = {'cache': 'False',
+                   'observations': {'outTemp': ['max', 'min', 'avg'],
+                                    'rain': ['sum', 'max']}}
+        tags = self.calculate(options)
+        for _tag in ('monthOutTempAvgjson', 'monthRainMaxjson', 'monthOutTempMaxYearsjson'):
+            self.assertEqual(len(json.loads(tags[_tag])), 12 if 'Years' not in _tag else 5, _tag)
+        self.assertNotIn('monthRainMinjson', tags)
+        # the series used by the default template are always calculated
+        self.assertIn('monthTempMeanMinMaxjson', tags)
+
+    def test_missing_daily_summaries(self):
+        # windSpeed has no daily summaries in the test database
+        options = {'cache': 'False', 'observations': {'windSpeed': ['avg']}}
+        tags = self.calculate(options)
+        self.assertNotIn('monthWindSpeedAvgjson', tags)
+        self.assertEqual(tags['monthRainAvgjson'],
+                         self.calculate({'cache': 'False'})['monthRainAvgjson'])
+
+
+class BreakdownsTest(DatabaseTest):
+
+    # four years either side of the start of a decade
+    first_date = date(2006, 1, 1)
+    end_date = date(2013, 12, 31)
+    missing_dates = ()
+
+    def breakdowns(self, tag):
+        tags = self.calculate({'cache': 'False'})
+        return [json.loads(tags['%s%sjson' % (tag, _suffix)])
+                for _suffix in ('', 'Years', 'Decades', 'Anomalies')]
+
+    def test_years(self):
+        normals, years, decades, anomalies = self.breakdowns('monthOutTempMax')
+        self.assertEqual(sorted(years), [str(_y) for _y in range(2006, 2014)])
+        _start = day_ts(date(2009, 3, 1))
+        _stats = averages.get_month_stats(self.dbm, 'outTemp', _start, day_ts(date(2009, 4, 1)))
+        self.assertEqual(years['2009'][2], round(_stats[(2009, 3)]['max'], 1))
+        # the normal is the highest maximum of any year
+        for _m in range(12):
+            self.assertEqual(normals[_m], max(_v[_m] for _v in years.values()))
+
+    def test_decades(self):
+        normals, years, decades, anomalies = self.breakdowns('monthOutTempMeanmax')
+        self.assertEqual(sorted(decades), ['2000', '2010'])
+        for _decade, _years in (('2000', range(2006, 2010)), ('2010', range(2010, 2014))):
+            for _m in range(12):
+                _mean = sum(years[str(_y)][_m] for _y in _years) / len(_years)
+                self.assertAlmostEqual(decades[_decade][_m], _mean, delta=0.06)
+        normals, years, decades, anomalies = self.breakdowns('monthOutTempMax')
+        for _m in range(12):
+            self.assertEqual(max(decades['2000'][_m], decades['2010'][_m]), normals[_m])
+
+    def test_anomalies(self):
+        normals, years, decades, anomalies = self.breakdowns('monthRainSum')
+        self.assertEqual(sorted(anomalies), sorted(years))
+        for _m in range(12):
+            _mean = sum(_v[_m] for _v in years.values()) / len(years)
+            self.assertAlmostEqual(_mean, normals[_m], delta=0.06)
+            for _y in years:
+                self.assertAlmostEqual(anomalies[_y][_m], years[_y][_m] - _mean, delta=0.11)
+            # anomalies of a month sum to zero over the years
+            self.assertAlmostEqual(sum(_v[_m] for _v in anomalies.values()), 0.0,
+                                   delta=0.05 * len(years))
+
+
+class NormalsPeriodTest(DatabaseTest):
+
+    def test_fixed_period(self):
+        tags = self.calculate({'cache': 'False', 'normals_start': '2016', 'normals_end': '2017'})
+        years = json.loads(tags['monthOutTempMeanmaxYearsjson'])
+        self.assertEqual(sorted(years), ['2016', '2017'])
+        for _m, _normal in enumerate(json.loads(tags['monthOutTempMeanmaxjson'])):
+            self.assertAlmostEqual(_normal, (years['2016'][_m] + years['2017'][_m]) / 2,
+                                   delta=0.06)
+
+    def test_rolling_period(self):
+        # a one year rolling period ending with the last complete month
+        tags = self.calculate({'cache': 'False', 'normals_years': '1'}, stop_ts(2018, 9))
+        years = json.loads(tags['monthOutTempMeanmaxYearsjson'])
+        self.assertEqual(json.loads(tags['monthOutTempMeanmaxjson']),
+                         years['2018'][0:8] + years['2017'][8:12])
+
+    def test_rolling_normals_match_fresh(self):
+        for _options in ({'normals_years': '1'},
+                         {'normals_years': '2', 'max_missing_days': '5',
+                          'max_consecutive_missing_days': '3'}):
+            for _y, _m in ((2017, 2), (2017, 3), (2017, 4), (2017, 9), (2018, 9), (2018, 10)):
+                cached = self.calculate(_options, stop_ts(_y, _m))
+                fresh = self.calculate(dict(_options, cache='False'), stop_ts(_y, _m))
+                self.assertEqual(cached, fresh, (_options, _y, _m))
+        # the cache holds month aggregates only
+        with open(os.path.join(self.skin_dir, 'averages_cache.json')) as f:
+            self.assertEqual(sorted(json.load(f)), ['db_id', 'obs', 'version'])
+
+
+class PercentilesTest(DatabaseTest):
+
+    def test_percentile_tags(self):
+        tags = self.calculate({'cache': 'False', 'percentiles': ['25', '75', '150']})
+        years = json.loads(tags['monthRainSumYearsjson'])
+        percentiles = json.loads(tags['monthRainSumPercentilesjson'])
+        # the default percentiles are always calculated, invalid percentiles
+        # are ignored
+        self.assertEqual(sorted(percentiles, key=float), ['10', '25', '50', '75', '90'])
+        for _m in range(12):
+            _values = [_v[_m] for _v in years.values() if _v[_m] is not None]
+            self.assertLessEqual(min(_values), percentiles['10'][_m])
+            self.assertLessEqual(percentiles['25'][_m], percentiles['50'][_m])
+            self.assertLessEqual(percentiles['50'][_m], percentiles['75'][_m])
+            self.assertLessEqual(percentiles['90'][_m], max(_values))
+        # the default template median and deciles
+        median = json.loads(tags['monthRainMedianjson'])
+        deciles = json.loads(tags['monthRainDecilesjson'])
+        self.assertEqual(median, percentiles['50'])
+        self.assertEqual(deciles, [[_l, _h] for _l, _h in zip(percentiles['10'],
+                                                                percentiles['90'])])
+
+
+class SmoothingTest(unittest.TestCase):
+
+    def setUp(self):
+        # a single annual cycle sampled for four years, 29 February once
+        self.accum = averages.MonthAccumulator(averages.DAYS_OF_YEAR)
+        self.expected = []
+        for _i in range(averages.DAYS_OF_YEAR):
+            _v = 10.0 + 5.0 * math.cos(2 * math.pi * _i / averages.DAYS_OF_YEAR)
+            self.expected.append(_v)
+            for x in range(1 if _i == 59 else 4):
+                self.accum.add(_i, _v)
+
+    def smooth(self, method, with_numpy, **kwargs):
+        _numpy = averages.numpy
+        try:
+            if not with_numpy:
+                averages.numpy = None
+            return averages.smooth_day_of_year(self.accum, method, **kwargs)
+        finally:
+            averages.numpy = _numpy
+
+    def test_harmonic(self):
+        # a fit of the first harmonic recovers the annual cycle
+        for _numpy in (False, True) if averages.numpy is not None else (False,):
+            result = self.smooth('harmonic', _numpy, harmonics=1)
+            for _v, _exp in zip(result, self.expected):
+                self.assertAlmostEqual(_v, _exp, places=6)
+
+    def test_moving(self):
+        # empty bins are filled and the year is circular
+        self.accum = averages.MonthAccumulator(averages.DAYS_OF_YEAR)
+        for _i in range(averages.DAYS_OF_YEAR):
+            if _i not in (0, 100):
+                self.accum.add(_i, 3.0)
+        python = self.smooth('moving', False, window=5)
+        self.assertEqual(python, [3.0] * averages.DAYS_OF_YEAR)
+        if averages.numpy is not None:
+            for _v, _exp in zip(self.smooth('moving', True, window=5), python):
+                self.assertAlmostEqual(_v, _exp, places=9)
+
+    def test_none(self):
+        self.assertEqual(self.smooth('none', False), self.accum.means())
+
+
+class DayOfYearTest(DatabaseTest):
+
+    def day_of_year(self, smoothing):
+        tags = self.calculate({'cache': 'False', 'day_of_year': 'True',
+                               'smoothing': smoothing})
+        return dict((_tag, json.loads(tags[_tag])) for _tag in averages.DAY_OF_YEAR_TAGS)
+
+    def test_unsmoothed(self):
+        # the normals of 1 January are those of each 1 January in the complete
+        # months of data, temperatures are in degree_C and rain in cm
+        tags = self.day_of_year('none')
+        _maxes = []
+        _wet = []
+        for _year in range(self.first_date.year, self.end_date.year + 1):
+            _ts = day_ts(date(_year, 1, 1))
+            _maxes.append(self.dbm.getSql("SELECT max FROM archive_day_outTemp "
+                                          "WHERE dateTime = ?", (_ts,))[0])
+            _wet.append(self.dbm.getSql("SELECT sum FROM archive_day_rain "
+                                        "WHERE dateTime = ?", (_ts,))[0] >= 0.02)
+        self.assertEqual(len(tags['dayTempMeanMaxjson']), averages.DAYS_OF_YEAR)
+        self.assertAlmostEqual(tags['dayTempMeanMaxjson'][0], sum(_maxes) / len(_maxes),
+                               delta=0.05)
+        self.assertAlmostEqual(tags['dayRainProbabilityjson'][0], 100.0 * sum(_wet) / len(_wet),
+                               delta=0.05)
+
+    def test_smoothed(self):
+        # smoothing reduces the day to day variation, rain probability stays
+        # a percentage
+        none = self.day_of_year('none')['dayTempMeanMaxjson']
+        for _smoothing in ('moving', 'harmonic'):
+            tags = self.day_of_year(_smoothing)
+            _vec = tags['dayTempMeanMaxjson']
+            self.assertNotIn(None, _vec)
+            self.assertLess(sum(abs(_b - _a) for _a, _b in zip(_vec, _vec[1:])),
+                            sum(abs(_b - _a) for _a, _b in zip(none, none[1:])) / 2)
+            self.assertTrue(all(0.0 <= _p <= 100.0 for _p in tags['dayRainProbabilityjson']))
+
+    def test_invalid_smoothing(self):
+        errors = []
+        _logerr = averages.logerr
+        averages.logerr = errors.append
+        try:
+            tags = self.day_of_year('spline')
+        finally:
+            averages.logerr = _logerr
+        self.assertEqual(errors, ["Ignoring invalid smoothing 'spline'"])
+        self.assertEqual(tags, self.day_of_year('none'))
+
+
+class LazyTagsTest(DatabaseTest):
+
+    def test_derived_on_access(self):
+        # only the series of the tags accessed are derived, the day of year
+        # normals are only queried when a day of year tag is accessed
+        tags = self.tags({'cache': 'False', 'day_of_year': 'True'})
+        _calls = tags['averagesStats']['counters']['db_calls']
+        self.assertEqual(tags._series, {})
+        rain = tags['monthRainAvgjson']
+        self.assertTrue(all(_name.startswith('monthRain') for _name in tags._series))
+        self.assertIs(tags['monthRainAvgjson'], rain)
+        self.assertEqual(tags['averagesStats']['counters']['db_calls'], _calls)
+        tags['dayTempMeanMaxjson']
+        self.assertGreater(tags['averagesStats']['counters']['db_calls'], _calls)
+
+    def test_averagesjson(self):
+        # averagesjson holds every series, each the same as its own tag
+        tags = self.tags({'cache': 'False', 'day_of_year': 'True'})
+        series = json.loads(tags['averagesjson'])
+        _names = [_tag[:-4] for _tag in tags
+                  if _tag.endswith('json') and _tag != 'averagesjson']
+        self.assertEqual(sorted(series), sorted(_names))
+        for _name in _names:
+            self.assertEqual(json.loads(tags['%sjson' % _name]), series[_name])
+        self.assertEqual(tags['averagesHash'], averages.payload_hash(tags['averagesjson']))
+
+    def test_mapping(self):
+        tags = self.tags({'cache': 'False'})
+        self.assertEqual(len(tags), len(list(tags)))
+        self.assertIn('monthRainAvgjson', tags)
+        self.assertNotIn('dayTempMeanMaxjson', tags)
+        with self.assertRaises(KeyError):
+            tags['dayTempMeanMaxjson']
+
+
+class ExtremesTest(DatabaseTest):
+
+    def test_extreme_times(self):
+        # the time of each record month maximum and minimum is that of the
+        # first day with the record value
+        tags = self.calculate({'cache': 'False'})
+        for _agg, _column, _best in (('Max', 'max', max), ('Min', 'min', min)):
+            years = json.loads(tags['monthOutTemp%sYearsjson' % _agg])
+            times = json.loads(tags['monthOutTemp%sTimejson' % _agg])
+            for _m in range(12):
+                _record = _best(_v[_m] for _v in years.values() if _v[_m] is not None)
+                _value, _day = self.dbm.getSql("SELECT %s, dateTime FROM archive_day_outTemp "
+                                               "WHERE %stime = ?" % (_column, _column),
+                                               (times[_m],))
+                self.assertEqual(_value, _record)
+                self.assertEqual(time.localtime(_day).tm_mon, _m + 1)
+        # a new record
+        _maxtime = day_ts(date(2016, 3, 10)) + 14 * 3600
+        self.edit_day(date(2016, 3, 10), max=45.0, maxtime=_maxtime)
+        times = json.loads(self.calculate({'cache': 'False'})['monthOutTempMaxTimejson'])
+        self.assertEqual(times[2], _maxtime)
+
+    def test_wettest_driest(self):
+        # the wettest and driest year of each month, the earliest year of
+        # any tie
+        tags = self.calculate({'cache': 'False'})
+        years = json.loads(tags['monthRainSumYearsjson'])
+        for _tag, _best in (('monthRainWettestjson', max), ('monthRainDriestjson', min)):
+            extremes = json.loads(tags[_tag])
+            self.assertEqual(len(extremes), 12)
+            for _m, (_year, _value) in enumerate(extremes):
+                _values = [(_v[_m], int(_y)) for _y, _v in years.items() if _v[_m] is not None]
+                _expected = _best(_v for _v, _y in _values)
+                self.assertEqual(_value, _expected)
+                self.assertEqual(_year, min(_y for _v, _y in _values if _v == _expected))
+
+
+class CompletenessTest(DatabaseTest):
+
+    def test_completeness(self):
+        # the percentage of the expected archive records present in each
+        # month, May 2016 has 25 and June 2017 26 days of data
+        tags = self.calculate({'cache': 'False'})
+        years = json.loads(tags['monthOutTempCompletenessjson'])
+        self.assertEqual(years['2015'], [100.0] * 12)
+        self.assertEqual(years['2016'][4], round(100.0 * 25 / 31, 1))
+        self.assertEqual(years['2017'][5], round(100.0 * 26 / 30, 1))
+        self.assertEqual(json.loads(tags['monthRainCompletenessjson']), years)
+        # the completeness is not known without bulk queries
+        tags = self.calculate({'cache': 'False', 'bulk_query': 'False'})
+        self.assertEqual(json.loads(tags['monthOutTempCompletenessjson']), {})
+
+    def test_excluded(self):
+        # the WMO '3/5 rule'
+        avg = make_averages({'max_missing_days': '5', 'max_consecutive_missing_days': '3'})
+        self.assertFalse(avg.excluded({'days': 26, 'max_gap': 3}, 31))
+        self.assertTrue(avg.excluded({'days': 25, 'max_gap': 1}, 31))
+        self.assertTrue(avg.excluded({'days': 27, 'max_gap': 4}, 31))
+        self.assertTrue(avg.excluded({}, 30))
+        # by default no month is excluded
+        self.assertFalse(make_averages({}).excluded({'days': 1, 'max_gap': 29}, 30))
+
+    def test_exclusion(self):
+        # May 2016 has six missing days and June 2017 four consecutive
+        # missing days, with the '3/5 rule' neither month is used
+        options = {'max_missing_days': '5', 'max_consecutive_missing_days': '3',
+                   'cache': 'False'}
+        tags = self.tags(options)
+        years = json.loads(tags['monthOutTempMaxYearsjson'])
+        self.assertIsNone(years['2016'][4])
+        self.assertIsNone(years['2017'][5])
+        self.assertEqual(tags['averagesStats']['counters']['months_excluded'], 4)
+        years = json.loads(self.calculate({'cache': 'False'})['monthOutTempMaxYearsjson'])
+        self.assertIsNotNone(years['2016'][4])
+        self.assertIsNotNone(years['2017'][5])
+
+
+class FormatTest(DatabaseTest):
+
+    def test_format_places(self):
+        self.assertEqual(averages.format_places('%.1f'), 1)
+        self.assertEqual(averages.format_places('%.10f'), 10)
+        self.assertEqual(averages.format_places('%d'), 0)
+        self.assertEqual(averages.format_places('%f'), 6)
+        self.assertEqual(averages.format_places('%g'), 1)
+        self.assertEqual(averages.format_places(None), 1)
+        self.assertEqual(averages.format_places('mm', 2), 2)
+
+    def test_batched_conversion(self):
+        # the first access to a cheap 12 month series converts every cheap
+        # series of the same unit in one stage
+        tags = self.tags({'cache': 'False'})
+        tags['monthRainAvgjson']
+        self.assertEqual(tags['averagesStats']['counters']['conversions'], 1)
+        for _tag in ('monthRainSumjson', 'monthRainWettestjson', 'monthRainDriestjson'):
+            tags[_tag]
+        self.assertEqual(tags['averagesStats']['counters']['conversions'], 1)
+        for _tag in ('monthTempMeanjson', 'monthTempMaxjson', 'monthTempMinjson',
+                     'monthTempMeanMinMaxjson'):
+            tags[_tag]
+        self.assertEqual(tags['averagesStats']['counters']['conversions'], 2)
+        # other series are converted as accessed
+        self.assertNotIn('monthRainSumYears', tags._series)
+        tags['monthRainSumYearsjson']
+        self.assertEqual(tags['averagesStats']['counters']['conversions'], 3)
+
+    def test_places(self):
+        # values are rounded to the places of the skin string format of the
+        # displayed unit
+        rain = json.loads(self.calculate({'cache': 'False'})['monthRainAvgjson'])
+        skin_dict = make_skin_dict({'cache': 'False'}, self.work_dir)
+        skin_dict['Units']['StringFormats']['mm'] = '%.3f'
+        avg = averages.Averages(skin_dict, configobj.ConfigObj({'WEEWX_ROOT': '/'}),
+                                weewx.units.Converter(skin_dict['Units']['Groups']))
+        tags = avg.calculate(TimeSpan(self.dbm.firstGoodStamp(), self.dbm.lastGoodStamp()),
+                             lambda data_binding=None: self.dbm)
+        rain_3 = json.loads(tags['monthRainAvgjson'])
+        self.assertTrue(any(round(_v, 1) != _v for _v in rain_3))
+        for _v, _v_3 in zip(rain, rain_3):
+            self.assertEqual(_v_3, round(_v_3, 3))
+            self.assertAlmostEqual(_v, _v_3, delta=0.05 + 1e-9)
+
+
+class BackgroundRefreshTest(DatabaseTest):
+
+    def setUp(self):
+        super(BackgroundRefreshTest, self).setUp()
+        self.config_dict = make_config_dict(os.path.join(self.work_dir, 'public_html'),
+                                            {'wx_binding': self.db_path})
+        self.refresh = averages.BackgroundRefresh('wx_binding')
+        self.lookups = []
+
+    def configure(self, options):
+        avg = make_averages(dict({'cache': 'False'}, **options), self.work_dir)
+        self.refresh.configure(avg, avg.skin_dict, self.config_dict)
+        return avg
+
+    def get(self, stop):
+        """ Return the averagesHash of the result for a report at stop. """
+
+        def db_lookup(data_binding=None):
+            self.lookups.append(stop)
+            return self.dbm
+        _result = self.refresh.get(TimeSpan(self.dbm.firstGoodStamp(), stop), db_lookup)
+        return _result['averagesHash']
+
+    def expected(self, stop):
+        """ Return the averagesHash of a calculation up to stop. """
+
+        return self.tags({'cache': 'False'}, stop)['averagesHash']
+
+    def wait(self):
+        """ Wait for any background refresh to complete. """
+
+        with self.refresh.lock:
+            pass
+
+    def test_refresh(self):
+        # the first report calculates the averages, a later report within
+        # max_staleness gets the previous result while the averages are
+        # refreshed in the background
+        self.configure({'max_staleness': str(90 * 86400)})
+        self.assertEqual(self.get(stop_ts(2018, 6)), self.expected(stop_ts(2018, 6)))
+        self.assertEqual(set(self.lookups), {stop_ts(2018, 6)})
+        self.assertEqual(self.get(stop_ts(2018, 7)), self.expected(stop_ts(2018, 6)))
+        self.wait()
+        self.assertEqual(self.refresh.latest[1], stop_ts(2018, 7))
+        self.assertEqual(self.get(stop_ts(2018, 7)), self.expected(stop_ts(2018, 7)))
+        # the background refresh used its own database manager
+        self.assertEqual(set(self.lookups), {stop_ts(2018, 6)})
+
+    def test_stale(self):
+        # a result older than max_staleness or calculated with a different
+        # skin config is not returned
+        self.configure({})
+        self.get(stop_ts(2018, 6))
+        self.assertEqual(self.get(stop_ts(2018, 7)), self.expected(stop_ts(2018, 7)))
+        self.wait()
+        self.configure({'max_staleness': str(90 * 86400), 'normals_years': '2'})
+        _hash = self.get(stop_ts(2018, 7))
+        self.assertNotEqual(_hash, self.expected(stop_ts(2018, 7)))
+        self.assertEqual(self.refresh.latest[2]['MonthAverages']['normals_years'], '2')
+
+    def test_failed_refresh(self):
+        # a failed refresh is logged and the previous result kept
+        self.configure({'max_staleness': str(90 * 86400)})
+        _hash = self.get(stop_ts(2018, 6))
+        del self.config_dict['DataBindings']['wx_binding']
+        errors = []
+        _logerr = averages.logerr
+        averages.logerr = errors.append
+        try:
+            self.assertEqual(self.get(stop_ts(2018, 7)), _hash)
+            self.wait()
+        finally:
+            averages.logerr = _logerr
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith('Background refresh of the averages failed'))
+        self.assertEqual(self.refresh.latest[1], stop_ts(2018, 6))
+        self.assertFalse(self.refresh.lock.locked())
+
+    def test_get_refresh(self):
+        # a refresh is kept for each report and data binding
+        avg = self.configure({})
+        _skin_dict = avg.skin_dict
+        _skin_dict['REPORT_NAME'] = 'Report'
+        refresh = averages.get_refresh(avg, _skin_dict, self.config_dict)
+        try:
+            self.assertIs(averages.get_refresh(avg, _skin_dict, self.config_dict), refresh)
+            self.assertEqual(refresh.binding, 'wx_binding')
+            _skin_dict['REPORT_NAME'] = 'Other'
+            self.assertIsNot(averages.get_refresh(avg, _skin_dict, self.config_dict), refresh)
+        finally:
+            averages.refreshes.clear()
+
+
+class DegreeDaysTest(DatabaseTest):
+
+    options = {'degree_days': {'heatdeg': ['18', 'degree_C'], 'cooldeg': ['18', 'degree_C']}}
+
+    def test_month_degree_days(self):
+        stats = {'day_avgs': [10.0, 20.0, 25.0]}
+        self.assertAlmostEqual(averages.month_degree_days(stats, 'heatdeg', 18.0), 8.0)
+        self.assertAlmostEqual(averages.month_degree_days(stats, 'cooldeg', 18.0), 9.0)
+        self.assertAlmostEqual(averages.month_degree_days(stats, 'growdeg', 10.0), 25.0)
+        self.assertIsNone(averages.month_degree_days({}, 'heatdeg', 18.0))
+
+    def test_options(self):
+        # by default there are no degree days, only those with a base are
+        # calculated
+        self.assertEqual(make_averages({}).degree_days, [])
+        self.assertFalse(make_averages({}).day_avgs('outTemp'))
+        errors = []
+        _logerr = averages.logerr
+        averages.logerr = errors.append
+        try:
+            avg = make_averages({'degree_days': {'heatdeg': ['18', 'degree_C'],
+                                                 'growdeg': 'None',
+                                                 'frostdeg': '0'}})
+        finally:
+            averages.logerr = _logerr
+        self.assertEqual(errors, ["Ignoring invalid degree day type 'frostdeg'"])
+        self.assertEqual(avg.degree_days,
+                         [('heatdeg', weewx.units.ValueTuple(18.0, 'degree_C', 'group_temperature'))])
+        self.assertTrue(avg.day_avgs('outTemp'))
+        self.assertFalse(avg.day_avgs('rain'))
+
+    def test_degree_days(self):
+        # the degree days of each day are calculated from the day average
+        tags = self.calculate(dict(self.options, cache='False'))
+        self.assertNotIn('monthGrowdegSumjson', tags)
+        heatdeg = json.loads(tags['monthHeatdegSumYearsjson'])
+        cooldeg = json.loads(tags['monthCooldegSumYearsjson'])
+        _rows = self.dbm.genSql("SELECT wsum, sumtime FROM archive_day_outTemp "
+                                "WHERE dateTime >= ? AND dateTime < ?",
+                                (day_ts(date(2016, 4, 1)), day_ts(date(2016, 5, 1))))
+        _avgs = [_w / _t for _w, _t in _rows]
+        self.assertAlmostEqual(heatdeg['2016'][3], sum(max(18.0 - _t, 0.0) for _t in _avgs),
+                               delta=0.05)
+        self.assertAlmostEqual(cooldeg['2016'][3], sum(max(_t - 18.0, 0.0) for _t in _avgs),
+                               delta=0.05)
+        self.assertEqual(len(json.loads(tags['monthHeatdegSumjson'])), 12)
+
+    def test_day_avgs(self):
+        # the day averages are only obtained and cached when degree days are
+        # calculated, cached months without them are queried again
+        tags = self.tags({})
+        self.assertNotIn('monthHeatdegSumjson', tags)
+        _path = os.path.join(self.skin_dir, 'averages_cache.json')
+        with open(_path) as f:
+            months = json.load(f)['obs']['outTemp']
+        self.assertFalse(any('day_avgs' in _m['stats'] for _m in months.values()))
+        tags = self.tags(self.options)
+        self.assertEqual(tags['averagesStats']['counters']['months_queried'], len(months))
+        with open(_path) as f:
+            cache = json.load(f)['obs']
+        self.assertTrue(all('day_avgs' in _m['stats'] for _m in cache['outTemp'].values()))
+        self.assertFalse(any('day_avgs' in _m['stats'] for _m in cache['rain'].values()))
+        self.assertEqual(tags['monthHeatdegSumYearsjson'],
+                         self.calculate(dict(self.options, cache='False'))['monthHeatdegSumYearsjson'])
+
+
+class AveragesStatsTest(unittest.TestCase):
+
+    def test_nested_phases(self):
+        # time in a nested phase is charged to that phase only
+        stats = averages.AveragesStats()
+        with stats.phase('outer'):
+            time.sleep(0.02)
+            with stats.phase('inner'):
+                time.sleep(0.05)
+        self.assertGreaterEqual(stats.timings['inner'], 0.04)
+        self.assertLess(stats.timings['outer'], 0.045)
+        result = stats.to_dict()
+        self.assertAlmostEqual(result['total'],
+                               sum(result['timings'].values()), places=5)
+
+    def test_counters(self):
+        stats = averages.AveragesStats()
+        stats.count('months')
+        stats.count('months', 11)
+        self.assertEqual(stats.to_dict()['counters'], {'months': 12})
+
+
+class CountingManagerTest(DatabaseTest):
+
+    def test_counts_calls(self):
+        stats = averages.AveragesStats()
+        dbm = averages.CountingManager(self.dbm, stats)
+        _first = dbm.firstGoodStamp()
+        dbm.getRecord(dbm.lastGoodStamp())
+        # other attributes are passed through uncounted
+        self.assertEqual(dbm.table_name, 'archive')
+        self.assertEqual(_first, self.dbm.firstGoodStamp())
+        self.assertEqual(stats.counters, {'db_calls': 3,
+                                          'db_calls_firstGoodStamp': 1,
+                                          'db_calls_lastGoodStamp': 1,
+                                          'db_calls_getRecord': 1})
+
+
+class InstrumentationTest(DatabaseTest):
+
+    def test_stats_tag(self):
+        tags = self.tags({})
+        stats = tags['averagesStats']
+        # the month aggregates come from a single pass over each daily summary
+        self.assertIn('query_outTemp', stats['timings'])
+        self.assertIn('query_rain', stats['timings'])
+        self.assertEqual(stats['counters']['db_calls_genSql'], 2)
+        self.assertEqual(stats['counters']['months_processed'], 53)
+        self.assertEqual(stats['counters']['months_queried'], 2 * 53)
+        # deriving a tag is timed as the tags are used
+        tags['monthRainAvgjson']
+        self.assertIn('json_encoding', tags['averagesStats']['timings'])
+        # a second run takes the complete months from the cache
+        stats = self.tags({})['averagesStats']
+        self.assertEqual(stats['counters']['db_calls_genSql'], 2)
+        self.assertEqual(stats['counters']['months_queried'], 0)
+
+    def test_stats_file(self):
+        path = os.path.join(self.skin_dir, 'stats.jsonl')
+        self.tags({'stats_file': path})
+        self.tags({'stats_file': path})
+        with open(path) as f:
+            lines = [json.loads(_line) for _line in f]
+        self.assertEqual(len(lines), 2)
+        for _line in lines:
+            self.assertIn('dateTime', _line)
+            self.assertIn('db_calls', _line['counters'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+test_averagescli.py
+
+Unit tests for the Averages extension command line interface.
+
+Copyright (c) 2015-2020 Gary Roderick               gjroderick<at>gmail.com
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program.  If not, see http://www.gnu.org/licenses/.
+
+Version: 1.1.0                                   Date: 17 October 2026
+
+Revision History
+    17 October 2026     v1.1.0
+        - initial implementation
+
+Usage:
+
+    $ PYTHONPATH=/path/to/weewx/bin python -m unittest discover tests
+"""
+from __future__ import print_function
+
+import io
+import json
+import os
+import shutil
+import sys
+import unittest
+
+from support import make_config_dict, DatabaseTest
+
+import user.averagescli as cli
+
+
+class CommandLineTest(DatabaseTest):
+
+    def setUp(self):
+        super(CommandLineTest, self).setUp()
+        self.html_root = os.path.join(self.work_dir, 'public_html')
+        self.config_dict = make_config_dict(self.html_root, {'wx_binding': self.db_path})
+
+    def run_main(self, *args):
+        """ Run the command line interface and return its output. """
+
+        self.config_dict.filename = os.path.join(self.work_dir, 'weewx.conf')
+        self.config_dict.write()
+        _argv, _stdout = sys.argv, sys.stdout
+        sys.argv = ['averagescli', '--config=%s' % self.config_dict.filename] + list(args)
+        sys.stdout = io.StringIO() if sys.version_info[0] >= 3 else io.BytesIO()
+        try:
+            cli.main()
+            return sys.stdout.getvalue()
+        finally:
+            sys.argv, sys.stdout = _argv, _stdout
+
+    def test_generate(self):
+        skin_dict = cli.get_skin_dict(self.config_dict, 'HighchartsAverages', {}, 'wx_binding')
+        output = os.path.join(self.html_root, 'json', 'averages.json')
+        result = cli.generate(self.config_dict, skin_dict, 'wx_binding', output)
+        self.assertTrue(result['changed'])
+        self.assertEqual(result['file'], output)
+        self.assertEqual(result['dateTime'], self.dbm.lastGoodStamp())
+        self.assertIn('calculate', dict(result['timings']))
+        with open(output) as f:
+            data = json.load(f)[0]
+        self.assertEqual(len(data['rainplot']['series']['rainAvg']['data']), 12)
+        # unchanged results are not written again unless forced
+        result = cli.generate(self.config_dict, skin_dict, 'wx_binding', output)
+        self.assertFalse(result['changed'])
+        result = cli.generate(self.config_dict, skin_dict, 'wx_binding', output, force=True)
+        self.assertTrue(result['changed'])
+
+    def test_skin_dict(self):
+        skin_dict = cli.get_skin_dict(self.config_dict, 'HighchartsAverages',
+                                      {'windSpeed': ['avg', 'max']}, 'wx_binding')
+        self.assertEqual(skin_dict['MonthAverages']['observations']['windSpeed'], ['avg', 'max'])
+        # the report data binding uses the report month stats cache
+        self.assertNotIn('data_binding', skin_dict['MonthAverages'])
+        skin_dict = cli.get_skin_dict(self.config_dict, 'HighchartsAverages', {}, 'other_binding')
+        self.assertEqual(skin_dict['MonthAverages']['data_binding'], 'other_binding')
+
+    def test_main(self):
+        output = os.path.join(self.work_dir, 'averages.json')
+        text = self.run_main('--output=%s' % output, '--profile')
+        self.assertTrue(text.startswith('Generated %s' % output))
+        self.assertIn('db_calls', text)
+        self.assertTrue(os.path.exists(output))
+        self.assertTrue(os.path.exists(os.path.join(self.work_dir, 'averages.manifest.json')))
+        text = self.run_main('--output=%s' % output)
+        self.assertTrue(text.startswith('Unchanged %s' % output))
+
+
+    def test_bindings(self):
+        # a JSON data file is generated for each data binding along with an
+        # index of the files
+        _other_path = os.path.join(self.work_dir, 'other.sdb')
+        shutil.copy(self.db_path, _other_path)
+        self.config_dict = make_config_dict(self.html_root, {'wx_binding': self.db_path,
+                                                             'other_binding': _other_path})
+        output_dir = os.path.join(self.work_dir, 'json')
+        text = self.run_main('--binding=wx_binding,other_binding', '--processes=2',
+                             '--output=%s' % output_dir)
+        self.assertIn('for 2 data bindings using 2 processes', text)
+        with open(os.path.join(output_dir, 'averages_index.json')) as f:
+            stations = json.load(f)['stations']
+        self.assertEqual([_s['binding'] for _s in stations], ['wx_binding', 'other_binding'])
+        for _station in stations:
+            self.assertEqual(_station['dateTime'], self.dbm.lastGoodStamp())
+            self.assertTrue(os.path.exists(os.path.join(output_dir, _station['file'])))
+            self.assertTrue(os.path.exists(os.path.join(output_dir, _station['manifest'])))
+        # each data binding has its own month stats cache
+        self.assertTrue(os.path.exists(os.path.join(self.work_dir,
+                                                    'averages_cache_other_binding.json')))
+        with open(os.path.join(output_dir, 'averages_wx_binding.json')) as f:
+            wx_data = json.load(f)
+        with open(os.path.join(output_dir, 'averages_other_binding.json')) as f:
+            self.assertEqual(json.load(f), wx_data)
+
+    def test_binding_error(self):
+        # an error with one data binding is reported in the index and the
+        # exit status, the other data bindings are generated
+        output_dir = os.path.join(self.work_dir, 'json')
+        with self.assertRaises(SystemExit) as cm:
+            self.run_main('--binding=wx_binding', '--binding=missing_binding',
+                          '--output=%s' % output_dir)
+        self.assertEqual(cm.exception.code, 1)
+        with open(os.path.join(output_dir, 'averages_index.json')) as f:
+            stations = json.load(f)['stations']
+        self.assertEqual(stations[0]['file'], 'averages_wx_binding.json')
+        self.assertIsNone(stations[1]['file'])
+        self.assertIn('missing_binding', stations[1]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+test_averagesgenerator.py
+
+Unit tests for the AveragesGenerator and the publishing of the JSON data file.
+
+Copyright (c) 2015-2020 Gary Roderick               gjroderick<at>gmail.com
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program.  If not, see http://www.gnu.org/licenses/.
+
+Version: 1.1.0                                   Date: 17 October 2026
+
+Revision History
+    17 October 2026     v1.1.0
+        - initial implementation
+
+Usage:
+
+    $ PYTHONPATH=/path/to/weewx/bin python -m unittest discover tests
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import date
+from weeutil.weeutil import TimeSpan
+
+from support import averages, make_config_dict, stop_ts, DatabaseTest
+
+import user.averagesgenerator as generator
+
+
+class PublishTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.work_dir, 'json', 'averages.json')
+        self.rendered = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def publish(self, content_hash, force=False):
+        def render():
+            self.rendered += 1
+            return '{"hash": "%s"}' % content_hash
+        return generator.publish(self.output, content_hash, render, force)
+
+    def manifest(self):
+        with open(os.path.join(self.work_dir, 'json', 'averages.manifest.json')) as f:
+            return json.load(f)
+
+    def versions(self):
+        return sorted(_n for _n in os.listdir(os.path.dirname(self.output))
+                      if _n not in ('averages.json', 'averages.manifest.json'))
+
+    def test_publish(self):
+        _hash = averages.payload_hash('one')
+        self.assertTrue(self.publish(_hash))
+        _versioned = 'averages.%s.json' % _hash
+        manifest = self.manifest()
+        self.assertEqual(manifest['file'], _versioned)
+        self.assertEqual(manifest['hash'], _hash)
+        self.assertEqual(manifest['cacheControl'],
+                         {_versioned: generator.VERSIONED_CACHE_CONTROL,
+                          'averages.manifest.json': generator.MANIFEST_CACHE_CONTROL})
+        with open(self.output) as f:
+            self.assertEqual(json.load(f), {'hash': _hash})
+        self.assertEqual(self.versions(), [_versioned])
+        # unchanged content is neither rendered nor written unless forced
+        self.assertFalse(self.publish(_hash))
+        self.assertEqual(self.rendered, 1)
+        self.assertTrue(self.publish(_hash, force=True))
+        self.assertEqual(self.rendered, 2)
+        # a missing versioned copy is written again
+        os.remove(os.path.join(self.work_dir, 'json', _versioned))
+        self.assertTrue(self.publish(_hash))
+
+    def test_versions_kept(self):
+        # the current and the most recent older versioned copies are kept
+        _hashes = [averages.payload_hash(_p) for _p in ('one', 'two', 'three')]
+        for _n, _hash in enumerate(_hashes):
+            self.assertTrue(self.publish(_hash))
+            _path = os.path.join(self.work_dir, 'json', 'averages.%s.json' % _hash)
+            os.utime(_path, (1000000000 + _n, 1000000000 + _n))
+        self.assertEqual(self.versions(),
+                         sorted('averages.%s.json' % _h for _h in _hashes[-generator.VERSIONS_KEPT:]))
+        self.assertEqual(self.manifest()['hash'], _hashes[-1])
+
+
+class PayloadHashTest(DatabaseTest):
+
+    def test_payload_hash(self):
+        _hash = averages.payload_hash('{"a": 1}')
+        self.assertEqual(len(_hash), 16)
+        self.assertEqual(_hash, averages.payload_hash('{"a": 1}'))
+        self.assertNotEqual(_hash, averages.payload_hash('{"a": 2}'))
+
+    def test_averages_hash(self):
+        # the hash changes only if the results change
+        _hash = self.tags({})['averagesHash']
+        self.assertEqual(self.tags({})['averagesHash'], _hash)
+        self.edit_day(date(2016, 3, 10), max=45.0)
+        self.assertNotEqual(self.tags({'cache': 'False'})['averagesHash'], _hash)
+
+
+class AveragesGeneratorTest(DatabaseTest):
+
+    def setUp(self):
+        super(AveragesGeneratorTest, self).setUp()
+        self.html_root = os.path.join(self.work_dir, 'public_html')
+        self.config_dict = make_config_dict(self.html_root, {'wx_binding': self.db_path})
+        self.skin_dict = averages.build_skin_dict(self.config_dict, 'HighchartsAverages')
+
+    def run_generator(self, gen_ts):
+        """ Run the generator and return the content hash of the results. """
+
+        gen = generator.AveragesGenerator(self.config_dict, self.skin_dict, gen_ts, True, None)
+        try:
+            gen.run()
+        finally:
+            gen.finalize()
+        with open(os.path.join(self.html_root, 'json', 'averages.manifest.json')) as f:
+            return json.load(f)['hash']
+
+    def averages_hash(self, stop):
+        """ Return the content hash of the results of the report up to stop. """
+
+        converter = generator.get_converter_formatter(self.skin_dict)[0]
+        avg = averages.Averages(self.skin_dict, self.config_dict, converter)
+        tags = avg.calculate(TimeSpan(self.dbm.firstGoodStamp(), stop),
+                             lambda data_binding=None: self.dbm)
+        return tags['averagesHash']
+
+    def test_report_time(self):
+        # the averages are those up to the report time, or the last record if
+        # there is no report time
+        _ts = stop_ts(2017, 6)
+        self.assertEqual(self.run_generator(_ts), self.averages_hash(_ts))
+        self.assertEqual(self.run_generator(None), self.averages_hash(self.dbm.lastGoodStamp()))
+        self.assertNotEqual(self.averages_hash(_ts), self.averages_hash(self.dbm.lastGoodStamp()))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+"""
+test_averagesservice.py
+
+Unit tests for the AveragesService WeeWX service.
+
+Copyright (c) 2015-2020 Gary Roderick               gjroderick<at>gmail.com
+
+This program is free software: you can redistribute it and/or modify it under
+the terms of the GNU General Public License as published by the Free Software
+Foundation, either version 3 of the License, or (at your option) any later
+version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY
+WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A
+PARTICULAR PURPOSE.  See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with
+this program.  If not, see http://www.gnu.org/licenses/.
+
+Version: 1.1.0                                   Date: 17 October 2026
+
+Revision History
+    17 October 2026     v1.1.0
+        - initial implementation
+
+Usage:
+
+    $ PYTHONPATH=/path/to/weewx/bin python -m unittest discover tests
+"""
+from __future__ import print_function
+
+import json
+import os
+import time
+import unittest
+
+from datetime import date
+
+from support import averages, make_config_dict, DatabaseTest
+
+import weewx
+import user.averagesservice as service
+
+# the month summarised by the tests, June 2021 has 30 days
+MONTH_TS = int(time.mktime(date(2021, 6, 1).timetuple()))
+HOUR = 3600
+
+
+def make_records(start_ts, stop_ts, us_units=1, skip=()):
+    """ Return hourly archive records ending after start_ts up to stop_ts.
+
+        The outTemp of each record is the day of the month of the day the
+        record belongs to.
+
+        Parameters:
+            start_ts: Timestamp of the start of the interval of the first
+                      record.
+            stop_ts:  Timestamp of the last record.
+            us_units: The unit system of the records.
+            skip:     Timestamps of records to be left out.
+    """
+
+    return [{'dateTime': _ts, 'usUnits': us_units, 'interval': 60,
+             'outTemp': float(time.localtime(_ts - 1).tm_mday), 'rain': 0.01}
+            for _ts in range(start_ts + HOUR, stop_ts + 1, HOUR) if _ts not in skip]
+
+
+class CurrentMonthTest(unittest.TestCase):
+
+    def setUp(self):
+        self.current = service.CurrentMonth(['outTemp', 'rain'])
+        self.july_ts = int(time.mktime(date(2021, 7, 1).timetuple()))
+
+    def add(self, records):
+        """ Add records and return the month completed by the last record. """
+
+        done = [self.current.add_record(_record) for _record in records]
+        self.assertTrue(all(_done is None for _done in done[:-1]))
+        return done[-1]
+
+    def test_month(self):
+        # the record at midnight on 1 July belongs to 30 June
+        key, stats, complete = self.add(make_records(MONTH_TS, self.july_ts + HOUR))
+        self.assertEqual(key, (2021, 6))
+        self.assertTrue(complete)
+        temp = stats['outTemp']
+        self.assertEqual(temp['count'], 30 * 24)
+        self.assertEqual(temp['days'], 30)
+        self.assertEqual(temp['max_gap'], 0)
+        self.assertEqual((temp['min'], temp['max']), (1.0, 30.0))
+        self.assertEqual(temp['mintime'], MONTH_TS + HOUR)
+        self.assertEqual(temp['maxtime'], self.july_ts - 23 * HOUR)
+        self.assertAlmostEqual(temp['avg'], 15.5)
+        self.assertAlmostEqual(temp['meanmax'], 15.5)
+        self.assertAlmostEqual(stats['rain']['sum'], 30 * 24 * 0.01)
+
+    def test_missed_records(self):
+        # a missed record or a month joined part way through is incomplete
+        _skip = [MONTH_TS + 100 * HOUR]
+        key, stats, complete = self.add(make_records(MONTH_TS, self.july_ts + HOUR, skip=_skip))
+        self.assertFalse(complete)
+        self.assertEqual(stats['outTemp']['count'], 30 * 24 - 1)
+        self.current = service.CurrentMonth(['outTemp', 'rain'])
+        key, stats, complete = self.add(make_records(MONTH_TS + HOUR, self.july_ts + HOUR))
+        self.assertFalse(complete)
+        # a repeated record is ignored
+        self.assertIsNone(self.current.add_record(make_records(MONTH_TS, self.july_ts)[-1]))
+
+    def test_day_avgs(self):
+        # the day averages used for degree days are only kept if required
+        _records = make_records(MONTH_TS, MONTH_TS + 50 * HOUR)
+        self.add(_records)
+        self.assertNotIn('day_avgs', self.current.month_stats()['outTemp'])
+        self.current = service.CurrentMonth(['outTemp', 'rain'], day_avgs=True)
+        self.add(_records)
+        stats = self.current.month_stats()
+        self.assertEqual(stats['outTemp']['day_avgs'], [1.0, 2.0, 3.0])
+        self.assertNotIn('day_avgs', stats['rain'])
+
+    def test_state(self):
+        self.add(make_records(MONTH_TS, MONTH_TS + 50 * HOUR))
+        state = json.loads(json.dumps(self.current.to_dict()))
+        restored = service.CurrentMonth.from_dict(['outTemp', 'rain'], state)
+        self.assertEqual(restored.month_stats(), self.current.month_stats())
+        self.assertTrue(restored.complete)
+        # an observation that was not summarised makes the month incomplete
+        restored = service.CurrentMonth.from_dict(['outTemp', 'rain', 'outHumidity'], state)
+        self.assertFalse(restored.complete)
+
+
+class FakeEngine(object):
+    """ The parts of the WeeWX engine used by the service. """
+
+    def __init__(self, dbm):
+        self.db_binder = self
+        self.dbm = dbm
+        self.bindings = []
+
+    def bind(self, event_type, callback):
+        pass
+
+    def get_manager(self, data_binding):
+        self.bindings.append(data_binding)
+        return self.dbm
+
+
+class AveragesServiceTest(DatabaseTest):
+
+    def setUp(self):
+        super(AveragesServiceTest, self).setUp()
+        self.config_dict = make_config_dict(os.path.join(self.work_dir, 'public_html'),
+                                            {'wx_binding': self.db_path})
+        self.engine = FakeEngine(self.dbm)
+        self.saved = []
+        self.write_atomic = service.write_atomic
+
+        def write_atomic(path, text):
+            self.saved.append(path)
+            self.write_atomic(path, text)
+        service.write_atomic = write_atomic
+
+    def tearDown(self):
+        service.write_atomic = self.write_atomic
+        super(AveragesServiceTest, self).tearDown()
+
+    def new_service(self):
+        return service.AveragesService(self.engine, self.config_dict)
+
+    def add_records(self, svc, records):
+        for _record in records:
+            svc.new_archive_record(weewx.Event(weewx.NEW_ARCHIVE_RECORD, record=_record))
+
+    def test_month_added(self):
+        svc = self.new_service()
+        _july_ts = int(time.mktime(date(2021, 7, 1).timetuple()))
+        self.add_records(svc, make_records(MONTH_TS, _july_ts + HOUR,
+                                           self.dbm.std_unit_system))
+        cache = averages.get_month_stats_cache(svc.cache_file, averages.get_db_id(self.dbm))
+        self.assertEqual(cache.month_stats('outTemp', (2021, 6))['max'], 30.0)
+        with open(svc.cache_file) as f:
+            self.assertIn('2021-06', json.load(f)['obs']['outTemp'])
+        self.assertEqual(set(self.engine.bindings), {'wx_binding'})
+
+    def test_data_binding(self):
+        # the service uses the data binding and month stats cache of the
+        # report
+        _report = self.config_dict['StdReport']['HighchartsAverages']
+        _report['MonthAverages']['data_binding'] = 'other_binding'
+        svc = self.new_service()
+        self.add_records(svc, make_records(MONTH_TS, MONTH_TS + HOUR, self.dbm.std_unit_system))
+        self.assertEqual(self.engine.bindings, ['other_binding'])
+        self.assertTrue(svc.cache_file.endswith('averages_cache_other_binding.json'))
+
+    def test_state_saved(self):
+        # the state is saved on a change of day and on shutdown
+        svc = self.new_service()
+        self.add_records(svc, make_records(MONTH_TS, MONTH_TS + 60 * HOUR,
+                                           self.dbm.std_unit_system))
+        self.assertEqual(self.saved, [svc.state_file] * 3)
+        svc.shutDown()
+        self.assertEqual(len(self.saved), 4)
+        restored = self.new_service()
+        self.assertEqual(restored.current.last_ts, MONTH_TS + 60 * HOUR)
+        self.assertEqual(restored.current.month_stats(), svc.current.month_stats())
+
+    def test_cache_merge(self):
+        # months added by another process are kept when the cache is saved
+        svc = self.new_service()
+        _db_id = averages.get_db_id(self.dbm)
+        cache = averages.get_month_stats_cache(svc.cache_file, _db_id)
+        other = averages.MonthStatsCache(svc.cache_file, _db_id)
+        current = service.CurrentMonth(['outTemp'])
+        for _record in make_records(MONTH_TS, MONTH_TS + 24 * HOUR):
+            current.add_record(_record)
+        _stats = current.month_stats()['outTemp']
+        other.add_month('outTemp', (2014, 1), _stats)
+        other.save()
+        cache.add_month('outTemp', (2014, 2), _stats)
+        cache.save()
+        with open(svc.cache_file) as f:
+            months = json.load(f)['obs']['outTemp']
+        self.assertIn('2014-01', months)
+        self.assertIn('2014-02', months)
+
+
+if __name__ == '__main__':
+    unittest.main()